@@ -21,7 +21,7 @@ export default function GenerateQuizPage() {
           apiClient.getFiles(),
           apiClient.getRulesets(),
         ]);
-        setFiles(filesData.filter((f: any) => f.status === 'completed'));
+        setFiles(filesData.filter((f: any) => f.status === 'completed' || f.status === 'partially_ready'));
         setRulesets(rulesetsData);
       } catch (err) {
         setError('Failed to load data');
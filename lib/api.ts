@@ -119,6 +119,10 @@ export class ApiClient {
     return this.request(`/files/${fileId}/status`);
   }
 
+  async getFileTopics(fileId: string) {
+    return this.request(`/files/${fileId}/topics`);
+  }
+
   async deleteFile(fileId: string) {
     return this.request(`/files/${fileId}`, { method: 'DELETE' });
   }
@@ -140,10 +144,10 @@ export class ApiClient {
   }
 
   // Questions
-  async generateQuestions(fileId: string, rulesetId: string, topic?: string) {
+  async generateQuestions(fileId: string, rulesetId: string, topic?: string, topicId?: string) {
     return this.request('/generate', {
       method: 'POST',
-      body: JSON.stringify({ file_id: fileId, ruleset_id: rulesetId, topic }),
+      body: JSON.stringify({ file_id: fileId, ruleset_id: rulesetId, topic, topic_id: topicId }),
     });
   }
 
@@ -0,0 +1,105 @@
+"""
+Startup benchmark for the backend services.
+
+For each service, in fresh processes:
+  import  time to import the service's main.py
+  ready   time from launching uvicorn to the first successful GET /health
+
+Figures are medians over --runs launches. Services start with the current
+environment, so set what they need first (SUPABASE_URL,
+SUPABASE_SERVICE_ROLE_KEY, DATABASE_URL, ...).
+
+    python scripts/bench_startup.py --runs 5 user-service file-service
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICES_DIR = os.path.join(ROOT, "services")
+SERVICES = ["api-gateway", "user-service", "file-service", "question-service"]
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def service_env():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [SERVICES_DIR, env.get("PYTHONPATH")]))
+    return env
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def measure_import(service: str) -> float:
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=os.path.join(SERVICES_DIR, service),
+        env=service_env(),
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def measure_ready(service: str, timeout: float) -> float:
+    port = free_port()
+    with tempfile.TemporaryFile(mode="w+") as log:
+        started = time.perf_counter()
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+            cwd=os.path.join(SERVICES_DIR, service),
+            env=service_env(),
+            stdout=subprocess.DEVNULL,
+            stderr=log,
+        )
+        try:
+            while time.perf_counter() - started < timeout:
+                if proc.poll() is not None:
+                    log.seek(0)
+                    lines = log.read().strip().splitlines()
+                    raise RuntimeError(lines[-1] if lines else f"exited with {proc.returncode}")
+                try:
+                    if httpx.get(f"http://127.0.0.1:{port}/health", timeout=1.0).status_code == 200:
+                        return time.perf_counter() - started
+                except httpx.HTTPError:
+                    pass
+                time.sleep(0.01)
+            raise RuntimeError(f"not ready after {timeout} s")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("services", nargs="*", default=SERVICES, help="services to measure (default: all)")
+    parser.add_argument("--runs", type=int, default=3, help="launches per service (default: 3)")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait for readiness")
+    args = parser.parse_args()
+
+    print(f"{'service':<20}{'import (s)':>12}{'ready (s)':>12}")
+    for service in args.services:
+        try:
+            imports = [measure_import(service) for _ in range(args.runs)]
+            ready = [measure_ready(service, args.timeout) for _ in range(args.runs)]
+        except RuntimeError as e:
+            print(f"{service:<20}  ❌ {e}")
+            continue
+        print(f"{service:<20}{statistics.median(imports):>12.3f}{statistics.median(ready):>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
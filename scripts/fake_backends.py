@@ -0,0 +1,217 @@
+"""
+Local stand-ins for Supabase (auth and storage) and the Gemini API, used by
+scripts/loadtest.py so the whole stack runs without external services.
+
+  fake Supabase  GoTrue signup / password login / get user / admin create
+                 user, Storage object
+                 upload / download / remove and resumable (TUS) uploads,
+                 all kept in memory
+  fake Gemini    generateContent returning a JSON array of the number of
+                 questions the prompt asks for
+
+Each stand-in waits a configurable latency (mean +- jitter, in ms) before
+answering so the services see realistic upstream times.
+"""
+import asyncio
+import base64
+import json
+import random
+import re
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+
+class Latency:
+    def __init__(self, mean_ms: float = 0.0, jitter_ms: float = 0.0):
+        self.mean_ms = mean_ms
+        self.jitter_ms = jitter_ms
+
+    async def wait(self):
+        delay = self.mean_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+
+
+def create_fake_supabase(auth_latency: Latency, storage_latency: Latency) -> FastAPI:
+    app = FastAPI(title="Fake Supabase")
+    users: Dict[str, dict] = {}                 # email -> user
+    passwords: Dict[str, str] = {}              # email -> password
+    tokens: Dict[str, dict] = {}                # access token -> user
+    objects: Dict[str, Tuple[bytes, str]] = {}  # bucket/path -> (data, content type)
+    uploads: Dict[str, dict] = {}               # resumable upload id -> state
+    app.state.objects = objects
+
+    def auth_error(status_code: int, message: str):
+        return JSONResponse({"code": status_code, "error_code": "fake_auth", "msg": message}, status_code=status_code)
+
+    def session_for(user: dict) -> dict:
+        token = f"fake-{uuid.uuid4().hex}"
+        tokens[token] = user
+        return {
+            "access_token": token,
+            "refresh_token": uuid.uuid4().hex,
+            "token_type": "bearer",
+            "expires_in": 3600,
+            "user": user,
+        }
+
+    def new_user(email: str, password: str, metadata: dict) -> dict:
+        now = datetime.now(timezone.utc).isoformat()
+        user = {
+            "id": str(uuid.uuid4()),
+            "aud": "authenticated",
+            "role": "authenticated",
+            "email": email,
+            "app_metadata": {"provider": "email"},
+            "user_metadata": metadata,
+            "created_at": now,
+            "email_confirmed_at": now,
+        }
+        users[email] = user
+        passwords[email] = password
+        return user
+
+    @app.post("/auth/v1/signup")
+    async def signup(request: Request):
+        await auth_latency.wait()
+        body = await request.json()
+        if body["email"] in users:
+            return auth_error(422, "User already registered")
+        return session_for(new_user(body["email"], body["password"], body.get("data") or {}))
+
+    @app.post("/auth/v1/admin/users")
+    async def admin_create_user(request: Request):
+        await auth_latency.wait()
+        body = await request.json()
+        if body["email"] in users:
+            return auth_error(422, "A user with this email address has already been registered")
+        return new_user(body["email"], body["password"], body.get("user_metadata") or {})
+
+    @app.post("/auth/v1/token")
+    async def token(request: Request):
+        await auth_latency.wait()
+        body = await request.json()
+        email = body.get("email")
+        if email not in users or passwords[email] != body.get("password"):
+            return auth_error(400, "Invalid login credentials")
+        return session_for(users[email])
+
+    @app.get("/auth/v1/user")
+    async def get_user(request: Request):
+        await auth_latency.wait()
+        token = request.headers.get("authorization", "").removeprefix("Bearer ")
+        user = tokens.get(token)
+        if user is None:
+            return auth_error(401, "invalid JWT")
+        return user
+
+    def storage_error(status_code: int, message: str):
+        return JSONResponse({"statusCode": str(status_code), "error": "fake_storage", "message": message},
+                            status_code=status_code)
+
+    @app.api_route("/storage/v1/object/{bucket}/{path:path}", methods=["POST", "PUT"])
+    async def upload_object(bucket: str, path: str, request: Request):
+        await storage_latency.wait()
+        key = f"{bucket}/{path}"
+        if request.method == "POST" and key in objects and request.headers.get("x-upsert") != "true":
+            return storage_error(409, "The resource already exists")
+        form = await request.form()
+        upload = form["file"]
+        objects[key] = (await upload.read(), upload.content_type)
+        return {"Key": key}
+
+    @app.get("/storage/v1/object/{bucket}/{path:path}")
+    async def download_object(bucket: str, path: str):
+        await storage_latency.wait()
+        stored = objects.get(f"{bucket}/{path}")
+        if stored is None:
+            return storage_error(404, "Object not found")
+        return Response(content=stored[0], media_type=stored[1])
+
+    @app.delete("/storage/v1/object/{bucket}")
+    async def remove_objects(bucket: str, request: Request):
+        await storage_latency.wait()
+        removed = []
+        for prefix in (await request.json()).get("prefixes", []):
+            if objects.pop(f"{bucket}/{prefix}", None) is not None:
+                removed.append({"name": prefix, "bucket_id": bucket})
+        return removed
+
+    @app.post("/storage/v1/upload/resumable")
+    async def create_upload(request: Request):
+        await storage_latency.wait()
+        metadata = {}
+        for item in request.headers.get("upload-metadata", "").split(","):
+            if item:
+                key, _, value = item.partition(" ")
+                metadata[key] = base64.b64decode(value).decode()
+        upload_id = uuid.uuid4().hex
+        uploads[upload_id] = {
+            "key": f"{metadata.get('bucketName')}/{metadata.get('objectName')}",
+            "content_type": metadata.get("contentType", "application/octet-stream"),
+            "length": int(request.headers["upload-length"]),
+            "data": bytearray(),
+        }
+        return Response(status_code=201, headers={
+            "Location": f"{str(request.base_url).rstrip('/')}/storage/v1/upload/resumable/{upload_id}",
+            "Tus-Resumable": "1.0.0",
+        })
+
+    @app.patch("/storage/v1/upload/resumable/{upload_id}")
+    async def upload_chunk(upload_id: str, request: Request):
+        await storage_latency.wait()
+        upload = uploads.get(upload_id)
+        if upload is None:
+            return storage_error(404, "Upload not found")
+        if int(request.headers.get("upload-offset", -1)) != len(upload["data"]):
+            return storage_error(409, "Upload-Offset mismatch")
+        upload["data"].extend(await request.body())
+        if len(upload["data"]) >= upload["length"]:
+            objects[upload["key"]] = (bytes(upload["data"]), upload["content_type"])
+            del uploads[upload_id]
+        return Response(status_code=204, headers={"Upload-Offset": str(len(upload["data"])), "Tus-Resumable": "1.0.0"})
+
+    return app
+
+
+def fake_questions(count: int) -> list:
+    questions = []
+    for n in range(1, count + 1):
+        options = [f"Option {n}{letter}" for letter in "ABCD"]
+        questions.append({
+            "question": f"Synthetic question {n} ({uuid.uuid4().hex[:8]})?",
+            "options": options,
+            "answer": random.choice(options),
+            "difficulty": "medium",
+            "bloom_level": "understand",
+        })
+    return questions
+
+
+def create_fake_gemini(latency: Latency) -> FastAPI:
+    app = FastAPI(title="Fake Gemini")
+    app.state.calls = 0
+
+    # The SDK calls /v1beta/models/<model>:generateContent
+    @app.post("/v1beta/models/{model_method}")
+    async def generate_content(model_method: str, request: Request):
+        body = await request.json()
+        prompt = " ".join(part.get("text", "") for content in body.get("contents", []) for part in content.get("parts", []))
+        match = re.search(r"Generate (\d+) multiple choice", prompt)
+        app.state.calls += 1
+        await latency.wait()
+        text = json.dumps(fake_questions(int(match.group(1)) if match else 5))
+        return {
+            "candidates": [{
+                "content": {"parts": [{"text": text}], "role": "model"},
+                "finishReason": "STOP",
+                "index": 0,
+            }],
+            "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(text) // 4},
+        }
+
+    return app
@@ -0,0 +1,424 @@
+"""
+End-to-end load test of the gateway and the three services.
+
+Boots the services (uvicorn, one process each) against a scratch Postgres
+database and the in-process stand-ins of scripts/fake_backends.py for
+Supabase auth/storage and Gemini, then runs --users virtual users
+concurrently through the gateway. Each signs up and logs in once, then
+repeats --iterations times:
+
+  upload a PDF -> wait until processed -> generate questions
+  -> create quiz -> start -> answer every question -> finish
+
+and the report gives throughput and p50/p95/p99 latency per route. With
+--live the quiz is taken over the live WebSocket instead (start, answers and
+finish as frames on one connection), reported per frame type.
+
+The database server needs the uuid-ossp and vector extensions; only the
+scratch database is touched (dropped afterwards unless --keep).
+
+    python scripts/loadtest.py --database-url "$BENCH_DATABASE_URL" --users 20 --iterations 3 --gemini-latency 1500
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import defaultdict
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+import psycopg2
+import uvicorn
+from websockets.asyncio.client import connect as websocket_connect
+from websockets.exceptions import ConnectionClosed, InvalidHandshake
+
+from bench_queries import create_extensions, list_migrations, load_sql
+from bench_startup import SERVICES_DIR, free_port, service_env
+from fake_backends import Latency, create_fake_gemini, create_fake_supabase
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# supabase-py only accepts keys shaped like a JWT
+FAKE_SERVICE_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.fake"
+
+
+def make_pdf(pages: List[str]) -> bytes:
+    """A minimal PDF with one line of text per page."""
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", None, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in pages:
+        text = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % (len(objects)))
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for n, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (n, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+class Stats:
+    """Latencies and failures per route label."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.scenarios = 0
+        self.failed_scenarios = 0
+
+    def record(self, route: str, ms: float, ok: bool):
+        self.latencies[route].append(ms)
+        if not ok:
+            self.errors[route] += 1
+
+    def report(self, elapsed: float):
+        print(f"\nScenarios: {self.scenarios} completed, {self.failed_scenarios} failed in {elapsed:.1f} s "
+              f"({self.scenarios / elapsed:.2f}/s)")
+        print(f"\n{'route':<34}{'count':>7}{'errors':>8}{'req/s':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+        total = 0
+        for route, values in self.latencies.items():
+            values = sorted(values)
+            total += len(values)
+            print(f"{route:<34}{len(values):>7}{self.errors[route]:>8}{len(values) / elapsed:>8.1f}"
+                  f"{percentile(values, 50):>9.1f}{percentile(values, 95):>9.1f}{percentile(values, 99):>9.1f}"
+                  f"{values[-1]:>9.1f}")
+        print(f"{'total':<34}{total:>7}{sum(self.errors.values()):>8}{total / elapsed:>8.1f}")
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class ScenarioError(Exception):
+    pass
+
+
+class VirtualUser:
+    def __init__(self, client: httpx.AsyncClient, stats: Stats, args):
+        self.client = client
+        self.stats = stats
+        self.args = args
+        self.headers: Dict[str, str] = {}
+
+    async def call(self, route: str, method: str, url: str, expect: int = 200, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=self.headers, **kwargs)
+        except httpx.HTTPError as e:
+            self.stats.record(route, (time.perf_counter() - started) * 1000, False)
+            raise ScenarioError(f"{route}: {e!r}")
+        ok = response.status_code == expect
+        self.stats.record(route, (time.perf_counter() - started) * 1000, ok)
+        if not ok:
+            raise ScenarioError(f"{route}: {response.status_code} {response.text[:200]}")
+        return response.json() if response.content else None
+
+    async def sign_in(self):
+        email = f"load-{uuid.uuid4().hex[:12]}@example.com"
+        password = uuid.uuid4().hex
+        await self.call("POST /api/auth/signup", "POST", "/api/auth/signup", 201,
+                        json={"email": email, "password": password, "full_name": "Load Test"})
+        session = await self.call("POST /api/auth/login", "POST", "/api/auth/login",
+                                  json={"email": email, "password": password})
+        self.headers = {"Authorization": f"Bearer {session['access_token']}"}
+        ruleset = await self.call("POST /api/rulesets", "POST", "/api/rulesets", 201, json={
+            "name": "Load test",
+            "config": {"num_questions": self.args.questions, "hardness": "medium", "grading_style": "end_only"},
+        })
+        self.ruleset_id = ruleset["id"]
+
+    async def run_scenario(self):
+        # Unique text per upload so every file is extracted rather than reused
+        marker = uuid.uuid4().hex
+        pdf = make_pdf([f"Load test document {marker}, page {n}: photosynthesis converts light into energy."
+                        for n in range(1, self.args.pages + 1)])
+        uploaded = await self.call("POST /api/files/upload", "POST", "/api/files/upload", 201,
+                                   files={"file": (f"load-{marker[:8]}.pdf", pdf, "application/pdf")})
+        file_id = uploaded["id"]
+        deadline = time.perf_counter() + self.args.processing_timeout
+        while uploaded["status"] != "completed":
+            if uploaded["status"] == "failed" or time.perf_counter() > deadline:
+                raise ScenarioError(f"file {file_id} {uploaded['status']}: {uploaded.get('error_message')}")
+            await asyncio.sleep(self.args.poll_interval)
+            uploaded = await self.call("GET /api/files/{id}/status", "GET", f"/api/files/{file_id}/status")
+
+        questions = await self.call("POST /api/generate", "POST", "/api/generate", 201,
+                                    json={"file_id": file_id, "ruleset_id": self.ruleset_id})
+        quiz = await self.call("POST /api/quizzes", "POST", "/api/quizzes", 201, json={
+            "ruleset_id": self.ruleset_id,
+            "question_ids": [q["id"] for q in questions],
+        })
+        quiz_id = quiz["quiz_id"]
+        if self.args.live:
+            await self.take_quiz_live(quiz_id, questions)
+            return
+        await self.call("POST /api/quizzes/{id}/start", "POST", f"/api/quizzes/{quiz_id}/start")
+        for question in questions:
+            await self.call("POST /api/quizzes/{id}/answer", "POST", f"/api/quizzes/{quiz_id}/answer", json={
+                "question_id": question["id"],
+                "selected_answer": random.choice(question["options"]),
+            })
+        await self.call("POST /api/quizzes/{id}/finish", "POST", f"/api/quizzes/{quiz_id}/finish")
+
+    async def frame(self, ws, route: str, message: Optional[dict], expect: str) -> dict:
+        """Send ``message`` (if any) and wait for the reply of type ``expect``."""
+        started = time.perf_counter()
+        if message is not None:
+            await ws.send(json.dumps(message))
+        while True:
+            reply = json.loads(await ws.recv())
+            if reply["type"] == expect or reply["type"] == "error":
+                break
+        ok = reply["type"] == expect
+        self.stats.record(route, (time.perf_counter() - started) * 1000, ok)
+        if not ok:
+            raise ScenarioError(f"{route}: {reply.get('detail')}")
+        return reply
+
+    async def take_quiz_live(self, quiz_id: str, questions: List[dict]):
+        url = f"{str(self.client.base_url).rstrip('/').replace('http', 'ws', 1)}/api/quizzes/{quiz_id}/live"
+        started = time.perf_counter()
+        try:
+            async with websocket_connect(url, additional_headers=self.headers) as ws:
+                self.stats.record("WS /api/quizzes/{id}/live", (time.perf_counter() - started) * 1000, True)
+                await self.frame(ws, "WS ready", None, "ready")
+                await self.frame(ws, "WS start", {"type": "start"}, "started")
+                for question in questions:
+                    await self.frame(ws, "WS answer", {
+                        "type": "answer",
+                        "question_id": question["id"],
+                        "selected_answer": random.choice(question["options"]),
+                    }, "answer")
+                await self.frame(ws, "WS finish", {"type": "finish"}, "result")
+        except (OSError, ConnectionClosed, InvalidHandshake) as e:
+            raise ScenarioError(f"live quiz: {e!r}")
+
+    async def run(self):
+        try:
+            await self.sign_in()
+        except ScenarioError as e:
+            print(f"❌ {e}")
+            self.stats.failed_scenarios += self.args.iterations
+            return
+        for _ in range(self.args.iterations):
+            try:
+                await self.run_scenario()
+                self.stats.scenarios += 1
+            except ScenarioError as e:
+                print(f"❌ {e}")
+                self.stats.failed_scenarios += 1
+
+
+class FakeBackends:
+    """The fake Supabase and Gemini servers, served from a background thread."""
+
+    def __init__(self, args):
+        self.supabase_port = free_port()
+        self.gemini_port = free_port()
+        self.servers = [
+            uvicorn.Server(uvicorn.Config(
+                create_fake_supabase(Latency(args.auth_latency, args.auth_latency / 2),
+                                     Latency(args.storage_latency, args.storage_latency / 2)),
+                host="127.0.0.1", port=self.supabase_port, log_level="warning")),
+            uvicorn.Server(uvicorn.Config(
+                create_fake_gemini(Latency(args.gemini_latency, args.gemini_jitter)),
+                host="127.0.0.1", port=self.gemini_port, log_level="warning")),
+        ]
+        self.thread = threading.Thread(target=self._serve, daemon=True)
+
+    def _serve(self):
+        async def serve_all():
+            await asyncio.gather(*(server.serve() for server in self.servers))
+        asyncio.run(serve_all())
+
+    def start(self):
+        self.thread.start()
+        while not all(server.started for server in self.servers):
+            if not self.thread.is_alive():
+                raise RuntimeError("fake backends failed to start")
+            time.sleep(0.01)
+
+    def stop(self):
+        for server in self.servers:
+            server.should_exit = True
+        self.thread.join(timeout=10)
+
+
+class Stack:
+    """The gateway and services as uvicorn subprocesses, wired to each other and the fakes."""
+
+    SERVICES = ["user-service", "file-service", "question-service", "api-gateway"]
+
+    def __init__(self, database_url: str, fakes: FakeBackends, log_dir: str):
+        self.ports = {service: free_port() for service in self.SERVICES}
+        self.urls = {service: f"http://127.0.0.1:{port}" for service, port in self.ports.items()}
+        self.log_dir = log_dir
+        self.env = service_env()
+        self.env.update({
+            "SUPABASE_URL": f"http://127.0.0.1:{fakes.supabase_port}",
+            "SUPABASE_SERVICE_ROLE_KEY": FAKE_SERVICE_KEY,
+            "DATABASE_URL": database_url,
+            "GEMINI_API_KEY": "fake-gemini-key",
+            "GEMINI_API_ENDPOINT": f"http://127.0.0.1:{fakes.gemini_port}",
+            "USER_SERVICE_URL": self.urls["user-service"],
+            "FILE_SERVICE_URL": self.urls["file-service"],
+            "QUESTION_SERVICE_URL": self.urls["question-service"],
+        })
+        self.processes: Dict[str, subprocess.Popen] = {}
+
+    def log_path(self, service: str) -> str:
+        return os.path.join(self.log_dir, f"{service}.log")
+
+    def start(self, timeout: float):
+        for service in self.SERVICES:
+            self.processes[service] = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--port", str(self.ports[service]), "--log-level", "warning"],
+                cwd=os.path.join(SERVICES_DIR, service),
+                env=self.env,
+                stdout=open(self.log_path(service), "w"),
+                stderr=subprocess.STDOUT,
+            )
+        deadline = time.perf_counter() + timeout
+        for service in self.SERVICES:
+            while True:
+                if self.processes[service].poll() is not None:
+                    raise RuntimeError(f"{service} exited; see {self.log_path(service)}")
+                try:
+                    if httpx.get(f"{self.urls[service]}/health", timeout=1.0).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if time.perf_counter() > deadline:
+                    raise RuntimeError(f"{service} not ready after {timeout} s; see {self.log_path(service)}")
+                time.sleep(0.05)
+
+    def stop(self):
+        for proc in self.processes.values():
+            proc.terminate()
+        for proc in self.processes.values():
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+def create_database(database_url: str, name: str) -> str:
+    """Create the scratch database with the full schema; returns its URL."""
+    admin = psycopg2.connect(database_url)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f'DROP DATABASE IF EXISTS "{name}"')
+        cur.execute(f'CREATE DATABASE "{name}"')
+    admin.close()
+
+    conn = psycopg2.connect(database_url, dbname=name)
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        create_extensions(cur)
+        load_sql(cur, os.path.join(ROOT, "scripts", "schema.sql"))
+        for _, path in list_migrations():
+            load_sql(cur, path)
+    conn.close()
+    return urlsplit(database_url)._replace(path=f"/{name}").geturl()
+
+
+def drop_database(database_url: str, name: str):
+    admin = psycopg2.connect(database_url)
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+    admin.close()
+
+
+async def run_load(gateway_url: str, args) -> Stats:
+    stats = Stats()
+    limits = httpx.Limits(max_connections=args.users * 2, max_keepalive_connections=args.users * 2)
+    async with httpx.AsyncClient(base_url=gateway_url, timeout=args.request_timeout, limits=limits) as client:
+        started = time.perf_counter()
+
+        async def ramped(n: int, user: VirtualUser):
+            await asyncio.sleep(args.ramp_up * n / args.users)
+            await user.run()
+
+        await asyncio.gather(*(ramped(n, VirtualUser(client, stats, args)) for n in range(args.users)))
+        stats.report(time.perf_counter() - started)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"),
+                        help="server to create the scratch database on (default: $BENCH_DATABASE_URL)")
+    parser.add_argument("--database", default="practice_loadtest", help="scratch database name (dropped first)")
+    parser.add_argument("--users", type=int, default=10, help="concurrent virtual users (default: 10)")
+    parser.add_argument("--iterations", type=int, default=3, help="scenarios per virtual user (default: 3)")
+    parser.add_argument("--ramp-up", type=float, default=2.0, help="seconds over which users start (default: 2)")
+    parser.add_argument("--pages", type=int, default=12, help="pages per uploaded PDF (default: 12)")
+    parser.add_argument("--questions", type=int, default=5, help="questions generated per quiz (default: 5)")
+    parser.add_argument("--gemini-latency", type=float, default=1500, help="fake Gemini mean latency, ms")
+    parser.add_argument("--gemini-jitter", type=float, default=500, help="fake Gemini latency jitter, +- ms")
+    parser.add_argument("--auth-latency", type=float, default=20, help="fake Supabase auth latency, ms")
+    parser.add_argument("--storage-latency", type=float, default=50, help="fake Supabase storage latency, ms")
+    parser.add_argument("--live", action="store_true", help="take quizzes over the live WebSocket")
+    parser.add_argument("--poll-interval", type=float, default=0.25, help="seconds between file status polls")
+    parser.add_argument("--processing-timeout", type=float, default=120, help="seconds to wait for a file")
+    parser.add_argument("--request-timeout", type=float, default=120, help="client timeout per request, s")
+    parser.add_argument("--startup-timeout", type=float, default=60, help="seconds to wait for the services")
+    parser.add_argument("--log-dir", help="keep service logs here (default: a temporary directory)")
+    parser.add_argument("--keep", action="store_true", help="keep the scratch database afterwards")
+    args = parser.parse_args()
+    if not args.database_url:
+        parser.error("--database-url or BENCH_DATABASE_URL is required")
+
+    log_dir = args.log_dir or tempfile.mkdtemp(prefix="loadtest-")
+    os.makedirs(log_dir, exist_ok=True)
+
+    database_url = create_database(args.database_url, args.database)
+    fakes = FakeBackends(args)
+    stack: Optional[Stack] = None
+    try:
+        fakes.start()
+        stack = Stack(database_url, fakes, log_dir)
+        started = time.perf_counter()
+        stack.start(args.startup_timeout)
+        print(f"✅ Stack ready in {time.perf_counter() - started:.1f} s (service logs in {log_dir})")
+        print(f"Running {args.users} users x {args.iterations} scenarios "
+              f"(Gemini {args.gemini_latency:.0f}+-{args.gemini_jitter:.0f} ms)")
+        stats = asyncio.run(run_load(stack.urls["api-gateway"], args))
+        print(f"\nFake Gemini calls: {fakes.servers[1].config.app.state.calls}")
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        stats = None
+    finally:
+        if stack:
+            stack.stop()
+        fakes.stop()
+        if not args.keep:
+            drop_database(args.database_url, args.database)
+    if stats is None or stats.failed_scenarios:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
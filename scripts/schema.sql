@@ -1,3 +1,7 @@
+-- Base schema, safe to re-run. Later index and constraint changes live in the
+-- numbered files under services/*/migrations and are applied once each by
+-- scripts/setup_db.py.
+
 -- Enable extensions
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 CREATE EXTENSION IF NOT EXISTS "vector";
@@ -33,9 +37,6 @@ CREATE TABLE IF NOT EXISTS user_settings (
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
-CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
-CREATE INDEX IF NOT EXISTS idx_user_settings_user_id ON user_settings(user_id);
-
 DROP TRIGGER IF EXISTS update_users_updated_at ON users;
 CREATE TRIGGER update_users_updated_at BEFORE UPDATE ON users
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
@@ -56,11 +57,21 @@ CREATE TABLE IF NOT EXISTS files (
     storage_path VARCHAR(512),
     status VARCHAR(50) DEFAULT 'pending',
     size BIGINT,
+    content_hash VARCHAR(64),
+    pages_done INTEGER NOT NULL DEFAULT 0,
+    pages_total INTEGER,
+    stage_timings JSONB,
     error_message TEXT,
     uploaded_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Columns added after the initial release
+ALTER TABLE files ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+ALTER TABLE files ADD COLUMN IF NOT EXISTS pages_done INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE files ADD COLUMN IF NOT EXISTS pages_total INTEGER;
+ALTER TABLE files ADD COLUMN IF NOT EXISTS stage_timings JSONB;
+
 -- Documents table (extracted content)
 CREATE TABLE IF NOT EXISTS documents (
     doc_id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
@@ -81,9 +92,125 @@ CREATE TABLE IF NOT EXISTS topics (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
-CREATE INDEX IF NOT EXISTS idx_files_owner_id ON files(owner_id);
-CREATE INDEX IF NOT EXISTS idx_documents_file_id ON documents(file_id);
+-- Storage objects shared by identical uploads, reference-counted per files row
+CREATE TABLE IF NOT EXISTS file_blobs (
+    content_hash VARCHAR(64) PRIMARY KEY,
+    storage_path VARCHAR(512) NOT NULL,
+    ref_count INTEGER NOT NULL DEFAULT 1,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Extraction jobs, shared by the file-service replicas. worker holds the
+-- spooled upload; NULL once the upload is in storage and any worker may run it
+CREATE TABLE IF NOT EXISTS file_jobs (
+    id BIGSERIAL PRIMARY KEY,
+    file_id UUID NOT NULL,
+    payload JSONB NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'queued', -- queued, running, failed
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker VARCHAR(255),
+    claimed_by VARCHAR(255),
+    next_run_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    last_error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_documents_file_id_page ON documents(file_id, page_number);
 CREATE INDEX IF NOT EXISTS idx_topics_doc_id ON topics(doc_id);
+CREATE INDEX IF NOT EXISTS idx_file_jobs_status_next_run ON file_jobs(status, next_run_at);
+
+DROP FUNCTION IF EXISTS register_file_blob(VARCHAR, VARCHAR);
+-- Register the stored object of a freshly processed upload and record it on
+-- the files row; returns the canonical storage path (an identical upload
+-- processed concurrently may already own one). A files row holds at most one
+-- reference: a retried job gets the path recorded by its earlier attempt.
+-- Returns NULL, taking no reference, if the file has been deleted.
+CREATE OR REPLACE FUNCTION register_file_blob(p_file_id UUID, p_content_hash VARCHAR, p_storage_path VARCHAR)
+RETURNS VARCHAR AS $$
+DECLARE
+    v_path VARCHAR;
+BEGIN
+    SELECT storage_path INTO v_path FROM files WHERE id = p_file_id FOR UPDATE;
+    IF NOT FOUND THEN
+        RETURN NULL;
+    END IF;
+    IF v_path IS NOT NULL THEN
+        RETURN v_path;
+    END IF;
+
+    INSERT INTO file_blobs (content_hash, storage_path)
+        VALUES (p_content_hash, p_storage_path)
+        ON CONFLICT (content_hash) DO UPDATE SET ref_count = file_blobs.ref_count + 1
+        RETURNING storage_path INTO v_path;
+    UPDATE files SET storage_path = v_path WHERE id = p_file_id;
+    RETURN v_path;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP FUNCTION IF EXISTS reuse_file_blob(VARCHAR, UUID);
+-- Attach an already-processed identical upload to p_file_id: takes a blob
+-- reference, copies the extracted pages and topics and marks the file completed.
+-- Returns the number of pages reused, or NULL if there is nothing to reuse.
+CREATE OR REPLACE FUNCTION reuse_file_blob(p_content_hash VARCHAR, p_file_id UUID)
+RETURNS INTEGER AS $$
+DECLARE
+    v_path VARCHAR;
+    v_source UUID;
+    v_pages INTEGER;
+BEGIN
+    SELECT storage_path INTO v_path FROM file_blobs
+        WHERE content_hash = p_content_hash FOR UPDATE;
+    IF v_path IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    SELECT id INTO v_source FROM files
+        WHERE content_hash = p_content_hash AND status = 'completed' AND id <> p_file_id
+        LIMIT 1;
+    IF v_source IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    UPDATE file_blobs SET ref_count = ref_count + 1 WHERE content_hash = p_content_hash;
+    INSERT INTO documents (file_id, page_number, text, embeddings)
+        SELECT p_file_id, page_number, text, embeddings FROM documents WHERE file_id = v_source;
+    GET DIAGNOSTICS v_pages = ROW_COUNT;
+
+    -- Copy the topic tree, remapping topic ids and page rows
+    WITH src AS (
+        SELECT t.topic_id, t.name, t.parent_topic_id, t.page_range, d.page_number,
+               uuid_generate_v4() AS new_id
+        FROM topics t JOIN documents d ON d.doc_id = t.doc_id
+        WHERE d.file_id = v_source
+    )
+    INSERT INTO topics (topic_id, name, parent_topic_id, doc_id, page_range)
+        SELECT s.new_id, s.name, p.new_id, nd.doc_id, s.page_range
+        FROM src s
+        JOIN documents nd ON nd.file_id = p_file_id AND nd.page_number = s.page_number
+        LEFT JOIN src p ON p.topic_id = s.parent_topic_id;
+    UPDATE files
+        SET status = 'completed', storage_path = v_path, pages_done = v_pages, pages_total = v_pages
+        WHERE id = p_file_id;
+    RETURN v_pages;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Drop one blob reference; returns the remaining count (NULL if untracked)
+CREATE OR REPLACE FUNCTION release_file_blob(p_content_hash VARCHAR)
+RETURNS INTEGER AS $$
+DECLARE
+    v_remaining INTEGER;
+BEGIN
+    UPDATE file_blobs SET ref_count = ref_count - 1
+        WHERE content_hash = p_content_hash
+        RETURNING ref_count INTO v_remaining;
+    IF v_remaining = 0 THEN
+        DELETE FROM file_blobs WHERE content_hash = p_content_hash;
+    END IF;
+    RETURN v_remaining;
+END;
+$$ LANGUAGE plpgsql;
+
 
 DROP TRIGGER IF EXISTS update_files_updated_at ON files;
 CREATE TRIGGER update_files_updated_at BEFORE UPDATE ON files
@@ -141,9 +268,6 @@ CREATE TABLE IF NOT EXISTS quiz_answers (
 );
 
 CREATE INDEX IF NOT EXISTS idx_rulesets_owner_id ON rulesets(owner_id);
-CREATE INDEX IF NOT EXISTS idx_generated_questions_ruleset_id ON generated_questions(ruleset_id);
-CREATE INDEX IF NOT EXISTS idx_quizzes_owner_id ON quizzes(owner_id);
-CREATE INDEX IF NOT EXISTS idx_quiz_answers_quiz_id ON quiz_answers(quiz_id);
 
 DROP TRIGGER IF EXISTS update_rulesets_updated_at ON rulesets;
 CREATE TRIGGER update_rulesets_updated_at BEFORE UPDATE ON rulesets
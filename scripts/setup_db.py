@@ -16,6 +16,19 @@ if not all([SUPABASE_URL, SUPABASE_SERVICE_KEY, DB_URL]):
     print("Please ensure SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY, and POSTGRES_URL are set.")
     exit(1)
 
+# Services whose numbered migrations are applied, in dependency order
+MIGRATION_SERVICES = ["user-service", "file-service", "question-service"]
+
+def list_migrations():
+    """(version, path) of the numbered migration files, in the order they apply."""
+    migrations = []
+    for service in MIGRATION_SERVICES:
+        directory = os.path.join("services", service, "migrations")
+        for name in sorted(os.listdir(directory)):
+            if name[:3].isdigit() and name.endswith(".sql"):
+                migrations.append((f"{service}/{name}", os.path.join(directory, name)))
+    return migrations
+
 def run_migrations():
     print("Running database migrations...")
     try:
@@ -31,6 +44,26 @@ def run_migrations():
         conn.commit()
         
         print("✅ Database schema created successfully.")
+        
+        # Apply numbered migrations not yet recorded, each in its own transaction
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version VARCHAR(255) PRIMARY KEY,
+                applied_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+            )
+        """)
+        cur.execute("SELECT version FROM schema_migrations")
+        applied = {row[0] for row in cur.fetchall()}
+        conn.commit()
+        for version, path in list_migrations():
+            if version in applied:
+                continue
+            with open(path, "r") as f:
+                cur.execute(f.read())
+            cur.execute("INSERT INTO schema_migrations (version) VALUES (%s)", (version,))
+            conn.commit()
+            print(f"✅ Applied migration {version}")
+        
         cur.close()
         conn.close()
     except Exception as e:
@@ -1,68 +1,106 @@
-from fastapi import FastAPI, Request, HTTPException, status
-from fastapi.responses import JSONResponse
-from fastapi import status as fastapi_status
-
-# Initialize FastAPI app
-app = FastAPI(
-    title="Practice Platform API Gateway",
-    description="Central gateway for routing requests to microservices",
-    version="1.0.0"
-)
-
-@app.exception_handler(Exception)
-async def generic_exception_handler(request: Request, exc: Exception):
-    return JSONResponse(
-        status_code=fastapi_status.HTTP_400_BAD_REQUEST,
-        content={"detail": str(exc)},
-    )
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, Response
+from fastapi import Request, HTTPException, WebSocket, status
+from fastapi.responses import Response, StreamingResponse
+from starlette.background import BackgroundTask
+import asyncio
 import httpx
 import os
-from typing import Optional
+import uuid
+from typing import AsyncIterator, List, Optional, Tuple, Union
+from websockets.asyncio.client import connect as websocket_connect
+from websockets.exceptions import ConnectionClosed, InvalidHandshake
+
+from common.bootstrap import create_app, on_shutdown, on_startup
+from common.tracing import outbound_headers, span
 
 # Initialize FastAPI app
-app = FastAPI(
+app = create_app(
+    "gateway",
     title="Practice Platform API Gateway",
     description="Central gateway for routing requests to microservices",
-    version="1.0.0"
-)
-
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    expose_headers=["X-Request-ID", "Server-Timing", "X-Profile-ID"]
 )
 
 # Service URLs
 USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://user-service:8001")
 FILE_SERVICE_URL = os.getenv("FILE_SERVICE_URL", "http://file-service:8002")
 QUESTION_SERVICE_URL = os.getenv("QUESTION_SERVICE_URL", "http://question-service:8003")
+QUESTION_SERVICE_WS_URL = QUESTION_SERVICE_URL.replace("http", "ws", 1)
+
+# File uploads are streamed to the file service, never held here; bodies over
+# the upload limit (plus room for the multipart framing) are refused
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(100 * 1024 * 1024)))
+MAX_UPLOAD_BODY = MAX_UPLOAD_SIZE + 64 * 1024
+
+# HTTP Client (created at startup)
+client: Optional[httpx.AsyncClient] = None
+
+def _too_large() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File exceeds the maximum size of {MAX_UPLOAD_SIZE} bytes"
+    )
 
-# HTTP Client
-client = httpx.AsyncClient()
+async def _limited_stream(request: Request) -> AsyncIterator[bytes]:
+    received = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > MAX_UPLOAD_BODY:
+            raise _too_large()
+        yield chunk
 
-async def proxy_request(url: str, method: str, headers: dict, content: Optional[bytes] = None, params: Optional[dict] = None):
+def upload_body(request: Request) -> Union[bytes, AsyncIterator[bytes]]:
+    """
+    The body of a file-service request, as a stream for methods that may
+    carry an upload. Raises 413 if it declares or reaches more than
+    MAX_UPLOAD_BODY bytes.
+    """
+    if request.method not in ("POST", "PUT"):
+        return b""
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > MAX_UPLOAD_BODY:
+        raise _too_large()
+    return _limited_stream(request)
+
+async def proxy_request(
+    url: str,
+    method: str,
+    headers: dict,
+    content: Union[bytes, AsyncIterator[bytes], None] = None,
+    params: Optional[List[Tuple[str, str]]] = None
+):
     try:
-        # Filter headers to forward
+        # Filter headers to forward; a streamed body keeps its declared length
+        streamed = content is not None and not isinstance(content, bytes)
         forward_headers = {
             k: v for k, v in headers.items() 
-            if k.lower() not in ['host', 'content-length']
+            if k.lower() not in ['host', 'x-request-id'] and (streamed or k.lower() != 'content-length')
         }
+        # Propagate the request ID assigned by the tracing middleware
+        forward_headers.update(outbound_headers())
         
-        response = await client.request(
-            method=method,
-            url=url,
-            headers=forward_headers,
-            content=content,
-            params=params,
-            timeout=60.0,
-            follow_redirects=False
-        )
-        
+        with span("upstream"):
+            upstream_request = client.build_request(
+                method=method,
+                url=url,
+                headers=forward_headers,
+                content=content,
+                params=params,
+                timeout=60.0
+            )
+            response = await client.send(upstream_request, stream=True, follow_redirects=False)
+
+        if "content-length" not in response.headers:
+            # A streamed body (e.g. roster results): pass chunks on as they arrive
+            return StreamingResponse(
+                response.aiter_raw(),
+                status_code=response.status_code,
+                headers={k: v for k, v in response.headers.items() if k.lower() not in ("transfer-encoding", "connection")},
+                background=BackgroundTask(response.aclose)
+            )
+        try:
+            await response.aread()
+        finally:
+            await response.aclose()
         return Response(
             content=response.content,
             status_code=response.status_code,
@@ -83,7 +121,7 @@ async def auth_proxy(path: str, request: Request):
         request.method, 
         dict(request.headers), 
         await request.body(),
-        dict(request.query_params)
+        request.query_params.multi_items()
     )
 
 @app.api_route("/api/users/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
@@ -94,7 +132,7 @@ async def users_proxy(path: str, request: Request):
         request.method, 
         dict(request.headers), 
         await request.body(),
-        dict(request.query_params)
+        request.query_params.multi_items()
     )
 
 # File Routes
@@ -107,8 +145,8 @@ async def files_root_proxy(request: Request):
         url,
         request.method,
         dict(request.headers),
-        await request.body(),
-        dict(request.query_params)
+        upload_body(request),
+        request.query_params.multi_items()
     )
 
 @app.api_route("/api/files/", methods=["GET", "POST", "PUT", "DELETE"])
@@ -118,8 +156,8 @@ async def files_root_slash_proxy(request: Request):
         url,
         request.method,
         dict(request.headers),
-        await request.body(),
-        dict(request.query_params)
+        upload_body(request),
+        request.query_params.multi_items()
     )
 
 @app.api_route("/api/files/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
@@ -129,8 +167,8 @@ async def files_proxy(path: str, request: Request):
         url, 
         request.method, 
         dict(request.headers), 
-        await request.body(),
-        dict(request.query_params)
+        upload_body(request),
+        request.query_params.multi_items()
     )
 
 # Question & Quiz Routes
@@ -143,7 +181,7 @@ async def rulesets_root_proxy(request: Request):
         request.method,
         dict(request.headers),
         await request.body(),
-        dict(request.query_params)
+        request.query_params.multi_items()
     )
 
 @app.api_route("/api/rulesets/", methods=["GET", "POST", "PUT", "DELETE"])
@@ -154,7 +192,7 @@ async def rulesets_root_slash_proxy(request: Request):
         request.method,
         dict(request.headers),
         await request.body(),
-        dict(request.query_params)
+        request.query_params.multi_items()
     )
 
 @app.api_route("/api/rulesets/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
@@ -165,7 +203,18 @@ async def rulesets_proxy(path: str, request: Request):
         request.method,
         dict(request.headers),
         await request.body(),
-        dict(request.query_params)
+        request.query_params.multi_items()
+    )
+
+@app.api_route("/api/questions", methods=["GET"])
+async def questions_proxy(request: Request):
+    url = f"{QUESTION_SERVICE_URL}/questions"
+    return await proxy_request(
+        url,
+        request.method,
+        dict(request.headers),
+        await request.body(),
+        request.query_params.multi_items()
     )
 
 @app.api_route("/api/generate", methods=["POST"])
@@ -176,7 +225,7 @@ async def generate_proxy(request: Request):
         request.method,
         dict(request.headers),
         await request.body(),
-        dict(request.query_params)
+        request.query_params.multi_items()
     )
 
 
@@ -188,7 +237,7 @@ async def quizzes_root_proxy(request: Request):
         request.method,
         dict(request.headers),
         await request.body(),
-        dict(request.query_params)
+        request.query_params.multi_items()
     )
 
 @app.api_route("/api/quizzes/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
@@ -199,15 +248,69 @@ async def quizzes_proxy(path: str, request: Request):
         request.method,
         dict(request.headers),
         await request.body(),
-        dict(request.query_params)
+        request.query_params.multi_items()
     )
 
+@app.websocket("/api/quizzes/{quiz_id}/live")
+async def quiz_live_proxy(websocket: WebSocket, quiz_id: str):
+    """Relay a live quiz session to the question service, frame by frame."""
+    headers = {
+        "X-Request-ID": websocket.headers.get("x-request-id") or uuid.uuid4().hex,
+        **({"Authorization": websocket.headers["authorization"]} if "authorization" in websocket.headers else {})
+    }
+    await websocket.accept()
+    try:
+        upstream = await websocket_connect(
+            f"{QUESTION_SERVICE_WS_URL}/quizzes/{quiz_id}/live", additional_headers=headers, open_timeout=10
+        )
+    except (OSError, InvalidHandshake, TimeoutError):
+        await websocket.close(code=1011, reason="Question service unavailable")
+        return
+
+    async def client_to_upstream():
+        try:
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    return
+                await upstream.send(message["text"] if message.get("text") is not None else message["bytes"])
+        except ConnectionClosed:
+            pass
+
+    async def upstream_to_client():
+        try:
+            async for message in upstream:
+                if isinstance(message, str):
+                    await websocket.send_text(message)
+                else:
+                    await websocket.send_bytes(message)
+        except ConnectionClosed:
+            pass
+
+    async with upstream:
+        relays = [asyncio.create_task(client_to_upstream()), asyncio.create_task(upstream_to_client())]
+        done, pending = await asyncio.wait(relays, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        if relays[1] in done:
+            # The service ended the session: pass its close code on (codes
+            # reserved for "no status"/"abnormal closure" cannot be sent)
+            code = upstream.close_code
+            if code in (None, 1005, 1006, 1015):
+                code = 1011
+            await websocket.close(code=code, reason=upstream.close_reason or "")
+
 # Health Check
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "api-gateway"}
 
+@on_startup(app)
+async def startup_event():
+    global client
+    client = httpx.AsyncClient()
+
 # Cleanup on shutdown
-@app.on_event("shutdown")
+@on_shutdown(app)
 async def shutdown_event():
     await client.aclose()
@@ -0,0 +1,74 @@
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+BODY_LIMIT = 1024
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Requests that reached the file service, with the body it received."""
+    received = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        received.append((request, await request.aread()))
+        return httpx.Response(201, json={"ok": True})
+
+    monkeypatch.setattr(main, "MAX_UPLOAD_BODY", BODY_LIMIT)
+    monkeypatch.setattr(main, "client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return received
+
+
+@pytest.fixture
+def gateway():
+    # Without a with-block, so the lifespan (and its real client) never starts
+    return TestClient(main.app)
+
+
+def chunked(body: bytes, size: int = 100):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+def test_forwards_an_upload_with_its_length(gateway, upstream):
+    response = gateway.post("/api/files/upload", files={"file": ("notes.pdf", b"x" * 500, "application/pdf")})
+    assert response.status_code == 201
+    [(request, body)] = upstream
+    assert request.url.path == "/files/upload"
+    assert b"x" * 500 in body
+    assert request.headers["content-length"] == str(len(body))
+    assert request.headers["content-type"].startswith("multipart/form-data; boundary=")
+
+
+def test_streams_a_chunked_upload(gateway, upstream):
+    response = gateway.post("/api/files/upload", content=chunked(b"y" * 900), headers={"content-type": "text/plain"})
+    assert response.status_code == 201
+    [(request, body)] = upstream
+    assert body == b"y" * 900
+    assert "content-length" not in request.headers
+
+
+def test_refuses_a_declared_length_over_the_limit(gateway, upstream):
+    response = gateway.post(
+        "/api/files/upload", content=b"x" * (BODY_LIMIT + 1), headers={"content-type": "text/plain"}
+    )
+    assert response.status_code == 413
+    assert upstream == []
+
+
+def test_refuses_a_chunked_body_over_the_limit(gateway, upstream):
+    response = gateway.post(
+        "/api/files/upload", content=chunked(b"x" * (BODY_LIMIT + 1)), headers={"content-type": "text/plain"}
+    )
+    assert response.status_code == 413
+
+
+def test_forwards_a_get_without_a_body(gateway, upstream):
+    response = gateway.get("/api/files", params={"page": "2"})
+    assert response.status_code == 201
+    [(request, body)] = upstream
+    assert request.url.path == "/files"
+    assert request.url.params["page"] == "2"
+    assert body == b""
@@ -0,0 +1 @@
+"""Helpers shared by the Practice Platform services."""
@@ -0,0 +1,116 @@
+"""
+Shared service bootstrap: app construction, lifecycle hooks and lazy imports.
+
+Importing a service should be cheap so that new pods become ready quickly.
+``create_app`` builds the FastAPI app (logging, CORS, tracing) with a lifespan that
+runs the hooks registered with ``on_startup`` / ``on_shutdown``; clients
+(Supabase, database pools, HTTP clients) are created there rather than at
+import. Heavy modules that are only needed by some requests are bound with
+``lazy_import`` and loaded on first attribute access.
+"""
+import importlib.util
+import logging
+import os
+import sys
+import time
+from contextlib import asynccontextmanager
+from types import ModuleType
+from typing import Awaitable, Callable, List, Optional
+
+from fastapi import FastAPI
+from fastapi.middleware.cors import CORSMiddleware
+
+from common.log import configure_logging
+from common.profiling import install_profiling
+from common.tracing import install_tracing, start_trace_export, stop_trace_export
+
+SUPABASE_URL = os.getenv("SUPABASE_URL", "")
+SUPABASE_SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
+
+Hook = Callable[[], Awaitable[None]]
+
+logger = logging.getLogger(__name__)
+
+
+def lazy_import(name: str) -> ModuleType:
+    """Return module ``name``, deferring its execution until an attribute is used."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def create_supabase_client():
+    """Build the service-role Supabase client (imports supabase, ~0.5 s)."""
+    from supabase import create_client
+    return create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY)
+
+
+def create_app(
+    service: str,
+    title: str,
+    description: str,
+    version: str = "1.0.0",
+    expose_headers: Optional[List[str]] = None,
+) -> FastAPI:
+    configure_logging(service)
+    startup_hooks: List[Hook] = []
+    shutdown_hooks: List[Hook] = []
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        started = time.perf_counter()
+        for hook in startup_hooks:
+            await hook()
+        app.state.startup_ms = round((time.perf_counter() - started) * 1000, 1)
+        logger.info("%s started in %s ms", service, app.state.startup_ms, extra={"startup_ms": app.state.startup_ms})
+        try:
+            yield
+        finally:
+            for hook in reversed(shutdown_hooks):
+                await hook()
+
+    app = FastAPI(title=title, description=description, version=version, lifespan=lifespan)
+    app.state.startup_hooks = startup_hooks
+    app.state.shutdown_hooks = shutdown_hooks
+
+    # CORS middleware
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=expose_headers or [],
+    )
+
+    # Profiling runs inside tracing so profiles carry the request ID
+    install_profiling(app, service)
+    install_tracing(app, service)
+    # Registered first, so the collector client is closed after the service's own hooks
+    startup_hooks.append(start_trace_export)
+    shutdown_hooks.append(stop_trace_export)
+    return app
+
+
+def on_startup(app: FastAPI):
+    """Register an async function to run, in registration order, before the app serves requests."""
+    def register(hook: Hook) -> Hook:
+        app.state.startup_hooks.append(hook)
+        return hook
+    return register
+
+
+def on_shutdown(app: FastAPI):
+    """Register an async function to run at shutdown (in reverse registration order)."""
+    def register(hook: Hook) -> Hook:
+        app.state.shutdown_hooks.append(hook)
+        return hook
+    return register
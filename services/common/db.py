@@ -0,0 +1,112 @@
+"""
+Async Postgres access shared by the services.
+
+Each service holds one ``Database`` (an asyncpg connection pool on
+``DATABASE_URL``, the same database ``scripts/setup_db.py`` migrates) and
+wraps it in a repository class that owns the service's SQL. Repositories
+only depend on the pool, so they run unchanged against a local Postgres.
+
+asyncpg prepares every statement it executes and keeps it in a per-connection
+cache (``DB_STATEMENT_CACHE_SIZE``), so the repositories' fixed query strings
+are parsed and planned once per connection and then run as prepared
+statements. Keep queries as constant strings for this to pay off.
+Transaction-mode poolers (PgBouncer, Supavisor on port 6543) cannot keep
+prepared statements between transactions: such URLs carry
+``pgbouncer=true`` and get the statement cache disabled.
+"""
+import json
+import os
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional, Sequence
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import asyncpg
+
+DATABASE_URL = os.getenv("DATABASE_URL") or os.getenv("POSTGRES_URL", "")
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "30"))
+
+
+def _plain(value: Any) -> Any:
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    return value
+
+
+def row_to_dict(record: Optional[asyncpg.Record]) -> Optional[Dict[str, Any]]:
+    """A row as a plain dict, with UUIDs as strings like the REST API returned them."""
+    if record is None:
+        return None
+    return {key: _plain(value) for key, value in record.items()}
+
+
+def _split_pooler_flag(dsn: str):
+    """Strip the ``pgbouncer`` query flag (asyncpg would send it as a server setting)."""
+    parts = urlsplit(dsn)
+    query = parse_qsl(parts.query)
+    pooled = any(key == "pgbouncer" and value == "true" for key, value in query)
+    query = [(key, value) for key, value in query if key != "pgbouncer"]
+    return urlunsplit(parts._replace(query=urlencode(query))), pooled
+
+
+class Database:
+    def __init__(
+        self,
+        dsn: str = DATABASE_URL,
+        min_size: int = DB_POOL_MIN_SIZE,
+        max_size: int = DB_POOL_MAX_SIZE,
+    ):
+        self.dsn, self.transaction_pooled = _split_pooler_flag(dsn)
+        self.min_size = min_size
+        self.max_size = max_size
+        self.pool: Optional[asyncpg.Pool] = None
+
+    async def connect(self):
+        if self.pool is not None:
+            return
+        if not self.dsn:
+            raise RuntimeError("DATABASE_URL is not set")
+        self.pool = await asyncpg.create_pool(
+            self.dsn,
+            min_size=self.min_size,
+            max_size=self.max_size,
+            statement_cache_size=0 if self.transaction_pooled else DB_STATEMENT_CACHE_SIZE,
+            command_timeout=DB_COMMAND_TIMEOUT,
+            init=self._init_connection,
+        )
+
+    async def close(self):
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def _init_connection(self, conn: asyncpg.Connection):
+        for name in ("json", "jsonb"):
+            await conn.set_type_codec(name, encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+    async def fetch(self, query: str, *args) -> List[Dict[str, Any]]:
+        return [row_to_dict(r) for r in await self.pool.fetch(query, *args)]
+
+    async def fetchrow(self, query: str, *args) -> Optional[Dict[str, Any]]:
+        return row_to_dict(await self.pool.fetchrow(query, *args))
+
+    async def fetchval(self, query: str, *args) -> Any:
+        return _plain(await self.pool.fetchval(query, *args))
+
+    async def execute(self, query: str, *args) -> str:
+        return await self.pool.execute(query, *args)
+
+    async def executemany(self, query: str, args: Sequence[Sequence[Any]]):
+        await self.pool.executemany(query, args)
+
+    @asynccontextmanager
+    async def transaction(self):
+        """A connection with an open transaction, committed when the block exits cleanly."""
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                yield conn
@@ -0,0 +1,155 @@
+"""
+Structured logging shared by the services.
+
+``configure_logging`` (called by ``create_app``) routes the standard
+``logging`` module, uvicorn's loggers included, through a bounded queue to a
+listener thread that writes one JSON object per line to stdout. Request
+handlers only pay for enqueueing a record: formatting and the write to
+stdout happen off the event loop, and if the queue is full the record is
+dropped (and counted) rather than blocking the request.
+
+Each line carries the timestamp, level, service, logger, message, the
+current request's ID/method/path and any ``extra={...}`` fields. String
+values longer than ``LOG_MAX_FIELD_CHARS`` are truncated.
+
+``LOG_LEVEL`` sets the level (default INFO). At DEBUG, debug records are
+kept for a ``LOG_DEBUG_SAMPLE_RATE`` share of requests (default 0.1), chosen
+by request ID so a sampled request keeps all its debug lines. The access
+line for each request is written by the tracing middleware.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import zlib
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from common.tracing import current_trace
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.1"))
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "1000"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Attributes every LogRecord has; anything else on a record came from extra={...}
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+dropped = 0
+
+
+def truncate(value: Any, limit: int = LOG_MAX_FIELD_CHARS) -> Any:
+    if isinstance(value, str) and len(value) > limit:
+        return f"{value[:limit]}...(+{len(value) - limit} chars)"
+    return value
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname.lower(),
+            "service": self.service,
+            "logger": record.name,
+            "msg": truncate(record.getMessage()),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = truncate(value)
+        if record.exc_text:
+            # Tracebacks are kept whole
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class DebugSampler(logging.Filter):
+    """Keep debug records for a share of requests (all of a kept request's records)."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.threshold = int(rate * 10000)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        # Filters run before prepare() copies the trace onto the record
+        request_id = getattr(record, "request_id", None)
+        if request_id is None:
+            trace = current_trace()
+            request_id = trace.request_id if trace is not None else None
+        if request_id:
+            return zlib.crc32(request_id.encode()) % 10000 < self.threshold
+        return random.random() * 10000 < self.threshold
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the listener thread, dropping them if the queue is full."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Only what depends on the calling context is done here; the listener formats
+        trace = current_trace()
+        if trace is not None and not hasattr(record, "request_id"):
+            record.request_id = trace.request_id
+            if trace.method:
+                record.method = trace.method
+                record.path = trace.path
+        if record.args:
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            # Tracebacks hold frames alive; render them now
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record: logging.LogRecord):
+        global dropped
+        try:
+            self.enqueue(self.prepare(record))
+        except queue.Full:
+            dropped += 1
+        except Exception:
+            self.handleError(record)
+
+    def enqueue(self, record: logging.LogRecord):
+        self.queue.put_nowait(record)
+
+
+def configure_logging(service: str):
+    """Send all logging through the queue to JSON lines on stdout (once per process)."""
+    global _listener
+    if _listener is not None:
+        return
+
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter(service))
+    log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(LOG_QUEUE_SIZE)
+    handler = NonBlockingQueueHandler(log_queue)
+    # Filters run in the caller, before the record is queued
+    if LOG_LEVEL == "DEBUG" and LOG_DEBUG_SAMPLE_RATE < 1:
+        handler.addFilter(DebugSampler(LOG_DEBUG_SAMPLE_RATE))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(LOG_LEVEL)
+    for name in ("uvicorn", "uvicorn.error", "uvicorn.access"):
+        uvicorn_logger = logging.getLogger(name)
+        uvicorn_logger.handlers = []
+        uvicorn_logger.propagate = True
+    # The tracing middleware writes the access line, and httpx would log
+    # every call the gateway proxies
+    for name in ("uvicorn.access", "httpx"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    _listener = logging.handlers.QueueListener(log_queue, stream, respect_handler_level=False)
+    _listener.start()
+    atexit.register(_listener.stop)
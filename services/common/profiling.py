@@ -0,0 +1,264 @@
+"""
+On-demand sampling profiles of single requests.
+
+Off unless configured: with neither ``PROFILE_TOKEN`` nor
+``PROFILE_SAMPLE_RATE`` set, ``install_profiling`` adds nothing to the app.
+When enabled, a request is profiled if it carries ``X-Profile: <PROFILE_TOKEN>``
+(the gateway forwards the header, so the services behind it are profiled
+too) or is picked by ``PROFILE_SAMPLE_RATE`` (0-1).
+
+While a profiled request runs, a sampler thread records every
+``PROFILE_INTERVAL_MS`` the stack of each task the request started: the
+running frames if the task is on the event loop, or the chain of awaits it
+is suspended in (so time spent waiting on the database or another service
+shows up as well). Each task is sampled on its own, like a thread, so
+concurrent work (e.g. ``asyncio.gather``) adds up to more than the wall time. The result is in collapsed-stack format, one
+``frame;frame;... count`` line per stack, which flamegraph.pl, inferno and
+speedscope read directly.
+
+Profiles are tagged with the request ID (returned as ``X-Profile-ID``),
+written to ``PROFILE_DIR`` if set and kept in memory for
+``GET /debug/profiles`` and ``GET /debug/profiles/{request_id}``, which
+require ``X-Profile-Token: <PROFILE_TOKEN>``.
+"""
+import asyncio
+import hmac
+import os
+import re
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, Optional, Set
+
+from fastapi import FastAPI, Header, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
+from common.tracing import current_request_id
+
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-ID"
+PROFILE_TOKEN_HEADER = "X-Profile-Token"
+
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", "")
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ",")
+
+
+# Tasks suspended entirely inside these packages are framework plumbing
+# (e.g. the middleware's stream watchers), not work done for the request
+_PLUMBING = tuple(f"{os.sep}{name}{os.sep}" for name in ("starlette", "anyio", "asyncio"))
+
+
+def _awaiting_stack(awaitable):
+    """Frames of a suspended coroutine chain, outermost first, ending in what it
+    waits on, and whether they are all framework plumbing."""
+    names = []
+    plumbing = True
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "ag_frame", None) \
+            or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            names.append(f"<await {type(awaitable).__name__}>")
+            break
+        names.append(_frame_name(frame))
+        plumbing = plumbing and any(part in frame.f_code.co_filename for part in _PLUMBING)
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "ag_await", None) \
+            or getattr(awaitable, "gi_yieldfrom", None)
+    return names, plumbing
+
+
+class RequestProfile:
+    def __init__(self, service: str, request_id: str, method: str, path: str, trigger: str):
+        self.service = service
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.trigger = trigger
+        self.tasks: Set[asyncio.Task] = set()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started = time.perf_counter()
+        self.created_at = datetime.now(timezone.utc).isoformat()
+        self.status: Optional[int] = None
+        self.duration_ms: Optional[float] = None
+
+    def sample(self, running: Optional[asyncio.Task], loop_frame):
+        root = f"{self.service} {self.method} {self.path}"
+        for task in list(self.tasks):
+            if task.done():
+                continue
+            coro = task.get_coro()
+            if task is running and loop_frame is not None:
+                # On the loop: the thread's frames from the task's coroutine up
+                frames = []
+                frame = loop_frame
+                while frame is not None:
+                    frames.append(_frame_name(frame))
+                    if frame is getattr(coro, "cr_frame", None):
+                        break
+                    frame = frame.f_back
+                stack = frames[::-1]
+            else:
+                stack, plumbing = _awaiting_stack(coro)
+                if plumbing:
+                    continue
+            self.stacks[";".join([root, *stack])] += 1
+        self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "request_id": self.request_id,
+            "service": self.service,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "duration_ms": self.duration_ms,
+            "samples": self.samples,
+            "interval_ms": PROFILE_INTERVAL_MS,
+            "trigger": self.trigger,
+            "created_at": self.created_at,
+        }
+
+
+class Sampler:
+    """Samples the active profiles from a background thread while there are any."""
+
+    def __init__(self, interval_ms: float):
+        self.interval = interval_ms / 1000
+        self.active: Set[RequestProfile] = set()
+        self.lock = threading.Lock()
+        self.thread: Optional[threading.Thread] = None
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.loop_thread_id: Optional[int] = None
+
+    def add(self, profile: RequestProfile):
+        with self.lock:
+            self.loop = asyncio.get_running_loop()
+            self.loop_thread_id = threading.get_ident()
+            self.active.add(profile)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self.thread.start()
+
+    def remove(self, profile: RequestProfile):
+        with self.lock:
+            self.active.discard(profile)
+
+    def _run(self):
+        while True:
+            with self.lock:
+                profiles = list(self.active)
+                if not profiles:
+                    self.thread = None
+                    return
+            loop_frame = sys._current_frames().get(self.loop_thread_id)
+            running = asyncio.current_task(self.loop)
+            for profile in profiles:
+                try:
+                    profile.sample(running, loop_frame)
+                except (RuntimeError, ValueError):
+                    pass  # the loop moved on while we looked; skip this sample
+            del loop_frame
+            time.sleep(self.interval)
+
+
+_active_profile: ContextVar[Optional[RequestProfile]] = ContextVar("active_profile", default=None)
+
+
+def _install_task_factory(loop: asyncio.AbstractEventLoop):
+    """Attach tasks created inside a profiled request to its profile."""
+    previous = loop.get_task_factory()
+
+    def task_factory(loop, coro, context=None):
+        if previous is not None:
+            task = previous(loop, coro) if context is None else previous(loop, coro, context=context)
+        else:
+            task = asyncio.Task(coro, loop=loop, context=context)
+        profile = context.get(_active_profile) if context is not None else _active_profile.get()
+        if profile is not None:
+            profile.tasks.add(task)
+        return task
+
+    task_factory.profiling = True
+    loop.set_task_factory(task_factory)
+
+
+def _write_profile(profile: RequestProfile):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    # The request ID may come from the client
+    name = re.sub(r"[^A-Za-z0-9_.-]", "_", f"{profile.service}-{profile.request_id}")
+    with open(os.path.join(PROFILE_DIR, f"{name}.folded"), "w") as f:
+        f.write(profile.collapsed())
+
+
+def install_profiling(app: FastAPI, service: str):
+    """Register the profiling middleware and admin routes on ``app`` (no-op unless enabled)."""
+    if not (PROFILE_TOKEN or PROFILE_SAMPLE_RATE > 0):
+        return
+
+    sampler = Sampler(PROFILE_INTERVAL_MS)
+    recent: Deque[RequestProfile] = deque(maxlen=PROFILE_KEEP)
+
+    def check_token(token: Optional[str]):
+        if not PROFILE_TOKEN or not hmac.compare_digest(token or "", PROFILE_TOKEN):
+            raise HTTPException(status_code=403, detail="Invalid profile token")
+
+    @app.get("/debug/profiles", include_in_schema=False)
+    async def list_profiles(token: Optional[str] = Header(None, alias=PROFILE_TOKEN_HEADER)):
+        check_token(token)
+        return [profile.summary() for profile in reversed(recent)]
+
+    @app.get("/debug/profiles/{request_id}", include_in_schema=False)
+    async def get_profile(request_id: str, token: Optional[str] = Header(None, alias=PROFILE_TOKEN_HEADER)):
+        check_token(token)
+        for profile in recent:
+            if profile.request_id == request_id:
+                return PlainTextResponse(profile.collapsed())
+        raise HTTPException(status_code=404, detail="Profile not found")
+
+    @app.middleware("http")
+    async def profiling_middleware(request: Request, call_next):
+        if request.url.path.startswith("/debug/profiles"):
+            return await call_next(request)
+        if PROFILE_TOKEN and hmac.compare_digest(request.headers.get(PROFILE_HEADER, ""), PROFILE_TOKEN):
+            trigger = "header"
+        elif PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+            trigger = "sampled"
+        else:
+            return await call_next(request)
+
+        loop = asyncio.get_running_loop()
+        if not getattr(loop.get_task_factory(), "profiling", False):
+            _install_task_factory(loop)
+
+        profile = RequestProfile(service, current_request_id() or "", request.method, request.url.path, trigger)
+        token = _active_profile.set(profile)
+        sampler.add(profile)
+        try:
+            response = await call_next(request)
+        finally:
+            _active_profile.reset(token)
+            sampler.remove(profile)
+        profile.status = response.status_code
+        profile.duration_ms = round((time.perf_counter() - profile.started) * 1000, 3)
+        profile.tasks.clear()
+
+        recent.append(profile)
+        if PROFILE_DIR:
+            await asyncio.to_thread(_write_profile, profile)
+        response.headers[PROFILE_ID_HEADER] = profile.request_id
+        return response
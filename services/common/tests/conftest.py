@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The services import the shared package as ``common`` (PYTHONPATH=..)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
@@ -0,0 +1,62 @@
+import logging
+import queue
+import uuid
+
+from common import tracing
+from common.log import DebugSampler, NonBlockingQueueHandler
+
+
+def make_logger(rate: float):
+    records: "queue.Queue[logging.LogRecord]" = queue.Queue()
+    handler = NonBlockingQueueHandler(records)
+    handler.addFilter(DebugSampler(rate))
+    logger = logging.getLogger(f"test-{uuid.uuid4().hex}")
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.DEBUG)
+    return logger, records
+
+
+def drain(records):
+    kept = []
+    while not records.empty():
+        kept.append(records.get_nowait())
+    return kept
+
+
+def test_sampled_request_keeps_all_its_debug_lines():
+    logger, records = make_logger(0.5)
+    kept_requests = 0
+    for _ in range(200):
+        trace = tracing.Trace("test", uuid.uuid4().hex, "GET", "/")
+        token = tracing._current_trace.set(trace)
+        try:
+            for n in range(10):
+                logger.debug("step %d", n)
+        finally:
+            tracing._current_trace.reset(token)
+        kept = drain(records)
+        assert len(kept) in (0, 10)
+        assert all(record.request_id == trace.request_id for record in kept)
+        kept_requests += bool(kept)
+    assert 60 < kept_requests < 140
+
+
+def test_sampling_is_by_request_id():
+    logger, records = make_logger(0.5)
+    request_id = uuid.uuid4().hex
+    for _ in range(3):
+        token = tracing._current_trace.set(tracing.Trace("test", request_id))
+        try:
+            logger.debug("again")
+        finally:
+            tracing._current_trace.reset(token)
+    assert len(drain(records)) in (0, 3)
+
+
+def test_info_and_above_are_never_sampled():
+    logger, records = make_logger(0.0)
+    logger.debug("dropped")
+    logger.info("kept")
+    logger.warning("kept")
+    assert [record.levelno for record in drain(records)] == [logging.INFO, logging.WARNING]
@@ -0,0 +1,49 @@
+import asyncio
+import gc
+
+import httpx
+
+from common import tracing
+
+
+def test_collector_posts_share_one_client_and_all_arrive(monkeypatch):
+    received = []
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        await asyncio.sleep(0.01)
+        received.append(request)
+        return httpx.Response(204)
+
+    clients = []
+    real_client = httpx.AsyncClient
+
+    def client(**kwargs):
+        clients.append(real_client(transport=httpx.MockTransport(handle), **kwargs))
+        return clients[-1]
+
+    monkeypatch.setattr(tracing, "TRACE_COLLECTOR_URL", "http://collector/traces")
+    monkeypatch.setattr(httpx, "AsyncClient", client)
+
+    async def run():
+        await tracing.start_trace_export()
+        for n in range(20):
+            await tracing.export_trace({"request_id": str(n)})
+        # Posts in flight are held by the module, not only by the event loop
+        gc.collect()
+        assert len(tracing._pending_posts) == 20
+        await tracing.stop_trace_export()
+
+    asyncio.run(run())
+    assert len(clients) == 1 and clients[0].is_closed
+    assert len(received) == 20
+    assert not tracing._pending_posts and tracing._collector is None
+
+
+def test_nothing_is_posted_without_a_started_client(monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_COLLECTOR_URL", "http://collector/traces")
+
+    async def run():
+        await tracing.export_trace({"request_id": "1"})
+
+    asyncio.run(run())
+    assert not tracing._pending_posts
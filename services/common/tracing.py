@@ -0,0 +1,188 @@
+"""
+Request-ID propagation and lightweight timing spans.
+
+Every service installs the tracing middleware, which reuses the incoming
+``X-Request-ID`` (or assigns a new one), records spans for the steps of the
+request and returns them as a ``Server-Timing`` header. Completed traces can
+be exported as JSON lines to a local file (``TRACE_EXPORT_PATH``) and/or
+POSTed to a collector (``TRACE_COLLECTOR_URL``) through one client opened
+and closed with the app (``start_trace_export`` / ``stop_trace_export``). Unless ``LOG_ACCESS`` is
+off, each request also gets an access log line with its route, status and
+duration (see ``common.log``).
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Set
+
+from fastapi import FastAPI, Request
+
+REQUEST_ID_HEADER = "X-Request-ID"
+SERVER_TIMING_HEADER = "Server-Timing"
+
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")
+TRACE_COLLECTOR_URL = os.getenv("TRACE_COLLECTOR_URL", "")
+LOG_ACCESS = os.getenv("LOG_ACCESS", "true").lower() in ("1", "true", "yes")
+
+access_logger = logging.getLogger("access")
+
+# Collector client while the app runs, and the posts in flight (the event
+# loop only keeps weak references to tasks)
+_collector = None
+_pending_posts: Set["asyncio.Task[None]"] = set()
+
+
+class Trace:
+    def __init__(self, service: str, request_id: str, method: str = "", path: str = ""):
+        self.service = service
+        self.request_id = request_id
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+
+    def add_span(self, name: str, start: float, end: float, attrs: Dict[str, Any]):
+        self.spans.append({
+            "name": name,
+            "start_ms": round((start - self.started) * 1000, 3),
+            "duration_ms": round((end - start) * 1000, 3),
+            **({"attrs": attrs} if attrs else {}),
+        })
+
+    def server_timing(self, total_ms: float) -> str:
+        # Aggregate repeated spans (e.g. one insert per question) by name
+        totals: Dict[str, float] = {}
+        for s in self.spans:
+            totals[s["name"]] = totals.get(s["name"], 0.0) + s["duration_ms"]
+        entries = [f"{name};dur={dur:.1f}" for name, dur in totals.items()]
+        entries.append(f"{self.service};dur={total_ms:.1f}")
+        return ", ".join(entries)
+
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def current_request_id() -> Optional[str]:
+    trace = _current_trace.get()
+    return trace.request_id if trace else None
+
+
+def outbound_headers() -> Dict[str, str]:
+    """Headers to attach to calls made to other services."""
+    request_id = current_request_id()
+    return {REQUEST_ID_HEADER: request_id} if request_id else {}
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Time a block of work and attach it to the current request's trace."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add_span(name, start, time.perf_counter(), attrs)
+
+
+def _write_trace(record: Dict[str, Any]):
+    with open(TRACE_EXPORT_PATH, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+async def start_trace_export():
+    """Open the collector client; an app startup hook."""
+    global _collector
+    if TRACE_COLLECTOR_URL and _collector is None:
+        import httpx
+
+        _collector = httpx.AsyncClient(timeout=2.0)
+
+
+async def stop_trace_export():
+    """Let posts in flight finish, then close the collector client; an app shutdown hook."""
+    global _collector
+    if _pending_posts:
+        await asyncio.gather(*_pending_posts, return_exceptions=True)
+    if _collector is not None:
+        await _collector.aclose()
+        _collector = None
+
+
+async def _post_trace(record: Dict[str, Any]):
+    import httpx
+
+    try:
+        await _collector.post(TRACE_COLLECTOR_URL, json=record)
+    except httpx.HTTPError:
+        pass
+
+
+async def export_trace(record: Dict[str, Any]):
+    if TRACE_EXPORT_PATH:
+        await asyncio.to_thread(_write_trace, record)
+    if TRACE_COLLECTOR_URL and _collector is not None:
+        # Never hold the response on the collector
+        task = asyncio.create_task(_post_trace(record))
+        _pending_posts.add(task)
+        task.add_done_callback(_pending_posts.discard)
+
+
+def install_tracing(app: FastAPI, service: str):
+    """Register the request-ID/timing middleware on ``app``."""
+
+    @app.middleware("http")
+    async def tracing_middleware(request: Request, call_next):
+        request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+        trace = Trace(service, request_id, request.method, request.url.path)
+        token = _current_trace.set(trace)
+        try:
+            response = await call_next(request)
+        finally:
+            _current_trace.reset(token)
+
+        total_ms = (time.perf_counter() - trace.started) * 1000
+        response.headers[REQUEST_ID_HEADER] = request_id
+        upstream_timing = response.headers.get(SERVER_TIMING_HEADER)
+        timing = trace.server_timing(total_ms)
+        response.headers[SERVER_TIMING_HEADER] = (
+            f"{timing}, {upstream_timing}" if upstream_timing else timing
+        )
+
+        if LOG_ACCESS:
+            route = request.scope.get("route")
+            # The trace context is already reset here, so the request fields are passed explicitly
+            access_logger.info(
+                "%s %s %s", request.method, request.url.path, response.status_code,
+                extra={
+                    "request_id": request_id,
+                    "method": request.method,
+                    "path": request.url.path,
+                    "route": getattr(route, "path", None),
+                    "status": response.status_code,
+                    "duration_ms": round(total_ms, 3),
+                },
+            )
+
+        if TRACE_EXPORT_PATH or TRACE_COLLECTOR_URL:
+            await export_trace({
+                "request_id": request_id,
+                "service": service,
+                "method": request.method,
+                "path": request.url.path,
+                "status": response.status_code,
+                "duration_ms": round(total_ms, 3),
+                "spans": trace.spans,
+            })
+        return response
@@ -0,0 +1,94 @@
+"""
+CPU-only page embeddings and an in-memory nearest-neighbour index.
+
+Embeddings are signed feature-hashed unigrams and bigrams with sublinear term
+frequency, L2-normalised, so cosine similarity is a dot product. They are
+sized to the ``documents.embeddings vector(1536)`` column and need no model
+download. ``embed_texts`` runs in the extraction workers; ``VectorIndex`` is
+used by the API process.
+"""
+import zlib
+from typing import List, Tuple
+
+import numpy as np
+
+from topics import STOPWORDS, TOKEN_RE
+
+EMBEDDING_DIM = 1536
+EXACT_SEARCH_LIMIT = 2048  # below this many vectors a brute-force scan is faster
+IVF_ITERATIONS = 8
+
+
+def _features(text: str) -> List[str]:
+    tokens = [t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS]
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def embed_texts(texts: List[str]) -> np.ndarray:
+    """Embed a batch of texts into an (n, EMBEDDING_DIM) float32 matrix."""
+    rows, cols, signs = [], [], []
+    for row, text in enumerate(texts):
+        for feature in _features(text):
+            # crc32 rather than hash(): embeddings must be stable across processes
+            h = zlib.crc32(feature.encode())
+            rows.append(row)
+            cols.append(h % EMBEDDING_DIM)
+            signs.append(1.0 if h & 0x80000000 else -1.0)
+
+    counts = np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+    np.add.at(counts, (np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)), np.array(signs, dtype=np.float32))
+    vectors = np.sign(counts) * np.log1p(np.abs(counts))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-9)
+
+
+def to_pgvector(vector: np.ndarray) -> str:
+    return "[" + ",".join(f"{x:.5f}" for x in vector) + "]"
+
+
+class VectorIndex:
+    """
+    Top-k cosine search over normalised vectors.
+
+    Small collections are scanned exactly. Larger ones use an IVF index:
+    vectors are bucketed by their nearest k-means centroid and a query only
+    scans the ``nprobe`` closest buckets.
+    """
+
+    def __init__(self, vectors: np.ndarray, ids: List[int], nprobe: int = 8):
+        self.vectors = vectors.astype(np.float32, copy=False)
+        self.ids = np.asarray(ids)
+        self.nprobe = nprobe
+        self.centroids = None
+        self.lists: List[np.ndarray] = []
+        if len(self.vectors) > EXACT_SEARCH_LIMIT:
+            self._build_ivf()
+
+    def _build_ivf(self):
+        n = len(self.vectors)
+        k = int(np.sqrt(n))
+        rng = np.random.default_rng(0)
+        centroids = self.vectors[rng.choice(n, k, replace=False)]
+        for _ in range(IVF_ITERATIONS):
+            assignment = np.argmax(self.vectors @ centroids.T, axis=1)
+            for c in range(k):
+                members = self.vectors[assignment == c]
+                if len(members):
+                    centroid = members.mean(axis=0)
+                    centroids[c] = centroid / max(np.linalg.norm(centroid), 1e-9)
+        self.centroids = centroids
+        assignment = np.argmax(self.vectors @ centroids.T, axis=1)
+        self.lists = [np.flatnonzero(assignment == c) for c in range(k)]
+
+    def search(self, query: np.ndarray, k: int) -> List[Tuple[int, float]]:
+        """Return up to ``k`` (id, score) pairs, best first."""
+        if self.centroids is None:
+            candidates = np.arange(len(self.vectors))
+        else:
+            probes = np.argsort(self.centroids @ query)[::-1][:self.nprobe]
+            candidates = np.concatenate([self.lists[c] for c in probes])
+        if len(candidates) == 0:
+            return []
+        scores = self.vectors[candidates] @ query
+        top = np.argsort(scores)[::-1][:k]
+        return [(int(self.ids[candidates[i]]), float(scores[i])) for i in top]
@@ -0,0 +1,74 @@
+"""
+Text extraction for uploaded documents.
+
+These functions run inside the file-service extraction worker processes, so
+this module must stay import-light: no FastAPI app, no Supabase client.
+"""
+import resource
+import signal
+from typing import Any, Callable, Tuple
+
+import PyPDF2
+from pptx import Presentation
+
+import embeddings
+
+
+class ExtractionTimeout(Exception):
+    pass
+
+
+def _on_alarm(signum, frame):
+    raise ExtractionTimeout("Text extraction timed out")
+
+
+def init_worker(memory_limit_mb: int = 0):
+    """Process-pool initializer: cap the worker's address space and arm the timeout handler."""
+    if memory_limit_mb:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    signal.signal(signal.SIGALRM, _on_alarm)
+
+
+def open_pages(file_path: str, file_extension: str) -> Tuple[int, Callable[[int], str]]:
+    """Parse a document once: its number of PDF pages or PPTX slides, and a function giving page i's text."""
+    if file_extension == '.pdf':
+        pdf_pages = PyPDF2.PdfReader(file_path).pages
+        return len(pdf_pages), lambda i: pdf_pages[i].extract_text() or ""
+    elif file_extension in ['.ppt', '.pptx']:
+        slides = list(Presentation(file_path).slides)
+        return len(slides), lambda i: _slide_text(slides[i])
+    return 0, lambda i: ""
+
+
+def _slide_text(slide) -> str:
+    # Title first, so topic segmentation sees it as the slide heading
+    title = slide.shapes.title
+    shapes = ([title] if title is not None else []) + [s for s in slide.shapes if s is not title]
+    return "\n".join(shape.text for shape in shapes if hasattr(shape, "text"))
+
+
+def extract_batches(file_path: str, file_extension: str, start: int, batch_size: int, out) -> int:
+    """
+    Extract and embed the pages from ``start`` on, parsing the file once.
+    Puts the page count on ``out``, then ``(start, pages, vectors)`` for
+    every ``batch_size`` pages as soon as they are done (vectors formatted
+    for pgvector), then None. Returns the page count.
+    """
+    total, page_text = open_pages(file_path, file_extension)
+    out.put(total)
+    for batch_start in range(start, total, batch_size):
+        pages = [page_text(i) for i in range(batch_start, min(batch_start + batch_size, total))]
+        vectors = embeddings.embed_texts(pages)
+        out.put((batch_start, pages, [embeddings.to_pgvector(v) for v in vectors]))
+    out.put(None)
+    return total
+
+
+def run_with_timeout(func: Callable[..., Any], timeout: int, *args) -> Any:
+    """Worker entry point: run ``func(*args)``, giving up after ``timeout`` seconds."""
+    signal.alarm(timeout)
+    try:
+        return func(*args)
+    finally:
+        signal.alarm(0)
@@ -0,0 +1,123 @@
+"""
+Extraction job queue for the file-service.
+
+Jobs are rows of the ``file_jobs`` table, shared by all replicas, so queued
+work outlives the pod that accepted it. An upload is spooled on the disk of
+that pod, so its job is only run by that worker (``worker``) until the
+spooled file is in storage and the job is handed off (``worker`` cleared);
+after that any replica may run it, reading the stored object.
+
+- ``claim`` takes the oldest due job this worker may run; ``SKIP LOCKED``
+  keeps two replicas from taking the same one.
+- ``release`` puts a job back without counting its attempt, for jobs
+  interrupted by a shutdown.
+- ``recover`` requeues the jobs a previous run of this worker left running
+  when it died. Those attempts count, so a file that keeps killing the
+  worker ends up failed.
+"""
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from common.db import Database
+
+ENQUEUE = "INSERT INTO file_jobs (file_id, payload, worker) VALUES ($1, $2, $3) RETURNING id"
+CLAIM = """
+    UPDATE file_jobs SET status = 'running', attempts = attempts + 1, claimed_by = $1
+    WHERE id = (
+        SELECT id FROM file_jobs
+        WHERE status = 'queued' AND next_run_at <= NOW() AND (worker IS NULL OR worker = $1)
+        ORDER BY next_run_at
+        LIMIT 1
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, file_id, payload, attempts
+"""
+COMPLETE = "DELETE FROM file_jobs WHERE id = $1"
+RETRY = """
+    UPDATE file_jobs SET status = 'queued', claimed_by = NULL, last_error = $2,
+        next_run_at = NOW() + make_interval(secs => $3)
+    WHERE id = $1
+"""
+FAIL = "UPDATE file_jobs SET status = 'failed', claimed_by = NULL, last_error = $2 WHERE id = $1"
+RELEASE = """
+    UPDATE file_jobs SET status = 'queued', claimed_by = NULL, attempts = attempts - 1
+    WHERE id = $1 AND status = 'running'
+"""
+RECOVER = """
+    UPDATE file_jobs SET status = 'queued', claimed_by = NULL, next_run_at = NOW()
+    WHERE status = 'running' AND claimed_by = $1
+"""
+GET_LOCAL_JOBS = """
+    SELECT id, file_id, payload, attempts FROM file_jobs
+    WHERE status = 'queued' AND worker = $1
+    ORDER BY next_run_at
+"""
+HAND_OFF = "UPDATE file_jobs SET worker = NULL WHERE id = $1"
+GET_DEPTH = """
+    SELECT status, COUNT(*) AS count, EXTRACT(EPOCH FROM NOW() - MIN(created_at))::float AS oldest_age
+    FROM file_jobs
+    GROUP BY status
+"""
+
+
+@dataclass
+class Job:
+    id: int
+    file_id: str
+    payload: Dict[str, Any]
+    attempts: int
+
+
+def _job(row: Dict[str, Any]) -> Job:
+    return Job(id=row["id"], file_id=row["file_id"], payload=row["payload"], attempts=row["attempts"])
+
+
+class JobQueue:
+    def __init__(self, db: Database, worker: str):
+        self.db = db
+        self.worker = worker
+
+    async def enqueue(self, file_id: str, payload: Dict[str, Any]) -> int:
+        """Queue a job for an upload spooled by this worker."""
+        return await self.db.fetchval(ENQUEUE, file_id, payload, self.worker)
+
+    async def claim(self) -> Optional[Job]:
+        """Mark the oldest due job this worker may run as running and return it."""
+        row = await self.db.fetchrow(CLAIM, self.worker)
+        return _job(row) if row else None
+
+    async def complete(self, job_id: int):
+        await self.db.execute(COMPLETE, job_id)
+
+    async def retry(self, job_id: int, error: str, delay: float):
+        await self.db.execute(RETRY, job_id, error, delay)
+
+    async def fail(self, job_id: int, error: str):
+        await self.db.execute(FAIL, job_id, error)
+
+    async def release(self, job_id: int):
+        """Requeue a running job without counting its attempt."""
+        await self.db.execute(RELEASE, job_id)
+
+    async def recover(self) -> int:
+        """Requeue jobs left running by a previous run of this worker. Returns how many."""
+        status = await self.db.execute(RECOVER, self.worker)
+        return int(status.split()[-1])
+
+    async def local_jobs(self) -> List[Job]:
+        """Queued jobs only this worker may run (their uploads are on its disk)."""
+        return [_job(row) for row in await self.db.fetch(GET_LOCAL_JOBS, self.worker)]
+
+    async def hand_off(self, job_id: int):
+        """Let any worker run the job; its upload must be in storage."""
+        await self.db.execute(HAND_OFF, job_id)
+
+    async def depth(self) -> Dict[str, Any]:
+        rows = {row["status"]: row for row in await self.db.fetch(GET_DEPTH)}
+        queued = rows.get("queued")
+        return {
+            "queued": queued["count"] if queued else 0,
+            "running": rows["running"]["count"] if "running" in rows else 0,
+            "failed": rows["failed"]["count"] if "failed" in rows else 0,
+            "oldest_queued_age_seconds": round(queued["oldest_age"], 3) if queued else 0,
+        }
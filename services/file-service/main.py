@@ -1,65 +1,113 @@
-from fastapi import FastAPI, UploadFile, File, Depends, HTTPException, status, BackgroundTasks
-from fastapi.responses import JSONResponse
-from fastapi import status as fastapi_status, Request
-
-# Initialize FastAPI app
-app = FastAPI(
-    title="File Management Service",
-    description="Handles file uploads, text extraction, and topic mapping",
-    version="1.0.0"
-)
-
-@app.exception_handler(Exception)
-async def generic_exception_handler(request: Request, exc: Exception):
-    import traceback
-    print("Exception:", exc)
-    print(traceback.format_exc())
-    return JSONResponse(
-        status_code=fastapi_status.HTTP_400_BAD_REQUEST,
-        content={
-            "error": type(exc).__name__,
-            "detail": str(exc),
-            "trace": traceback.format_exc()
-        },
-    )
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi import Depends, HTTPException, Query, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional, Set
 import os
-import shutil
+import socket
 import uuid
-from datetime import datetime
-from supabase import create_client, Client
-import PyPDF2
-from pptx import Presentation
-import io
+import tempfile
+import asyncio
+import multiprocessing
+import multiprocessing.managers
+import queue
+import json
+import time
+import base64
+import logging
+import httpx
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from jobs import Job, JobQueue
+from uploads import spool_upload
+from repository import FileRepository
+
+from common.bootstrap import (
+    SUPABASE_SERVICE_ROLE_KEY, SUPABASE_URL, create_app, create_supabase_client, lazy_import, on_shutdown, on_startup
+)
+from common.db import Database
+from common.tracing import span
+
+# Loaded on first use: extraction pulls in the PDF/PPTX parsers, and the
+# embedding and topic code needs NumPy
+np = lazy_import("numpy")
+embeddings = lazy_import("embeddings")
+extraction = lazy_import("extraction")
+topics = lazy_import("topics")
 
 # Initialize FastAPI app
-app = FastAPI(
+app = create_app(
+    "file-service",
     title="File Management Service",
-    description="Handles file uploads, text extraction, and topic mapping",
-    version="1.0.0"
+    description="Handles file uploads, text extraction, and topic mapping"
 )
 
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+logger = logging.getLogger(__name__)
 
-# Supabase client
-supabase: Client = create_client(
-    os.getenv("SUPABASE_URL", ""),
-    os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
-)
+# Supabase client (created at startup)
+supabase = None
+
+# Database (connection pool opened at startup)
+db = Database()
+files_repo = FileRepository(db)
+
+# Supabase resumable uploads require exactly 6 MB chunks; smaller files are sent in one request
+STORAGE_CHUNK_SIZE = 6 * 1024 * 1024
 
 # Security
 security = HTTPBearer()
 
+# Spooled uploads; mount a persistent volume here so the uploads of queued
+# jobs survive a restart of the pod
+DATA_DIR = os.getenv("FILE_SERVICE_DATA_DIR", tempfile.gettempdir())
+
+# Upload limits
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(100 * 1024 * 1024)))
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+UPLOAD_TMP_DIR = os.getenv("UPLOAD_TMP_DIR") or os.path.join(DATA_DIR, "uploads")
+
+# Extraction job queue (the file_jobs table). The worker ID must stay the same
+# across restarts of a replica (e.g. a StatefulSet pod name) so it gets back
+# the jobs whose uploads are on its volume
+JOB_WORKER_ID = os.getenv("JOB_WORKER_ID") or socket.gethostname()
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF = float(os.getenv("JOB_RETRY_BACKOFF", "5"))  # seconds, doubled per attempt
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1"))
+# At shutdown, how long running jobs may finish before they are put back
+JOB_DRAIN_TIMEOUT = float(os.getenv("JOB_DRAIN_TIMEOUT", "20"))
+
+job_queue: Optional[JobQueue] = None
+job_wakeup = asyncio.Event()
+job_stats = {"completed": 0, "retried": 0, "failed": 0}
+_job_worker_task: Optional[asyncio.Task] = None
+_running_jobs: Set[asyncio.Task] = set()
+
+# Text extraction runs in a bounded process pool. Workers are recycled after
+# EXTRACT_MAX_TASKS_PER_CHILD files so fragmented parser memory is returned,
+# and each file is abandoned after EXTRACT_TIMEOUT seconds.
+EXTRACT_WORKERS = int(os.getenv("EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+EXTRACT_TIMEOUT = int(os.getenv("EXTRACT_TIMEOUT", "120"))
+EXTRACT_MAX_TASKS_PER_CHILD = int(os.getenv("EXTRACT_MAX_TASKS_PER_CHILD", "20"))
+EXTRACT_MEMORY_LIMIT_MB = int(os.getenv("EXTRACT_MEMORY_LIMIT_MB", "0"))
+
+_extract_pool: Optional[ProcessPoolExecutor] = None
+# Tasks handed to the pool at a time, so a task's timeout only counts once a
+# worker is free for it instead of while it waits behind other files
+_extract_slots = asyncio.Semaphore(EXTRACT_WORKERS)
+# Serves the queues that workers hand page batches back on
+_extract_manager: Optional[multiprocessing.managers.SyncManager] = None
+
+# Pages handed back (and persisted) at a time while a file is extracted
+EXTRACT_PAGE_BATCH = int(os.getenv("EXTRACT_PAGE_BATCH", "10"))
+
+# In-memory vector indexes of completed files, least recently used evicted first
+VECTOR_INDEX_CACHE_FILES = int(os.getenv("VECTOR_INDEX_CACHE_FILES", "64"))
+_vector_indexes: "OrderedDict[str, embeddings.VectorIndex]" = OrderedDict()
+
 # Models
 class FileResponse(BaseModel):
     id: str
@@ -68,21 +116,33 @@ class FileResponse(BaseModel):
     uploaded_at: datetime
     error_message: Optional[str] = ""
     size: int
+    pages_done: int = 0
+    pages_total: Optional[int] = None
+    stage_timings: Optional[Dict[str, float]] = None
 
 class TopicResponse(BaseModel):
     topic_id: str
     name: str
     doc_id: str
     page_range: Optional[str] = None
+    parent_topic_id: Optional[str] = None
 
 class ExtractRequest(BaseModel):
     file_id: str
 
+class PageResponse(BaseModel):
+    page_number: int
+    text: str
+
+class PassageResponse(PageResponse):
+    score: float
+
 # Dependency to get current user
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         token = credentials.credentials
-        user = supabase.auth.get_user(token)
+        with span("auth"):
+            user = await asyncio.to_thread(supabase.auth.get_user, token)
         if not user:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
         return user.user
@@ -90,104 +150,441 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         raise HTTPException(status_code=401, detail=str(e))
 
 # Helper functions
-def extract_text_from_file(file_content: bytes, file_extension: str) -> str:
-    text = ""
-    if file_extension == '.pdf':
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-    elif file_extension in ['.ppt', '.pptx']:
-        prs = Presentation(io.BytesIO(file_content))
-        for slide in prs.slides:
-            for shape in slide.shapes:
-                if hasattr(shape, "text"):
-                    text += shape.text + "\n"
-    return text
-
-async def process_file_background(file_id: str, user_id: str, content: bytes, filename: str):
+def get_extract_pool() -> ProcessPoolExecutor:
+    global _extract_pool
+    if _extract_pool is None:
+        # max_tasks_per_child requires a non-fork start method
+        _extract_pool = ProcessPoolExecutor(
+            max_workers=EXTRACT_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=extraction.init_worker,
+            initargs=(EXTRACT_MEMORY_LIMIT_MB,),
+            max_tasks_per_child=EXTRACT_MAX_TASKS_PER_CHILD,
+        )
+    return _extract_pool
+
+async def run_extraction(func, *args):
+    """Run an extraction function in the worker pool without blocking the event loop."""
+    global _extract_pool
+    loop = asyncio.get_running_loop()
+    async with _extract_slots:
+        pool = get_extract_pool()
+        try:
+            future = loop.run_in_executor(
+                pool, extraction.run_with_timeout, func, EXTRACT_TIMEOUT, *args
+            )
+            # The worker enforces the timeout itself; this only guards against a wedged worker
+            return await asyncio.wait_for(future, EXTRACT_TIMEOUT + 10)
+        except asyncio.TimeoutError:
+            raise RuntimeError(f"Text extraction worker did not answer within {EXTRACT_TIMEOUT + 10} s")
+        except BrokenProcessPool:
+            # A worker died (e.g. hit the memory limit); start a fresh pool for the next file
+            if _extract_pool is pool:
+                _extract_pool = None
+            raise RuntimeError("Text extraction worker crashed")
+
+def get_extract_manager() -> multiprocessing.managers.SyncManager:
+    global _extract_manager
+    if _extract_manager is None:
+        _extract_manager = multiprocessing.get_context("spawn").Manager()
+    return _extract_manager
+
+async def stream_extraction(file_path: str, file_extension: str, start: int, timings: Dict[str, float]):
+    """
+    Extract and embed a file's pages from ``start`` on in one worker call,
+    which parses the file once. Yields the page count, then
+    ``(start, pages, vectors)`` for every EXTRACT_PAGE_BATCH pages as soon as
+    the worker has them.
+    """
+    out = await asyncio.to_thread(get_extract_manager().Queue)
+    
+    async def extract():
+        with timed(timings, "extract_ms"):
+            return await run_extraction(
+                extraction.extract_batches, file_path, file_extension, start, EXTRACT_PAGE_BATCH, out
+            )
+    
+    worker = asyncio.create_task(extract())
     try:
-        # Update status to processing
-        supabase.table("files").update({"status": "processing"}).eq("id", file_id).execute()
-        
-        # Upload to Supabase Storage
-        storage_path = f"{user_id}/{file_id}/{filename}"
+        while True:
+            try:
+                item = await asyncio.to_thread(out.get, True, 0.5)
+            except queue.Empty:
+                if worker.done():
+                    await worker
+                    raise RuntimeError("Text extraction ended without finishing the file")
+                continue
+            if item is None:
+                await worker
+                return
+            yield item
+    finally:
+        if not worker.done():
+            worker.cancel()
+
+def build_vector_index(rows: List[Dict]) -> "embeddings.VectorIndex":
+    """Build a search index from stored page embeddings."""
+    if rows:
+        vectors = np.array([json.loads(row["embeddings"]) for row in rows], dtype=np.float32)
+    else:
+        vectors = np.zeros((0, embeddings.EMBEDDING_DIM), dtype=np.float32)
+    return embeddings.VectorIndex(vectors, [row["page_number"] for row in rows])
+
+async def get_vector_index(file_id: str, cacheable: bool) -> "embeddings.VectorIndex":
+    index = _vector_indexes.get(file_id)
+    if index is not None:
+        _vector_indexes.move_to_end(file_id)
+        return index
+    
+    rows = await files_repo.get_embeddings(file_id)
+    index = await asyncio.to_thread(build_vector_index, rows)
+    # Partially processed files keep growing, so only cache finished ones
+    if cacheable:
+        _vector_indexes[file_id] = index
+        if len(_vector_indexes) > VECTOR_INDEX_CACHE_FILES:
+            _vector_indexes.popitem(last=False)
+    return index
+
+async def build_topics(file_id: str):
+    """Segment the stored pages of a file into topics and save them."""
+    rows = await files_repo.get_page_rows(file_id)
+    if not rows:
+        return
+    found = await run_extraction(topics.segment_topics, [row["text"] or "" for row in rows])
+    
+    topic_ids = [str(uuid.uuid4()) for _ in found]
+    records = [
+        {
+            "topic_id": topic_ids[i],
+            "name": topic["name"][:255],
+            "parent_topic_id": topic_ids[topic["parent"]] if topic["parent"] is not None else None,
+            "doc_id": rows[topic["start_page"] - 1]["doc_id"],
+            "page_range": f"{topic['start_page']}-{topic['end_page']}"
+        }
+        for i, topic in enumerate(found)
+    ]
+    if records:
+        # Replace topics saved by an earlier attempt
+        await files_repo.replace_topics(records)
+
+@contextmanager
+def timed(timings: Dict[str, float], stage: str):
+    """Add the elapsed milliseconds of the block to timings[stage]."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + (time.perf_counter() - start) * 1000
+
+def document_content_type(filename: str) -> str:
+    return "application/pdf" if filename.endswith('.pdf') else "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+
+def upload_to_storage_simple(file_path: str, storage_path: str, content_type: str):
+    with open(file_path, "rb") as f:
         supabase.storage.from_("documents").upload(
             path=storage_path,
-            file=content,
-            file_options={"content-type": "application/pdf" if filename.endswith('.pdf') else "application/vnd.openxmlformats-officedocument.presentationml.presentation"}
+            file=f,
+            file_options={"content-type": content_type, "upsert": "true"}
         )
+
+async def upload_to_storage(file_path: str, storage_path: str, content_type: str):
+    """
+    Store a file in the documents bucket (upserting: a previous attempt may
+    have stored it). Large files go through Supabase's resumable (TUS)
+    endpoint in fixed-size chunks instead of one request body.
+    """
+    size = os.path.getsize(file_path)
+    if size <= STORAGE_CHUNK_SIZE:
+        await asyncio.to_thread(upload_to_storage_simple, file_path, storage_path, content_type)
+        return
+    
+    headers = {
+        "Authorization": f"Bearer {SUPABASE_SERVICE_ROLE_KEY}",
+        "apikey": SUPABASE_SERVICE_ROLE_KEY,
+        "Tus-Resumable": "1.0.0"
+    }
+    metadata = {"bucketName": "documents", "objectName": storage_path, "contentType": content_type}
+    async with httpx.AsyncClient(timeout=60.0) as client:
+        response = await client.post(
+            f"{SUPABASE_URL}/storage/v1/upload/resumable",
+            headers={
+                **headers,
+                "Upload-Length": str(size),
+                "Upload-Metadata": ",".join(f"{k} {base64.b64encode(v.encode()).decode()}" for k, v in metadata.items()),
+                "x-upsert": "true"
+            }
+        )
+        response.raise_for_status()
+        location = response.headers["Location"]
         
-        # Extract text
-        file_extension = os.path.splitext(filename)[1].lower()
-        text = extract_text_from_file(content, file_extension)
+        offset = 0
+        with open(file_path, "rb") as f:
+            while offset < size:
+                chunk = await asyncio.to_thread(f.read, STORAGE_CHUNK_SIZE)
+                response = await client.patch(location, content=chunk, headers={
+                    **headers,
+                    "Upload-Offset": str(offset),
+                    "Content-Type": "application/offset+octet-stream"
+                })
+                response.raise_for_status()
+                offset = int(response.headers["Upload-Offset"])
+
+async def process_file_background(file_id: str, user_id: str, file_path: str, filename: str, content_hash: str):
+    """
+    Upload, extract and store a file. Runs as a queued job and raises on
+    failure so the worker can retry; a retry resumes after the last page
+    batch that was fully persisted.
+    
+    The stages overlap: the storage upload runs alongside extraction, and
+    the worker extracts the next page batches while earlier ones are inserted.
+    Per-stage wall time is saved in files.stage_timings.
+    """
+    timings: Dict[str, float] = {}
+    started = time.perf_counter()
+    
+    pages_done = await files_repo.get_pages_done(file_id)
+    if pages_done is None:
+        return  # File was deleted while queued
+    
+    # Drop rows from a batch that was interrupted mid-insert
+    await files_repo.delete_pages_after(file_id, pages_done)
+    
+    # Update status to processing; a partially ready file keeps serving its pages
+    if not pages_done:
+        await files_repo.set_status(file_id, "processing")
+    
+    storage_path = f"{user_id}/{file_id}/{filename}"
+    stored = not os.path.exists(file_path)
+    if stored:
+        # No spooled copy here (the job was handed off by another replica, or
+        # the volume was lost): work from the stored object
+        source = await files_repo.get_storage_path(file_id) or storage_path
+        data = await asyncio.to_thread(supabase.storage.from_("documents").download, source)
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with open(file_path, "wb") as f:
+            f.write(data)
+    
+    content_type = document_content_type(filename)
+    file_extension = os.path.splitext(filename)[1].lower()
+    
+    async def upload():
+        if stored:
+            return
+        with timed(timings, "upload_ms"):
+            await upload_to_storage(file_path, storage_path, content_type)
+    
+    upload_task = asyncio.create_task(upload())
+    batches = stream_extraction(file_path, file_extension, pages_done, timings)
+    try:
+        # Extract text in batches of pages, persisting each batch as it is
+        # done so the first pages are usable while the rest is extracted
+        pages_total = await anext(batches)
+        await files_repo.set_pages_total(file_id, pages_total)
         
-        # Store extracted text in documents table
-        supabase.table("documents").insert({
-            "file_id": file_id,
-            "text": text,
-            "page_number": 1  # Simplified for now, could be per page
-        }).execute()
+        async for start, pages, vectors in batches:
+            end = start + len(pages)
+            # Store extracted text and embeddings in documents table, one row per page/slide
+            with timed(timings, "store_ms"):
+                await files_repo.insert_pages(file_id, start, pages, vectors, end if end < pages_total else None)
         
-        # Update status to completed
-        supabase.table("files").update({
-            "status": "completed",
-            "storage_path": storage_path
-        }).eq("id", file_id).execute()
+        with timed(timings, "topics_ms"):
+            await build_topics(file_id)
         
+        await upload_task
+    finally:
+        await batches.aclose()
+        if not upload_task.done():
+            upload_task.cancel()
+    
+    # Take a reference on the stored object; if an identical upload was
+    # processed concurrently, share its object and drop ours
+    canonical_path = await files_repo.register_blob(file_id, content_hash, storage_path)
+    if canonical_path != storage_path:
+        await asyncio.to_thread(supabase.storage.from_("documents").remove, [storage_path])
+        if canonical_path is None:
+            return  # File was deleted while processing
+        storage_path = canonical_path
+    
+    timings["total_ms"] = (time.perf_counter() - started) * 1000
+    
+    # Update status to completed
+    await files_repo.mark_completed(
+        file_id, storage_path, pages_total, {stage: round(ms, 1) for stage, ms in timings.items()}
+    )
+
+async def discard_upload(file_id: str, user_id: str, filename: str, **_):
+    """Remove the object a failed job stored, unless its file holds a blob reference on it."""
+    if await files_repo.get_storage_path(file_id) is None:
+        await asyncio.to_thread(supabase.storage.from_("documents").remove, [f"{user_id}/{file_id}/{filename}"])
+
+async def run_job(job: Job):
+    try:
+        if job.attempts > JOB_MAX_ATTEMPTS:
+            # Previous attempts died with the process (e.g. OOM) instead of failing
+            raise RuntimeError(f"Processing was interrupted {job.attempts - 1} times")
+        await process_file_background(**job.payload)
+    except asyncio.CancelledError:
+        # The service is shutting down; the attempt was cut short, so it does not count
+        await job_queue.release(job.id)
+        raise
     except Exception as e:
-        print(f"Error processing file {file_id}: {str(e)}")
-        supabase.table("files").update({
-            "status": "failed",
-            "error_message": str(e)
-        }).eq("id", file_id).execute()
+        # Some exceptions (e.g. a bare TimeoutError) have no message
+        error = str(e) or type(e).__name__
+        logger.error("Error processing file %s (attempt %s): %s", job.file_id, job.attempts, error,
+                     extra={"file_id": job.file_id, "job_id": job.id, "attempt": job.attempts})
+        try:
+            if job.attempts < JOB_MAX_ATTEMPTS:
+                await job_queue.retry(job.id, error, JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1))
+                job_stats["retried"] += 1
+                await files_repo.set_retrying(job.file_id, f"Attempt {job.attempts} failed, retrying: {error}")
+                return
+            await job_queue.fail(job.id, error)
+            job_stats["failed"] += 1
+            await files_repo.set_status(job.file_id, "failed", error)
+            await discard_upload(**job.payload)
+        except Exception as report_error:
+            logger.exception("Error recording failure for file %s: %s", job.file_id, report_error,
+                             extra={"file_id": job.file_id, "job_id": job.id})
+    else:
+        await job_queue.complete(job.id)
+        job_stats["completed"] += 1
+    
+    file_path = job.payload["file_path"]
+    if os.path.exists(file_path):
+        os.unlink(file_path)
 
-# Routes
-@app.post("/files/upload", response_model=FileResponse, status_code=status.HTTP_201_CREATED)
-async def upload_file(
-    background_tasks: BackgroundTasks,
-    file: UploadFile = File(...),
-    current_user = Depends(get_current_user)
-):
+async def job_worker():
+    """Run queued extraction jobs, at most JOB_CONCURRENCY at a time."""
+    slots = asyncio.Semaphore(JOB_CONCURRENCY)
+    while True:
+        await slots.acquire()
+        job_wakeup.clear()
+        try:
+            job = await job_queue.claim()
+        except Exception as e:
+            logger.error("Error claiming an extraction job: %s", e)
+            job = None
+        if job is None:
+            slots.release()
+            try:
+                await asyncio.wait_for(job_wakeup.wait(), JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        task = asyncio.create_task(run_job(job))
+        _running_jobs.add(task)
+        task.add_done_callback(_running_jobs.discard)
+        task.add_done_callback(lambda _: slots.release())
+
+async def drain_jobs():
     """
-    Upload a PDF or PPT file for processing.
+    Shut the job worker down without stranding work: stop claiming, give
+    running jobs JOB_DRAIN_TIMEOUT seconds and put the rest back, then store
+    the uploads of this replica's queued jobs so any replica can run them.
     """
-    allowed_extensions = {'.pdf', '.ppt', '.pptx'}
-    file_ext = os.path.splitext(file.filename)[1].lower()
+    if _job_worker_task is not None:
+        _job_worker_task.cancel()
+    if _running_jobs:
+        _, pending = await asyncio.wait(_running_jobs, timeout=JOB_DRAIN_TIMEOUT)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
     
-    if file_ext not in allowed_extensions:
+    handed_off = 0
+    for job in await job_queue.local_jobs():
+        payload = job.payload
+        try:
+            if os.path.exists(payload["file_path"]):
+                await upload_to_storage(
+                    payload["file_path"], f"{payload['user_id']}/{job.file_id}/{payload['filename']}",
+                    document_content_type(payload["filename"])
+                )
+            await job_queue.hand_off(job.id)
+            handed_off += 1
+            if os.path.exists(payload["file_path"]):
+                os.unlink(payload["file_path"])
+        except Exception as e:
+            logger.error("Error handing off extraction job %s: %s", job.id, e, extra={"file_id": job.file_id, "job_id": job.id})
+    if handed_off:
+        logger.info("Handed off %d queued extraction job(s)", handed_off)
+
+# Routes
+def check_upload_filename(filename: str):
+    allowed_extensions = {'.pdf', '.ppt', '.pptx'}
+    if os.path.splitext(filename)[1].lower() not in allowed_extensions:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="File type not allowed. Please upload PDF or PPT files."
         )
-    
+
+# The body is streamed by spool_upload rather than parsed by FastAPI, so
+# describe the form for the API docs here
+UPLOAD_REQUEST_BODY = {
+    "required": True,
+    "content": {"multipart/form-data": {"schema": {
+        "type": "object",
+        "required": ["file"],
+        "properties": {"file": {"type": "string", "format": "binary"}}
+    }}}
+}
+
+@app.post(
+    "/files/upload", response_model=FileResponse, status_code=status.HTTP_201_CREATED,
+    openapi_extra={"requestBody": UPLOAD_REQUEST_BODY}
+)
+async def upload_file(request: Request, current_user = Depends(get_current_user)):
+    """
+    Upload a PDF or PPT file for processing.
+    """
+    file_path = None
     try:
-        content = await file.read()
+        upload = await spool_upload(
+            request, "file", UPLOAD_TMP_DIR, MAX_UPLOAD_SIZE, UPLOAD_CHUNK_SIZE, check_upload_filename
+        )
+        file_path, size, content_hash = upload.path, upload.size, upload.sha256
         file_id = str(uuid.uuid4())
         
         # Create file record
         file_data = {
             "id": file_id,
             "owner_id": current_user.id,
-            "filename": file.filename,
+            "filename": upload.filename,
             "status": "pending",
-            "size": len(content),
-            "uploaded_at": datetime.now().isoformat()
+            "size": size,
+            "content_hash": content_hash,
+            "uploaded_at": datetime.now(timezone.utc)
         }
         
-        supabase.table("files").insert(file_data).execute()
+        with span("db.files"):
+            await files_repo.create_file(file_data)
         
-        # Process in background
-        background_tasks.add_task(
-            process_file_background, 
-            file_id, 
-            current_user.id, 
-            content, 
-            file.filename
-        )
+        # Identical content was already processed: reuse its storage object
+        # and extracted pages instead of uploading and extracting again
+        with span("db.reuse_blob"):
+            reused_pages = await files_repo.reuse_blob(content_hash, file_id)
+        if reused_pages is not None:
+            os.unlink(file_path)
+            file_path = None
+            file_data.update(status="completed", pages_done=reused_pages, pages_total=reused_pages)
+            return FileResponse(**file_data)
+        
+        # Queue for processing by the job worker
+        await job_queue.enqueue(file_id, {
+            "file_id": file_id,
+            "user_id": current_user.id,
+            "file_path": file_path,
+            "filename": upload.filename,
+            "content_hash": content_hash
+        })
+        job_wakeup.set()
         
         return FileResponse(**file_data)
         
+    except HTTPException:
+        raise
     except Exception as e:
+        if file_path:
+            os.unlink(file_path)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -199,10 +596,10 @@ async def get_file_status(file_id: str, current_user = Depends(get_current_user)
     Check the processing status of a file.
     """
     try:
-        result = supabase.table("files").select("*").eq("id", file_id).eq("owner_id", current_user.id).execute()
-        if not result.data:
+        file_row = await files_repo.get_file(file_id, current_user.id)
+        if not file_row:
             raise HTTPException(status_code=404, detail="File not found")
-        return FileResponse(**result.data[0])
+        return FileResponse(**file_row)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -212,23 +609,88 @@ async def list_files(current_user = Depends(get_current_user)):
     List all uploaded files for the current user.
     """
     try:
-        result = supabase.table("files").select("*").eq("owner_id", current_user.id).order("uploaded_at", desc=True).execute()
-        print("Supabase result:", result)
+        with span("db.files"):
+            rows = await files_repo.list_files(current_user.id)
         files = []
-        for item in result.data:
-            print(f"Processing file record: {item}")
+        for item in rows:
             # Ensure error_message is always a string for API response
             item["error_message"] = str(item.get("error_message") or "")
             try:
                 files.append(FileResponse(**item))
             except Exception as ve:
-                print(f"Validation error for item: {item}\nError: {ve}")
-        print(f"Returning files: {files}")
+                logger.warning("Skipping invalid file record %s: %s", item.get("id"), ve, extra={"record": repr(item)})
+        logger.debug("Listed %d files", len(files), extra={"user_id": current_user.id})
         return files
     except Exception as e:
-        import traceback
-        print(f"Exception in list_files: {e}")
-        print(traceback.format_exc())
+        logger.exception("Listing files failed")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/files/{file_id}/pages", response_model=List[PageResponse])
+async def get_file_pages(
+    file_id: str,
+    start: int = Query(1, ge=1),
+    end: Optional[int] = Query(None, ge=1),
+    current_user = Depends(get_current_user)
+):
+    """
+    Get the extracted text of a file, one entry per page/slide, optionally limited to pages start..end.
+    """
+    try:
+        if not await files_repo.get_file(file_id, current_user.id):
+            raise HTTPException(status_code=404, detail="File not found")
+
+        with span("db.documents"):
+            rows = await files_repo.get_pages(file_id, start, end)
+        return [PageResponse(page_number=row["page_number"], text=row["text"] or "") for row in rows]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/files/{file_id}/search", response_model=List[PassageResponse])
+async def search_file(
+    file_id: str,
+    q: str = Query(..., min_length=1),
+    k: int = Query(5, ge=1, le=50),
+    current_user = Depends(get_current_user)
+):
+    """
+    Find the k pages of a file most relevant to a query.
+    """
+    try:
+        file_row = await files_repo.get_file(file_id, current_user.id)
+        if not file_row:
+            raise HTTPException(status_code=404, detail="File not found")
+
+        with span("vector_index"):
+            index = await get_vector_index(file_id, file_row["status"] == "completed")
+        hits = index.search(embeddings.embed_texts([q])[0], k)
+        if not hits:
+            return []
+
+        with span("db.documents"):
+            rows = await files_repo.get_pages_by_number(file_id, [page for page, _ in hits])
+        texts = {row["page_number"]: row["text"] or "" for row in rows}
+        return [PassageResponse(page_number=page, text=texts.get(page, ""), score=score) for page, score in hits]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/files/{file_id}/topics", response_model=List[TopicResponse])
+async def get_file_topics(file_id: str, current_user = Depends(get_current_user)):
+    """
+    Get the topic hierarchy detected in a file.
+    """
+    try:
+        if not await files_repo.get_file(file_id, current_user.id):
+            raise HTTPException(status_code=404, detail="File not found")
+
+        rows = await files_repo.get_topics(file_id)
+        return [TopicResponse(**row) for row in rows]
+    except HTTPException:
+        raise
+    except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.delete("/files/{file_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -238,24 +700,59 @@ async def delete_file(file_id: str, current_user = Depends(get_current_user)):
     """
     try:
         # Verify ownership
-        result = supabase.table("files").select("storage_path").eq("id", file_id).eq("owner_id", current_user.id).execute()
+        file_row = await files_repo.get_file(file_id, current_user.id)
         
-        if not result.data:
+        if not file_row:
             raise HTTPException(status_code=404, detail="File not found")
             
-        storage_path = result.data[0].get("storage_path")
+        storage_path = file_row.get("storage_path")
+        content_hash = file_row.get("content_hash")
         
-        # Delete from storage if path exists
+        # Delete from storage if path exists and no other file still shares it
         if storage_path:
-            supabase.storage.from_("documents").remove([storage_path])
+            remaining = None
+            if content_hash:
+                remaining = await files_repo.release_blob(content_hash)
+            if not remaining:
+                await asyncio.to_thread(supabase.storage.from_("documents").remove, [storage_path])
             
         # Delete from database (cascade will handle related records)
-        supabase.table("files").delete().eq("id", file_id).execute()
+        await files_repo.delete_file(file_id)
+        _vector_indexes.pop(file_id, None)
         
         return None
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/jobs/metrics")
+async def job_metrics():
+    """
+    Extraction queue depth and outcome counters since startup.
+    """
+    return {**await job_queue.depth(), **job_stats, "concurrency": JOB_CONCURRENCY, "worker": JOB_WORKER_ID}
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "file-service"}
+
+@on_startup(app)
+async def startup_event():
+    global supabase, job_queue, _job_worker_task
+    # Import the Supabase client in a thread while the pool connects
+    supabase, _ = await asyncio.gather(asyncio.to_thread(create_supabase_client), db.connect())
+    os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
+    job_queue = JobQueue(db, JOB_WORKER_ID)
+    recovered = await job_queue.recover()
+    if recovered:
+        logger.info("Requeued %d interrupted extraction job(s)", recovered)
+    _job_worker_task = asyncio.create_task(job_worker())
+
+@on_shutdown(app)
+async def shutdown_event():
+    if job_queue is not None:
+        await drain_jobs()
+    if _extract_pool is not None:
+        _extract_pool.shutdown(wait=False, cancel_futures=True)
+    if _extract_manager is not None:
+        _extract_manager.shutdown()
+    await db.close()
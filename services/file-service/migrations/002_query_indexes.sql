@@ -0,0 +1,8 @@
+-- GET /files lists a user's files newest first: serve the order from the
+-- index instead of sorting every file of the owner
+CREATE INDEX IF NOT EXISTS idx_files_owner_uploaded ON files(owner_id, uploaded_at DESC);
+DROP INDEX IF EXISTS idx_files_owner_id;
+
+-- reuse_file_blob only looks for completed files with the same content
+CREATE INDEX IF NOT EXISTS idx_files_content_hash_completed ON files(content_hash) WHERE status = 'completed';
+DROP INDEX IF EXISTS idx_files_content_hash;
@@ -0,0 +1,156 @@
+"""
+Data access for the file-service tables (files, documents, topics, file_blobs).
+"""
+from typing import Any, Dict, List, Optional
+
+from common.db import Database
+
+GET_FILE = "SELECT * FROM files WHERE id = $1 AND owner_id = $2"
+GET_PAGES_DONE = "SELECT pages_done FROM files WHERE id = $1"
+GET_STORAGE_PATH = "SELECT storage_path FROM files WHERE id = $1"
+LIST_FILES = "SELECT * FROM files WHERE owner_id = $1 ORDER BY uploaded_at DESC"
+INSERT_FILE = """
+    INSERT INTO files (id, owner_id, filename, status, size, content_hash, uploaded_at)
+    VALUES ($1, $2, $3, $4, $5, $6, $7)
+"""
+DELETE_FILE = "DELETE FROM files WHERE id = $1"
+SET_STATUS = "UPDATE files SET status = $2 WHERE id = $1"
+SET_STATUS_ERROR = "UPDATE files SET status = $2, error_message = $3 WHERE id = $1"
+SET_RETRYING = """
+    UPDATE files SET status = CASE WHEN pages_done > 0 THEN 'partially_ready' ELSE 'pending' END,
+        error_message = $2
+    WHERE id = $1
+"""
+SET_PAGES_TOTAL = "UPDATE files SET pages_total = $2 WHERE id = $1"
+SET_PARTIALLY_READY = "UPDATE files SET status = 'partially_ready', pages_done = $2 WHERE id = $1"
+SET_COMPLETED = """
+    UPDATE files SET status = 'completed', storage_path = $2, pages_done = $3, stage_timings = $4
+    WHERE id = $1
+"""
+
+INSERT_PAGE = "INSERT INTO documents (file_id, page_number, text, embeddings) VALUES ($1, $2, $3, $4)"
+DELETE_PAGES_AFTER = "DELETE FROM documents WHERE file_id = $1 AND page_number > $2"
+GET_PAGES = """
+    SELECT page_number, text FROM documents
+    WHERE file_id = $1 AND page_number >= $2 AND ($3::int IS NULL OR page_number <= $3)
+    ORDER BY page_number
+"""
+GET_PAGES_BY_NUMBER = "SELECT page_number, text FROM documents WHERE file_id = $1 AND page_number = ANY($2::int[])"
+GET_PAGE_ROWS = "SELECT doc_id, text FROM documents WHERE file_id = $1 ORDER BY page_number"
+GET_EMBEDDINGS = """
+    SELECT page_number, embeddings::text AS embeddings FROM documents
+    WHERE file_id = $1 AND embeddings IS NOT NULL
+"""
+
+GET_TOPICS = """
+    SELECT t.topic_id, t.name, t.doc_id, t.page_range, t.parent_topic_id
+    FROM topics t JOIN documents d ON d.doc_id = t.doc_id
+    WHERE d.file_id = $1
+    ORDER BY d.page_number
+"""
+DELETE_TOPICS = "DELETE FROM topics WHERE doc_id = ANY($1::uuid[])"
+INSERT_TOPIC = "INSERT INTO topics (topic_id, name, parent_topic_id, doc_id, page_range) VALUES ($1, $2, $3, $4, $5)"
+
+REGISTER_BLOB = "SELECT register_file_blob($1, $2, $3)"
+REUSE_BLOB = "SELECT reuse_file_blob($1, $2)"
+RELEASE_BLOB = "SELECT release_file_blob($1)"
+
+
+class FileRepository:
+    def __init__(self, db: Database):
+        self.db = db
+
+    # files
+    async def get_file(self, file_id: str, owner_id: str) -> Optional[Dict[str, Any]]:
+        return await self.db.fetchrow(GET_FILE, file_id, owner_id)
+
+    async def get_pages_done(self, file_id: str) -> Optional[int]:
+        """Pages persisted so far, or None if the file no longer exists."""
+        return await self.db.fetchval(GET_PAGES_DONE, file_id)
+
+    async def get_storage_path(self, file_id: str) -> Optional[str]:
+        """Path of the blob the file holds a reference on, if any."""
+        return await self.db.fetchval(GET_STORAGE_PATH, file_id)
+
+    async def list_files(self, owner_id: str) -> List[Dict[str, Any]]:
+        return await self.db.fetch(LIST_FILES, owner_id)
+
+    async def create_file(self, file: Dict[str, Any]):
+        await self.db.execute(
+            INSERT_FILE, file["id"], file["owner_id"], file["filename"], file["status"],
+            file["size"], file["content_hash"], file["uploaded_at"]
+        )
+
+    async def delete_file(self, file_id: str):
+        await self.db.execute(DELETE_FILE, file_id)
+
+    async def set_status(self, file_id: str, status: str, error_message: Optional[str] = None):
+        if error_message is None:
+            await self.db.execute(SET_STATUS, file_id, status)
+        else:
+            await self.db.execute(SET_STATUS_ERROR, file_id, status, error_message)
+
+    async def set_retrying(self, file_id: str, error_message: str):
+        """Back to pending, unless pages are already served (partially ready)."""
+        await self.db.execute(SET_RETRYING, file_id, error_message)
+
+    async def set_pages_total(self, file_id: str, pages_total: int):
+        await self.db.execute(SET_PAGES_TOTAL, file_id, pages_total)
+
+    async def mark_completed(self, file_id: str, storage_path: str, pages_done: int, stage_timings: Dict[str, float]):
+        await self.db.execute(SET_COMPLETED, file_id, storage_path, pages_done, stage_timings)
+
+    # documents
+    async def insert_pages(self, file_id: str, start: int, pages: List[str], vectors: List[str],
+                           pages_done: Optional[int] = None):
+        """
+        Insert pages start+1.. of a file. With ``pages_done`` the file is
+        also marked partially ready, in the same transaction.
+        """
+        rows = [
+            (file_id, number, text, vector)
+            for number, (text, vector) in enumerate(zip(pages, vectors), start=start + 1)
+        ]
+        async with self.db.transaction() as conn:
+            await conn.executemany(INSERT_PAGE, rows)
+            if pages_done is not None:
+                await conn.execute(SET_PARTIALLY_READY, file_id, pages_done)
+
+    async def delete_pages_after(self, file_id: str, page_number: int):
+        await self.db.execute(DELETE_PAGES_AFTER, file_id, page_number)
+
+    async def get_pages(self, file_id: str, start: int = 1, end: Optional[int] = None) -> List[Dict[str, Any]]:
+        return await self.db.fetch(GET_PAGES, file_id, start, end)
+
+    async def get_pages_by_number(self, file_id: str, page_numbers: List[int]) -> List[Dict[str, Any]]:
+        return await self.db.fetch(GET_PAGES_BY_NUMBER, file_id, page_numbers)
+
+    async def get_page_rows(self, file_id: str) -> List[Dict[str, Any]]:
+        return await self.db.fetch(GET_PAGE_ROWS, file_id)
+
+    async def get_embeddings(self, file_id: str) -> List[Dict[str, Any]]:
+        return await self.db.fetch(GET_EMBEDDINGS, file_id)
+
+    # topics
+    async def get_topics(self, file_id: str) -> List[Dict[str, Any]]:
+        return await self.db.fetch(GET_TOPICS, file_id)
+
+    async def replace_topics(self, records: List[Dict[str, Any]]):
+        """Save topics, dropping any previously saved for the same pages."""
+        async with self.db.transaction() as conn:
+            await conn.execute(DELETE_TOPICS, list({r["doc_id"] for r in records}))
+            await conn.executemany(INSERT_TOPIC, [
+                (r["topic_id"], r["name"], r["parent_topic_id"], r["doc_id"], r["page_range"])
+                for r in records
+            ])
+
+    # file_blobs
+    async def register_blob(self, file_id: str, content_hash: str, storage_path: str) -> Optional[str]:
+        """Canonical storage path, or None if the file no longer exists."""
+        return await self.db.fetchval(REGISTER_BLOB, file_id, content_hash, storage_path)
+
+    async def reuse_blob(self, content_hash: str, file_id: str) -> Optional[int]:
+        return await self.db.fetchval(REUSE_BLOB, content_hash, file_id)
+
+    async def release_blob(self, content_hash: str) -> Optional[int]:
+        return await self.db.fetchval(RELEASE_BLOB, content_hash)
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+import embeddings
+from embeddings import EMBEDDING_DIM, EXACT_SEARCH_LIMIT, VectorIndex, embed_texts
+
+
+def random_unit_vectors(n: int, dim: int = 64, seed: int = 1) -> np.ndarray:
+    vectors = np.random.default_rng(seed).standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def clustered_unit_vectors(clusters: int, per_cluster: int, dim: int = 64, seed: int = 1) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim))
+    vectors = np.repeat(centres, per_cluster, axis=0) + 0.1 * rng.standard_normal((clusters * per_cluster, dim))
+    vectors = vectors.astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def exact_top_k(vectors: np.ndarray, ids, query: np.ndarray, k: int):
+    scores = vectors @ query
+    return [ids[i] for i in np.argsort(scores)[::-1][:k]]
+
+
+def test_embeddings_are_normalised_and_stable():
+    vectors = embed_texts(["Photosynthesis in chloroplasts", "The French Revolution", ""])
+    assert vectors.shape == (3, EMBEDDING_DIM)
+    assert np.allclose(np.linalg.norm(vectors[:2], axis=1), 1.0, atol=1e-5)
+    assert not vectors[2].any()
+    assert np.array_equal(vectors[:1], embed_texts(["Photosynthesis in chloroplasts"]))
+
+
+def test_similar_texts_score_higher():
+    query, near, far = embed_texts([
+        "light reactions of photosynthesis", "photosynthesis uses light in the chloroplast", "causes of the french revolution",
+    ])
+    assert query @ near > query @ far
+
+
+def test_small_collections_are_searched_exactly():
+    vectors = random_unit_vectors(EXACT_SEARCH_LIMIT)
+    ids = list(range(100, 100 + len(vectors)))
+    index = VectorIndex(vectors, ids)
+    assert index.centroids is None
+    query = vectors[7]
+    assert [i for i, _ in index.search(query, 10)] == exact_top_k(vectors, ids, query, 10)
+    assert index.search(query, 1)[0] == (107, pytest.approx(1.0, abs=1e-5))
+
+
+def test_an_ivf_index_is_built_past_the_limit():
+    vectors = random_unit_vectors(EXACT_SEARCH_LIMIT + 1)
+    index = VectorIndex(vectors, list(range(len(vectors))))
+    assert index.centroids is not None
+    assert len(index.lists) == int(np.sqrt(len(vectors)))
+    assert sorted(np.concatenate(index.lists).tolist()) == list(range(len(vectors)))
+
+
+def test_ivf_probing_every_list_matches_exact_search(monkeypatch):
+    monkeypatch.setattr(embeddings, "EXACT_SEARCH_LIMIT", 50)
+    vectors = random_unit_vectors(400)
+    ids = list(range(len(vectors)))
+    index = VectorIndex(vectors, ids, nprobe=len(vectors))
+    assert index.centroids is not None
+    for query in random_unit_vectors(5, seed=2):
+        assert [i for i, _ in index.search(query, 10)] == exact_top_k(vectors, ids, query, 10)
+
+
+def test_ivf_finds_the_exact_top_k_in_clustered_data(monkeypatch):
+    monkeypatch.setattr(embeddings, "EXACT_SEARCH_LIMIT", 50)
+    vectors = clustered_unit_vectors(clusters=20, per_cluster=20)
+    ids = list(range(len(vectors)))
+    index = VectorIndex(vectors, ids)
+    assert index.centroids is not None
+    for query in vectors[::37]:
+        results = index.search(query, 5)
+        assert [i for i, _ in results] == exact_top_k(vectors, ids, query, 5)
+        assert [s for _, s in results] == sorted((s for _, s in results), reverse=True)
+
+
+def test_search_returns_at_most_the_collection():
+    vectors = random_unit_vectors(3)
+    assert len(VectorIndex(vectors, [1, 2, 3]).search(vectors[0], 10)) == 3
+    assert VectorIndex(np.zeros((0, 64), dtype=np.float32), []).search(vectors[0], 10) == []
@@ -0,0 +1,122 @@
+import asyncio
+import os
+import re
+import uuid
+
+import asyncpg
+import pytest
+
+from common.db import Database
+from jobs import JobQueue
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL", "")
+SCHEMA_SQL = os.path.join(os.path.dirname(__file__), "..", "..", "..", "scripts", "schema.sql")
+
+pytestmark = pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URL is not set")
+
+
+def file_jobs_ddl() -> str:
+    """The file_jobs table and its index, as scripts/schema.sql defines them."""
+    with open(SCHEMA_SQL) as f:
+        schema = f.read()
+    table = re.search(r"CREATE TABLE IF NOT EXISTS file_jobs \(.*?\n\);", schema, re.S).group(0)
+    index = re.search(r"CREATE INDEX IF NOT EXISTS \w+ ON file_jobs\(.*?\);", schema).group(0)
+    return f"{table}\n{index}"
+
+
+def with_queues(test):
+    """Run ``test(db, worker_a, worker_b)`` against a scratch schema."""
+    async def run():
+        schema = f"test_jobs_{uuid.uuid4().hex[:12]}"
+        conn = await asyncpg.connect(TEST_DATABASE_URL)
+        await conn.execute(f"CREATE SCHEMA {schema}; SET search_path TO {schema}; {file_jobs_ddl()}")
+        separator = "&" if "?" in TEST_DATABASE_URL else "?"
+        db = Database(f"{TEST_DATABASE_URL}{separator}search_path={schema}", min_size=1, max_size=4)
+        try:
+            await db.connect()
+            await test(db, JobQueue(db, "worker-a"), JobQueue(db, "worker-b"))
+        finally:
+            await db.close()
+            await conn.execute(f"DROP SCHEMA {schema} CASCADE")
+            await conn.close()
+    asyncio.run(run())
+
+
+def payload(file_id: str):
+    return {"file_id": file_id, "file_path": f"/tmp/{file_id}.pdf", "filename": "a.pdf"}
+
+
+def test_claim_takes_jobs_in_order_once():
+    async def test(db, a, b):
+        first, second = str(uuid.uuid4()), str(uuid.uuid4())
+        await a.enqueue(first, payload(first))
+        await a.enqueue(second, payload(second))
+        claimed = await asyncio.gather(a.claim(), a.claim(), a.claim())
+        assert [job.file_id if job else None for job in claimed].count(None) == 1
+        job = next(job for job in claimed if job and job.file_id == first)
+        assert job.payload == payload(first) and job.attempts == 1
+        await a.complete(job.id)
+        assert (await a.depth())["running"] == 1
+    with_queues(test)
+
+
+def test_jobs_stay_with_their_worker_until_handed_off():
+    async def test(db, a, b):
+        file_id = str(uuid.uuid4())
+        await a.enqueue(file_id, payload(file_id))
+        assert await b.claim() is None
+        [job] = await a.local_jobs()
+        await a.hand_off(job.id)
+        assert await a.local_jobs() == []
+        assert (await b.claim()).file_id == file_id
+    with_queues(test)
+
+
+def test_retry_waits_for_its_delay_and_counts_the_attempt():
+    async def test(db, a, b):
+        file_id = str(uuid.uuid4())
+        await a.enqueue(file_id, payload(file_id))
+        job = await a.claim()
+        await a.retry(job.id, "boom", 60)
+        assert await a.claim() is None
+        await a.retry(job.id, "boom", 0)
+        assert (await a.claim()).attempts == 2
+    with_queues(test)
+
+
+def test_release_does_not_count_the_attempt():
+    async def test(db, a, b):
+        file_id = str(uuid.uuid4())
+        await a.enqueue(file_id, payload(file_id))
+        job = await a.claim()
+        await a.release(job.id)
+        assert (await a.claim()).attempts == 1
+    with_queues(test)
+
+
+def test_recover_requeues_only_this_workers_running_jobs():
+    async def test(db, a, b):
+        mine, theirs = str(uuid.uuid4()), str(uuid.uuid4())
+        await a.enqueue(mine, payload(mine))
+        await b.enqueue(theirs, payload(theirs))
+        await a.claim()
+        await b.claim()
+        assert await JobQueue(db, "worker-a").recover() == 1
+        job = await a.claim()
+        # A crash counts as an attempt
+        assert job.file_id == mine and job.attempts == 2
+    with_queues(test)
+
+
+def test_depth_counts_jobs_by_status():
+    async def test(db, a, b):
+        assert await a.depth() == {"queued": 0, "running": 0, "failed": 0, "oldest_queued_age_seconds": 0}
+        ids = [str(uuid.uuid4()) for _ in range(3)]
+        for file_id in ids:
+            await a.enqueue(file_id, payload(file_id))
+        await a.fail((await a.claim()).id, "bad file")
+        await a.claim()
+        depth = await a.depth()
+        assert (depth["queued"], depth["running"], depth["failed"]) == (1, 1, 1)
+        assert depth["oldest_queued_age_seconds"] >= 0
+    with_queues(test)
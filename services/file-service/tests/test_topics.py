@@ -0,0 +1,85 @@
+from topics import WINDOW_PAGES, detect_headings, segment_topics
+
+BIOLOGY = "Photosynthesis converts light energy chloroplast chlorophyll glucose oxygen carbon dioxide leaves plants"
+HISTORY = "Revolution monarchy parliament treaty empire colonies taxation war republic constitution"
+
+
+def spans(topics):
+    return [(t["name"], t["start_page"], t["end_page"], t["parent"]) for t in topics]
+
+
+def test_sections_start_at_each_new_heading():
+    pages = [f"Photosynthesis\n{BIOLOGY}", BIOLOGY, f"French Revolution\n{HISTORY}", HISTORY]
+    assert spans(segment_topics(pages)) == [
+        ("Photosynthesis", 1, 2, None),
+        ("French Revolution", 3, 4, None),
+    ]
+
+
+def test_similar_adjacent_sections_share_a_parent():
+    pages = [f"Photosynthesis\n{BIOLOGY}", f"Light Reactions\n{BIOLOGY} thylakoid", f"French Revolution\n{HISTORY}"]
+    topics = segment_topics(pages)
+    assert [(t["start_page"], t["end_page"], t["parent"]) for t in topics] == [
+        (1, 2, None), (1, 1, 0), (2, 2, 0), (3, 3, None),
+    ]
+    assert "photosynthesis" in topics[0]["keywords"]
+
+
+def test_numbered_headings_nest_under_their_chapter():
+    pages = [f"1 Cells\n{BIOLOGY}", f"1.1 Membranes\n{BIOLOGY}", f"1.2 Nucleus\n{BIOLOGY}", f"2 Energy\n{HISTORY}"]
+    assert spans(segment_topics(pages)) == [
+        ("1 Cells", 1, 3, None),
+        ("1.1 Membranes", 2, 2, 0),
+        ("1.2 Nucleus", 3, 3, 0),
+        ("2 Energy", 4, 4, None),
+    ]
+
+
+def test_a_continued_heading_does_not_start_a_section():
+    pages = [f"Cells\n{BIOLOGY}", f"Cells (cont'd)\n{BIOLOGY}", f"History\n{HISTORY}"]
+    assert spans(segment_topics(pages)) == [("Cells", 1, 2, None), ("History", 3, 3, None)]
+
+
+def test_running_headers_are_not_headings():
+    pages = [f"Course Notes\nCells\n{BIOLOGY}", f"Course Notes\n{BIOLOGY}"] * 3
+    assert detect_headings(pages) == ["Cells", None] * 3
+
+
+def test_sentences_are_not_headings():
+    assert detect_headings([f"This line ends like a sentence.\n{BIOLOGY}", f"{BIOLOGY} {BIOLOGY}"]) == [None, None]
+
+
+def test_pages_without_a_heading_join_the_section_before():
+    pages = [f"Photosynthesis\n{BIOLOGY}"] + [BIOLOGY] * 3 + [f"French Revolution\n{HISTORY}"]
+    assert [(t["start_page"], t["end_page"]) for t in segment_topics(pages)] == [(1, 4), (5, 5)]
+
+
+def test_without_headings_sections_are_fixed_windows():
+    pages = [BIOLOGY.lower()] * (2 * WINDOW_PAGES + 2)
+    topics = segment_topics(pages)
+    children = [(t["start_page"], t["end_page"]) for t in topics if t["parent"] is not None]
+    assert children == [
+        (1, WINDOW_PAGES), (WINDOW_PAGES + 1, 2 * WINDOW_PAGES), (2 * WINDOW_PAGES + 1, 2 * WINDOW_PAGES + 2),
+    ]
+    assert all(t["name"] != "Untitled" for t in topics)
+
+
+def test_a_short_document_without_headings_is_one_topic():
+    topics = segment_topics([BIOLOGY.lower()] * (WINDOW_PAGES - 1))
+    assert [(t["start_page"], t["end_page"], t["parent"]) for t in topics] == [(1, WINDOW_PAGES - 1, None)]
+    assert set(topics[0]["keywords"]) <= set(BIOLOGY.lower().split())
+
+
+def test_a_document_with_one_heading_is_one_topic():
+    assert spans(segment_topics([f"Cells\n{BIOLOGY}", BIOLOGY, BIOLOGY])) == [("Cells", 1, 3, None)]
+
+
+def test_pages_before_the_first_heading_form_their_own_section():
+    pages = [BIOLOGY.lower(), f"French Revolution\n{HISTORY}"]
+    topics = segment_topics(pages)
+    assert [(t["start_page"], t["end_page"]) for t in topics] == [(1, 1), (2, 2)]
+    assert topics[1]["name"] == "French Revolution"
+
+
+def test_no_pages_no_topics():
+    assert segment_topics([]) == []
@@ -0,0 +1,101 @@
+import hashlib
+import os
+
+import pytest
+from fastapi import FastAPI, HTTPException, Request, status
+from fastapi.testclient import TestClient
+
+from uploads import spool_upload
+
+MAX_SIZE = 1024
+
+
+def check_filename(filename: str):
+    if not filename.lower().endswith(".pdf"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="File type not allowed")
+
+
+@pytest.fixture
+def client(tmp_path):
+    app = FastAPI()
+
+    @app.post("/upload")
+    async def upload(request: Request):
+        upload = await spool_upload(request, "file", str(tmp_path), MAX_SIZE, 256, check_filename)
+        with open(upload.path, "rb") as f:
+            data = f.read()
+        os.unlink(upload.path)
+        return {"filename": upload.filename, "size": upload.size, "sha256": upload.sha256, "data": data.decode()}
+
+    return TestClient(app)
+
+
+def multipart_body(filename: str, data: bytes, boundary: str = "testboundary") -> bytes:
+    return (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        "Content-Type: application/pdf\r\n\r\n"
+    ).encode() + data + f"\r\n--{boundary}--\r\n".encode()
+
+
+def chunked(body: bytes, size: int = 100):
+    for start in range(0, len(body), size):
+        yield body[start:start + size]
+
+
+HEADERS = {"content-type": "multipart/form-data; boundary=testboundary"}
+
+
+def test_spools_the_file(client, tmp_path):
+    data = b"x" * 700
+    response = client.post("/upload", files={"file": ("notes.pdf", data, "application/pdf")})
+    assert response.status_code == 200
+    assert response.json() == {
+        "filename": "notes.pdf", "size": 700, "sha256": hashlib.sha256(data).hexdigest(), "data": data.decode()
+    }
+    assert os.listdir(tmp_path) == []
+
+
+def test_refuses_a_declared_length_over_the_limit(client):
+    response = client.post(
+        "/upload", content=b"", headers={**HEADERS, "content-length": str(MAX_SIZE + 128 * 1024)}
+    )
+    assert response.status_code == 413
+
+
+def test_refuses_a_streamed_file_over_the_limit(client, tmp_path):
+    body = multipart_body("notes.pdf", b"x" * (MAX_SIZE + 1))
+    response = client.post("/upload", content=chunked(body), headers=HEADERS)
+    assert response.status_code == 413
+    assert os.listdir(tmp_path) == []
+
+
+def test_accepts_a_file_at_the_limit(client):
+    body = multipart_body("notes.pdf", b"x" * MAX_SIZE)
+    response = client.post("/upload", content=chunked(body), headers=HEADERS)
+    assert response.status_code == 200
+    assert response.json()["size"] == MAX_SIZE
+
+
+def test_refuses_a_filename_before_its_data(client, tmp_path):
+    response = client.post("/upload", files={"file": ("notes.exe", b"x" * 10, "application/octet-stream")})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "File type not allowed"
+    assert os.listdir(tmp_path) == []
+
+
+def test_refuses_an_empty_file(client, tmp_path):
+    response = client.post("/upload", files={"file": ("notes.pdf", b"", "application/pdf")})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "The uploaded file is empty"
+    assert os.listdir(tmp_path) == []
+
+
+def test_requires_the_file_field(client):
+    response = client.post("/upload", files={"other": ("notes.pdf", b"x", "application/pdf")})
+    assert response.status_code == 422
+
+
+def test_requires_multipart(client):
+    response = client.post("/upload", json={"file": "x"})
+    assert response.status_code == 400
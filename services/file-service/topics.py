@@ -0,0 +1,167 @@
+"""
+Topic segmentation for extracted documents.
+
+Sections are cut wherever a page starts with a new heading (a slide title or
+a short heading-like first line), named by that heading or, failing that, by
+their top TF-IDF keywords. Numbered headings ("2.1 ...") nest under their
+parent number; otherwise adjacent sections whose TF-IDF vectors are similar
+are grouped under a keyword-named parent.
+
+Runs inside the extraction worker processes, so keep it import-light.
+"""
+import re
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+MAX_VOCAB = 5000
+WINDOW_PAGES = 5  # section size when a document has no usable headings
+MERGE_SIMILARITY = 0.35
+REPEATED_LINE_RATIO = 0.5  # running headers/footers appear on most pages
+
+TOKEN_RE = re.compile(r"[a-z][a-z\-]{2,}")
+NUMBERED_RE = re.compile(r"^(\d+(?:\.\d+)*)[.)]?\s+(\S.*)$")
+CONTINUED_RE = re.compile(r"\s*\((?:cont(?:'d|inued|\.)?)\)\s*$", re.IGNORECASE)
+STOPWORDS = frozenset("""
+    the and for are but not you all any can had her was one our out has him his how its
+    may new now see two who did get let put say she too use that with have this will your
+    from they been were said each which their there what about would these other into more
+    some than then them when very also only over such just most used using between where
+    while should could after before being both through during because under same those
+""".split())
+
+
+def _first_lines(text: str, count: int = 2) -> List[str]:
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    return lines[:count]
+
+
+def _looks_like_heading(line: str) -> bool:
+    if not 3 <= len(line) <= 80 or line[-1] in ".,;:":
+        return False
+    if len(line.split()) > 12:
+        return False
+    return bool(NUMBERED_RE.match(line)) or line[0].isupper()
+
+
+def detect_headings(pages: List[str]) -> List[Optional[str]]:
+    """Heading of each page, or None. Lines repeated on most pages are ignored."""
+    candidates = [[line for line in _first_lines(text) if _looks_like_heading(line)] for text in pages]
+    seen = Counter(line for lines in candidates for line in set(lines))
+    limit = max(3, int(len(pages) * REPEATED_LINE_RATIO))
+    return [next((line for line in lines if seen[line] <= limit), None) for lines in candidates]
+
+
+def tfidf_matrix(pages: List[str]) -> Tuple[np.ndarray, List[str]]:
+    """Row-normalised TF-IDF matrix (pages x terms) over the MAX_VOCAB most common terms."""
+    page_counts = [Counter(t for t in TOKEN_RE.findall(text.lower()) if t not in STOPWORDS) for text in pages]
+    doc_freq = Counter(term for counts in page_counts for term in counts)
+    vocab = [term for term, _ in doc_freq.most_common(MAX_VOCAB)]
+    index = {term: i for i, term in enumerate(vocab)}
+
+    counts = np.zeros((len(pages), len(vocab)), dtype=np.float32)
+    for row, page in enumerate(page_counts):
+        cols = [index[t] for t in page if t in index]
+        counts[row, cols] = [page[vocab[c]] for c in cols]
+
+    tf = counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+    df = (counts > 0).sum(axis=0)
+    idf = np.log((1 + len(pages)) / (1 + df)) + 1
+    weights = tf * idf
+    norms = np.linalg.norm(weights, axis=1, keepdims=True)
+    return weights / np.maximum(norms, 1e-9), vocab
+
+
+def _keywords(vector: np.ndarray, vocab: List[str], count: int = 3) -> List[str]:
+    top = np.argsort(vector)[::-1][:count]
+    return [vocab[i] for i in top if vector[i] > 0]
+
+
+def _keyword_name(vector: np.ndarray, vocab: List[str]) -> str:
+    words = _keywords(vector, vocab)
+    return " / ".join(w.capitalize() for w in words) if words else "Untitled"
+
+
+def _normalise(heading: str) -> str:
+    return CONTINUED_RE.sub("", heading).strip().lower()
+
+
+def segment_topics(pages: List[str]) -> List[Dict[str, Any]]:
+    """
+    Split ``pages`` into a two-level topic tree.
+
+    Returns topics in insertion order (parents before their children), each
+    as ``{"name", "start_page", "end_page", "parent", "keywords"}`` where pages
+    are 1-based and inclusive and ``parent`` is an index into the list or None.
+    """
+    if not pages:
+        return []
+    weights, vocab = tfidf_matrix(pages)
+    headings = detect_headings(pages)
+
+    # Cut sections at heading changes; fall back to fixed windows
+    sections: List[Dict[str, Any]] = []
+    if any(headings):
+        for number, heading in enumerate(headings, start=1):
+            if heading and (not sections or _normalise(heading) != _normalise(sections[-1]["heading"] or "")):
+                sections.append({"heading": CONTINUED_RE.sub("", heading), "start_page": number, "end_page": number})
+            elif sections:
+                sections[-1]["end_page"] = number
+            else:
+                sections.append({"heading": None, "start_page": number, "end_page": number})
+    else:
+        for start in range(1, len(pages) + 1, WINDOW_PAGES):
+            sections.append({"heading": None, "start_page": start, "end_page": min(start + WINDOW_PAGES - 1, len(pages))})
+
+    for section in sections:
+        vector = weights[section["start_page"] - 1:section["end_page"]].sum(axis=0)
+        section["vector"] = vector / max(np.linalg.norm(vector), 1e-9)
+
+    # Group sections under parents: by heading numbering when every section
+    # is numbered, otherwise by similarity of adjacent sections
+    groups: List[List[int]] = []
+    numbers = [NUMBERED_RE.match(s["heading"] or "") for s in sections]
+    numbered = all(numbers)
+    if numbered:
+        for i, match in enumerate(numbers):
+            chapter = match.group(1).split(".")[0]
+            if groups and numbers[groups[-1][0]].group(1).split(".")[0] == chapter:
+                groups[-1].append(i)
+            else:
+                groups.append([i])
+    else:
+        for i, section in enumerate(sections):
+            if groups and float(section["vector"] @ sections[i - 1]["vector"]) >= MERGE_SIMILARITY:
+                groups[-1].append(i)
+            else:
+                groups.append([i])
+
+    topics: List[Dict[str, Any]] = []
+    for group in groups:
+        members = [sections[i] for i in group]
+        parent = None
+        first = members[0]
+        # A numbered chapter heading ("2 ...") is itself the parent of its subsections
+        chapter_heading = numbered and len(members) > 1 and "." not in numbers[group[0]].group(1)
+        if len(members) > 1:
+            vector = sum(m["vector"] for m in members)
+            parent = len(topics)
+            topics.append({
+                "name": first["heading"] if chapter_heading else _keyword_name(vector, vocab),
+                "start_page": first["start_page"],
+                "end_page": members[-1]["end_page"],
+                "parent": None,
+                "keywords": _keywords(vector, vocab, 5),
+            })
+            if chapter_heading:
+                members = members[1:]
+        for section in members:
+            topics.append({
+                "name": section["heading"] or _keyword_name(section["vector"], vocab),
+                "start_page": section["start_page"],
+                "end_page": section["end_page"],
+                "parent": parent,
+                "keywords": _keywords(section["vector"], vocab, 5),
+            })
+    return topics
@@ -0,0 +1,141 @@
+"""
+Streaming multipart uploads for the file-service.
+
+The upload route reads the request body itself instead of declaring an
+``UploadFile`` parameter. Starlette would receive and spool the whole form
+before the route runs, so an oversized upload could only be refused once it
+had fully arrived, and the file would then be copied a second time into our
+own spool file. Here:
+
+- a ``Content-Length`` over the limit is refused before any of the body is read;
+- the file part is written straight to one temporary file and hashed as it
+  arrives, and refused as soon as it goes over the limit (e.g. for chunked
+  requests without a length);
+- the filename is checked when the part's headers arrive, before its data;
+- an empty file is refused.
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import multipart
+from fastapi import HTTPException, Request, status
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import parse_options_header
+
+# Room for the multipart boundaries and part headers around the file
+MULTIPART_OVERHEAD = 64 * 1024
+
+
+@dataclass
+class SpooledUpload:
+    filename: str
+    path: str  # owned by the caller
+    size: int
+    sha256: str
+
+
+def _too_large(max_size: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"File exceeds the maximum size of {max_size} bytes"
+    )
+
+
+async def spool_upload(
+    request: Request,
+    field: str,
+    directory: str,
+    max_size: int,
+    write_size: int,
+    check_filename: Callable[[str], None],
+) -> SpooledUpload:
+    """
+    Stream the ``field`` file of a multipart/form-data request to a
+    temporary file in ``directory``, ``write_size`` bytes per disk write.
+    ``check_filename`` may raise HTTPException to refuse the file by name.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or not params.get(b"boundary"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Send the file as multipart/form-data")
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_size + MULTIPART_OVERHEAD:
+        raise _too_large(max_size)
+
+    # The parser calls back synchronously; collect its events and act on them
+    # (with awaits) after each chunk
+    events: List[Tuple[str, object]] = []
+    headers: Dict[bytes, bytes] = {}
+    header = [b"", b""]
+
+    def on_header_field(data, start, end):
+        header[0] += data[start:end]
+
+    def on_header_value(data, start, end):
+        header[1] += data[start:end]
+
+    def on_header_end():
+        headers[header[0].lower()] = header[1]
+        header[:] = [b"", b""]
+
+    parser = multipart.MultipartParser(params[b"boundary"], {
+        "on_part_begin": headers.clear,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": lambda: events.append(("part", dict(headers))),
+        "on_part_data": lambda data, start, end: events.append(("data", data[start:end])),
+        "on_part_end": lambda: events.append(("end", None)),
+    })
+
+    filename: Optional[str] = None
+    tmp = None
+    in_file = False
+    size = 0
+    digest = hashlib.sha256()
+    pending = bytearray()
+    try:
+        async for chunk in request.stream():
+            try:
+                parser.write(chunk)
+            except MultipartParseError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Malformed upload: {e}")
+            for kind, value in events:
+                if kind == "part":
+                    _, options = parse_options_header(value.get(b"content-disposition", b""))
+                    in_file = tmp is None and options.get(b"name") == field.encode() and b"filename" in options
+                    if in_file:
+                        filename = options[b"filename"].decode("utf-8", "replace")
+                        check_filename(filename)
+                        tmp = tempfile.NamedTemporaryFile(
+                            delete=False, suffix=os.path.splitext(filename)[1].lower(), dir=directory
+                        )
+                elif kind == "data" and in_file:
+                    size += len(value)
+                    if size > max_size:
+                        raise _too_large(max_size)
+                    digest.update(value)
+                    pending += value
+                elif kind == "end":
+                    in_file = False
+            events.clear()
+            if tmp is not None and (len(pending) >= write_size or not in_file) and pending:
+                await asyncio.to_thread(tmp.write, bytes(pending))
+                pending.clear()
+        parser.finalize()
+        if tmp is None:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"No '{field}' file in the upload")
+        if size == 0:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="The uploaded file is empty")
+        if pending:
+            await asyncio.to_thread(tmp.write, bytes(pending))
+        tmp.close()
+    except BaseException:
+        if tmp is not None:
+            tmp.close()
+            os.unlink(tmp.name)
+        raise
+    return SpooledUpload(filename, tmp.name, size, digest.hexdigest())
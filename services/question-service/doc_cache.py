@@ -0,0 +1,86 @@
+"""
+LRU cache of extracted document pages, bounded by total text size
+(counted in characters, a close proxy for bytes of mostly-ASCII text).
+
+Entries are tagged with the file's version (its ``files.updated_at``), which
+the question service reads on every request anyway. When the file service
+reprocesses a file, the version changes and the stale entry is dropped.
+Deleted files are evicted when their lookup 404s.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+
+@dataclass
+class _Entry:
+    version: str
+    pages: Dict[int, str] = field(default_factory=dict)
+    complete: bool = False  # every page of the document is cached
+    size: int = 0
+
+
+class DocumentCache:
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+
+    def get_pages(self, file_id: str, version: str, start: int = 1, end: Optional[int] = None) -> Optional[List[str]]:
+        """Text of pages start..end (inclusive; end=None means to the last page), or None on a miss."""
+        entry = self._entries.get(file_id)
+        if entry is not None and entry.version != version:
+            self.invalidate(file_id)
+            entry = None
+
+        pages = None
+        if entry is not None:
+            if entry.complete:
+                pages = [text for number, text in sorted(entry.pages.items()) if number >= start and (end is None or number <= end)]
+            elif end is not None and all(n in entry.pages for n in range(start, end + 1)):
+                pages = [entry.pages[n] for n in range(start, end + 1)]
+
+        if pages is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(file_id)
+        return pages
+
+    def store(self, file_id: str, version: str, pages: Dict[int, str], complete: bool = False):
+        entry = self._entries.get(file_id)
+        if entry is None or entry.version != version:
+            self.invalidate(file_id)
+            entry = self._entries[file_id] = _Entry(version=version)
+        for number, text in pages.items():
+            if number not in entry.pages:
+                entry.pages[number] = text
+                entry.size += len(text)
+                self.size += len(text)
+        entry.complete = entry.complete or complete
+        self._entries.move_to_end(file_id)
+
+        while self.size > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.size
+            self.evictions += 1
+
+    def invalidate(self, file_id: str):
+        entry = self._entries.pop(file_id, None)
+        if entry is not None:
+            self.size -= entry.size
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,103 @@
+"""
+Streaming export of quiz results.
+
+Quizzes are read a page at a time with keyset paging on
+``(created_at, quiz_id)``, so no connection or transaction is held while the
+client reads and memory stays at one page however many rows match. The next
+page is fetched while the current one is being sent.
+
+Two levels of detail:
+
+- ``quizzes``: one row per quiz with its outcome (status, score, answered
+  and correct counts);
+- ``answers``: one row per submitted answer with the quiz fields and the
+  question's text, topic, difficulty and Bloom level.
+
+Rows are written as CSV (with a header) or NDJSON, one chunk per page.
+"""
+import asyncio
+import csv
+import io
+import json
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List
+
+from repository import QuestionRepository
+
+QUIZ_COLUMNS = [
+    "quiz_id", "owner_id", "ruleset_id", "ruleset_name", "status", "score", "total_questions",
+    "answered", "correct", "start_time", "end_time", "created_at",
+]
+ANSWER_COLUMNS = [
+    "quiz_id", "owner_id", "ruleset_id", "status", "score", "question_id", "question_text", "topic",
+    "difficulty", "bloom_level", "selected_answer", "correct_answer", "is_correct", "answered_at",
+]
+
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def _value(value: Any) -> Any:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+async def _quiz_pages(
+    repo: QuestionRepository, caller_id: str, filters: Dict[str, Any], page_size: int
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    page = await repo.export_quizzes(caller_id, filters, None, page_size)
+    while page:
+        next_page = None
+        if len(page) == page_size:
+            last = page[-1]
+            next_page = asyncio.create_task(
+                repo.export_quizzes(caller_id, filters, (last["created_at"], last["quiz_id"]), page_size)
+            )
+        try:
+            yield page
+        except BaseException:
+            # The client went away while this page was being sent
+            if next_page is not None:
+                next_page.cancel()
+            raise
+        page = await next_page if next_page is not None else []
+
+
+async def export_rows(
+    repo: QuestionRepository, caller_id: str, filters: Dict[str, Any], level: str, page_size: int
+) -> AsyncIterator[List[Dict[str, Any]]]:
+    """Pages of export rows (dicts with the level's columns)."""
+    async for quizzes in _quiz_pages(repo, caller_id, filters, page_size):
+        quiz_ids = [quiz["quiz_id"] for quiz in quizzes]
+        if level == "quizzes":
+            counts = await repo.export_answer_counts(quiz_ids)
+            yield [
+                {**quiz, "answered": counts.get(quiz["quiz_id"], {}).get("answered", 0),
+                 "correct": counts.get(quiz["quiz_id"], {}).get("correct", 0)}
+                for quiz in quizzes
+            ]
+        else:
+            by_id = {quiz["quiz_id"]: quiz for quiz in quizzes}
+            yield [
+                {**by_id[answer["quiz_id"]], **answer}
+                for answer in await repo.export_answers(quiz_ids)
+            ]
+
+
+async def stream_export(
+    repo: QuestionRepository, caller_id: str, filters: Dict[str, Any], level: str, fmt: str, page_size: int
+) -> AsyncIterator[str]:
+    columns = QUIZ_COLUMNS if level == "quizzes" else ANSWER_COLUMNS
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if fmt == "csv":
+        writer.writerow(columns)
+        yield buffer.getvalue()
+    async for rows in export_rows(repo, caller_id, filters, level, page_size):
+        buffer.seek(0)
+        buffer.truncate()
+        for row in rows:
+            if fmt == "csv":
+                writer.writerow(["" if row.get(c) is None else _value(row.get(c)) for c in columns])
+            else:
+                buffer.write(json.dumps({c: _value(row.get(c)) for c in columns}) + "\n")
+        if rows:
+            yield buffer.getvalue()
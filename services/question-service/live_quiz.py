@@ -0,0 +1,226 @@
+"""
+Live quiz sessions over a WebSocket.
+
+One connection carries a whole quiz. The caller is authenticated once, and
+the quiz, its correct answers and the answers given so far are loaded once,
+so each answer costs one frame and one insert instead of an HTTP request
+with its own auth check.
+
+Frames are JSON objects with a ``type``. Client to server:
+
+- ``{"type": "auth", "token": "..."}``: first frame, unless the upgrade
+  request had an ``Authorization: Bearer`` header;
+- ``{"type": "start"}``: start the quiz (a started quiz keeps its start time);
+- ``{"type": "answer", "question_id": "...", "selected_answer": "..."}``;
+- ``{"type": "finish"}``.
+
+Server to client:
+
+- ``ready``: the quiz, the IDs already answered and ``remaining_s``;
+- ``started``: the quiz and ``remaining_s``;
+- ``answer``: the answer was stored, with ``is_correct`` and
+  ``correct_answer`` if the quiz's grading style is ``immediate``;
+- ``time``: ``remaining_s``, every ``time_interval`` seconds while a timed
+  quiz runs. When it reaches 0 the quiz is finished and further answers are
+  refused;
+- ``result``: the graded quiz (as ``POST /quizzes/{id}/finish``), after which
+  the server closes the connection;
+- ``error``: a ``detail``. A bad frame does not end the session. Failing
+  auth, an unknown quiz or a finished quiz close it with code ``4401``,
+  ``4404`` or ``4409``.
+"""
+import asyncio
+import json
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import WebSocket, WebSocketDisconnect
+from fastapi.encoders import jsonable_encoder
+
+from repository import QuestionRepository
+
+logger = logging.getLogger(__name__)
+
+CLOSE_UNAUTHORIZED = 4401
+CLOSE_NOT_FOUND = 4404
+CLOSE_FINISHED = 4409
+
+
+class SessionClosed(Exception):
+    def __init__(self, code: int, detail: str):
+        super().__init__(detail)
+        self.code = code
+        self.detail = detail
+
+
+class LiveQuizSession:
+    def __init__(
+        self,
+        websocket: WebSocket,
+        repo: QuestionRepository,
+        quiz_id: str,
+        authenticate: Callable[[str], Awaitable[Any]],
+        grade: Callable[[Dict[str, Any], Dict[str, str]], Awaitable[Any]],
+        auth_timeout: float,
+        time_interval: float,
+    ):
+        self.websocket = websocket
+        self.repo = repo
+        self.quiz_id = quiz_id
+        self.authenticate = authenticate
+        self.grade = grade
+        self.auth_timeout = auth_timeout
+        self.time_interval = time_interval
+        self.quiz: Dict[str, Any] = {}
+        self.correct_answers: Dict[str, str] = {}
+        self.answered = set()
+        self.answers_received = 0
+
+    async def send(self, type_: str, **fields):
+        await self.websocket.send_json(jsonable_encoder({"type": type_, **fields}))
+
+    async def receive(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """The next frame, or None if ``timeout`` passes first."""
+        try:
+            text = await asyncio.wait_for(self.websocket.receive_text(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        try:
+            message = json.loads(text)
+        except json.JSONDecodeError:
+            message = None
+        return message if isinstance(message, dict) else {"type": None}
+
+    def deadline(self) -> Optional[datetime]:
+        start_time = self.quiz.get("start_time")
+        if not self.quiz.get("timed") or not self.quiz.get("time_limit") or start_time is None:
+            return None
+        if start_time.tzinfo is None:
+            start_time = start_time.replace(tzinfo=timezone.utc)
+        return start_time + timedelta(minutes=self.quiz["time_limit"])
+
+    def remaining(self) -> Optional[float]:
+        deadline = self.deadline()
+        if deadline is None:
+            return None
+        return round(max(0.0, (deadline - datetime.now(timezone.utc)).total_seconds()), 1)
+
+    async def run(self, authorization: Optional[str]):
+        started = time.perf_counter()
+        outcome = "disconnected"
+        try:
+            await self.open(authorization)
+            outcome = await self.serve()
+        except SessionClosed as e:
+            outcome = "closed"
+            await self.send("error", detail=e.detail)
+            await self.websocket.close(code=e.code)
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            outcome = "error"
+            logger.exception("live quiz session failed", extra={"quiz_id": self.quiz_id})
+            await self.send("error", detail=str(e))
+            await self.websocket.close(code=1011)
+        finally:
+            logger.info(
+                "live quiz session ended",
+                extra={
+                    "quiz_id": self.quiz_id,
+                    "outcome": outcome,
+                    "answers": self.answers_received,
+                    "duration_ms": round((time.perf_counter() - started) * 1000, 3),
+                },
+            )
+
+    async def open(self, authorization: Optional[str]):
+        scheme, _, token = (authorization or "").partition(" ")
+        if scheme.lower() != "bearer" or not token:
+            message = await self.receive(self.auth_timeout)
+            if not message or message.get("type") != "auth" or not message.get("token"):
+                raise SessionClosed(CLOSE_UNAUTHORIZED, 'Send {"type": "auth", "token": ...} first')
+            token = message["token"]
+        try:
+            user = await self.authenticate(token)
+        except Exception as e:
+            raise SessionClosed(CLOSE_UNAUTHORIZED, getattr(e, "detail", str(e)))
+
+        quiz = await self.repo.get_quiz(self.quiz_id, user.id)
+        if not quiz:
+            raise SessionClosed(CLOSE_NOT_FOUND, "Quiz not found")
+        if quiz["status"] == "completed":
+            raise SessionClosed(CLOSE_FINISHED, "Quiz already finished")
+        self.quiz = quiz
+        questions = await self.repo.get_questions(quiz["question_ids"])
+        self.correct_answers = {q["id"]: q["answer"] for q in questions}
+        self.answered = {a["question_id"] for a in await self.repo.get_answers(self.quiz_id)}
+        await self.send("ready", quiz=self.quiz_fields(), answered=sorted(self.answered), remaining_s=self.remaining())
+
+    def quiz_fields(self) -> Dict[str, Any]:
+        fields = ("quiz_id", "owner_id", "question_ids", "start_time", "end_time", "timed", "time_limit",
+                  "grading_style", "status")
+        return {field: self.quiz.get(field) for field in fields}
+
+    async def serve(self) -> str:
+        """Handle frames until the quiz is finished; returns how it ended."""
+        next_tick = time.monotonic() + self.time_interval
+        while True:
+            remaining = self.remaining()
+            timeout = None
+            if remaining is not None:
+                timeout = max(0.0, min(next_tick - time.monotonic(), remaining))
+            message = await self.receive(timeout)
+
+            if message is None:
+                # Timer: push the remaining time, or finish when it is up
+                if self.remaining() == 0:
+                    await self.finish()
+                    return "time_up"
+                await self.send("time", remaining_s=self.remaining())
+                next_tick = time.monotonic() + self.time_interval
+                continue
+
+            kind = message.get("type")
+            if kind == "start":
+                if self.quiz.get("start_time") is None:
+                    started = await self.repo.start_quiz(self.quiz_id, self.quiz["owner_id"], datetime.now(timezone.utc))
+                    self.quiz = started or self.quiz
+                next_tick = time.monotonic() + self.time_interval
+                await self.send("started", quiz=self.quiz_fields(), remaining_s=self.remaining())
+            elif kind == "answer":
+                await self.answer(message)
+            elif kind == "finish":
+                await self.finish()
+                return "finished"
+            else:
+                await self.send("error", detail="Unknown frame type; expected start, answer or finish")
+
+    async def answer(self, message: Dict[str, Any]):
+        question_id = message.get("question_id")
+        selected_answer = message.get("selected_answer")
+        if question_id not in self.correct_answers or not isinstance(selected_answer, str):
+            await self.send("error", detail="Answer needs a question_id of this quiz and a selected_answer",
+                            question_id=question_id)
+            return
+        if self.quiz.get("start_time") is None:
+            await self.send("error", detail="Start the quiz first", question_id=question_id)
+            return
+        if self.remaining() == 0:
+            await self.send("error", detail="Time is up", question_id=question_id)
+            return
+
+        await self.repo.insert_answer(self.quiz_id, question_id, selected_answer, datetime.now(timezone.utc))
+        self.answered.add(question_id)
+        self.answers_received += 1
+        feedback: Dict[str, Any] = {}
+        if self.quiz.get("grading_style") == "immediate":
+            correct_answer = self.correct_answers[question_id]
+            feedback = {"is_correct": selected_answer == correct_answer, "correct_answer": correct_answer}
+        await self.send("answer", question_id=question_id, answered=len(self.answered), **feedback)
+
+    async def finish(self):
+        result = await self.grade(self.quiz, self.correct_answers)
+        await self.send("result", result=result)
+        await self.websocket.close()
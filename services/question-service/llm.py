@@ -0,0 +1,308 @@
+"""
+LLM calls for question generation.
+
+``QuestionGenerator`` turns a prompt into validated questions through an
+``LLMBackend``:
+
+- every call has a timeout and the whole generation an overall deadline;
+- transient failures (timeouts, 429/5xx, connection errors) and replies that
+  do not parse as a question list are retried with jittered backoff;
+- optionally, a second identical request is sent if the first has not
+  answered after ``hedge_after`` seconds, and the first good reply wins;
+- models are tried in the configured order, moving on when one keeps failing.
+
+Cancelling a call (a timeout, or the slower of two hedged calls) stops
+waiting for it, but a synchronous SDK request already running cannot be
+interrupted; it holds its thread until the SDK's own timeout ends it.
+
+Backends: ``GeminiBackend`` calls the Gemini API from its own bounded thread
+pool, so abandoned requests cannot take over the default executor that
+other blocking calls (auth, storage) share. ``RecordingBackend`` wraps
+another backend and appends every reply to a JSON-lines file, which
+``ReplayBackend`` serves back so generation can be benchmarked offline and
+deterministically.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from common.bootstrap import lazy_import
+from common.tracing import span
+
+# The Gemini SDK is slow to import; load it when the first questions are generated
+genai = lazy_import("google.generativeai")
+
+logger = logging.getLogger(__name__)
+
+# HTTP statuses worth retrying
+TRANSIENT_STATUSES = {408, 429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class LLMDeadlineExceeded(LLMError):
+    pass
+
+
+def prompt_key(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode()).hexdigest()
+
+
+def parse_questions(text: str) -> List[Dict[str, Any]]:
+    """The question list in a model reply; raises a retryable LLMError if it is malformed."""
+    text = text.strip()
+    # Models sometimes wrap the JSON in a code block despite the instructions
+    if text.startswith("```json"):
+        text = text[7:]
+    if text.startswith("```"):
+        text = text[3:]
+    if text.endswith("```"):
+        text = text[:-3]
+    try:
+        questions = json.loads(text.strip())
+    except json.JSONDecodeError as e:
+        raise LLMError(f"Reply is not valid JSON: {e}", retryable=True)
+    if not isinstance(questions, list) or not questions:
+        raise LLMError("Reply is not a non-empty JSON array", retryable=True)
+    for q in questions:
+        if not isinstance(q, dict) or not all(k in q for k in ("question", "options", "answer")) \
+                or not isinstance(q["options"], list):
+            raise LLMError("Reply has a question without question/options/answer", retryable=True)
+    return questions
+
+
+class LLMBackend:
+    async def complete(self, model: str, prompt: str, timeout: float) -> str:
+        """Reply text of ``model`` for ``prompt``; raises LLMError."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class GeminiBackend(LLMBackend):
+    def __init__(self, api_key: str, endpoint: Optional[str] = None, max_threads: int = 8):
+        self.api_key = api_key
+        self.endpoint = endpoint
+        # Calls beyond max_threads queue here; a queued call that is cancelled never runs
+        self._executor = ThreadPoolExecutor(max_workers=max_threads, thread_name_prefix="gemini")
+        self._models: Dict[str, Any] = {}
+        # Calls run in worker threads, and the lazy SDK import must happen in only one
+        self._lock = threading.Lock()
+
+    def _model(self, name: str):
+        with self._lock:
+            if not self._models:
+                if self.endpoint:
+                    genai.configure(api_key=self.api_key, transport="rest", client_options={"api_endpoint": self.endpoint})
+                else:
+                    genai.configure(api_key=self.api_key)
+            if name not in self._models:
+                self._models[name] = genai.GenerativeModel(name)
+            return self._models[name]
+
+    def _generate(self, model: str, prompt: str, timeout: float) -> str:
+        from google.api_core import exceptions as api_exceptions
+
+        try:
+            response = self._model(model).generate_content(prompt, request_options={"timeout": timeout})
+        except api_exceptions.GoogleAPICallError as e:
+            raise LLMError(f"{model}: {e}", retryable=e.code in TRANSIENT_STATUSES)
+        except Exception as e:
+            # Connection errors and client-side timeouts
+            raise LLMError(f"{model}: {e}", retryable=True)
+        try:
+            return response.text
+        except ValueError as e:
+            # Blocked or empty candidate
+            raise LLMError(f"{model} returned no text: {e}", retryable=True)
+
+    async def complete(self, model: str, prompt: str, timeout: float) -> str:
+        # The SDK's REST transport is synchronous; keep it off the event loop
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._generate, model, prompt, timeout)
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class RecordingBackend(LLMBackend):
+    """Passes calls through to ``inner`` and appends each reply to ``path``."""
+
+    def __init__(self, inner: LLMBackend, path: str):
+        self.inner = inner
+        self.path = path
+
+    def _append(self, record: Dict[str, Any]):
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+
+    async def complete(self, model: str, prompt: str, timeout: float) -> str:
+        started = time.perf_counter()
+        text = await self.inner.complete(model, prompt, timeout)
+        await asyncio.to_thread(self._append, {
+            "key": prompt_key(prompt),
+            "model": model,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            "text": text,
+        })
+        return text
+
+    def close(self):
+        self.inner.close()
+
+
+class ReplayBackend(LLMBackend):
+    """
+    Serves replies recorded by ``RecordingBackend``. A prompt that was not
+    recorded gets the recorded replies in file order (cycling), unless
+    ``strict``, in which case it fails. With ``replay_latency`` each reply
+    is delayed by the latency it was recorded with.
+    """
+
+    def __init__(self, path: str, strict: bool = False, replay_latency: bool = False):
+        self.strict = strict
+        self.replay_latency = replay_latency
+        self.records: List[Dict[str, Any]] = []
+        with open(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    self.records.append(json.loads(line))
+        self.by_key = {record["key"]: record for record in self.records}
+        self.hits = 0
+        self.misses = 0
+        self._next = 0
+
+    async def complete(self, model: str, prompt: str, timeout: float) -> str:
+        record = self.by_key.get(prompt_key(prompt))
+        if record is not None:
+            self.hits += 1
+        elif self.strict or not self.records:
+            raise LLMError(f"No recorded reply for prompt {prompt_key(prompt)[:12]}")
+        else:
+            self.misses += 1
+            record = self.records[self._next % len(self.records)]
+            self._next += 1
+        if self.replay_latency:
+            await asyncio.sleep(min(record.get("latency_ms", 0) / 1000, timeout))
+        return record["text"]
+
+
+class QuestionGenerator:
+    def __init__(
+        self,
+        backend: LLMBackend,
+        models: List[str],
+        timeout: float = 30.0,
+        deadline: float = 60.0,
+        max_attempts: int = 3,
+        hedge_after: float = 0.0,
+        backoff: float = 0.5,
+    ):
+        self.backend = backend
+        self.models = models
+        self.timeout = timeout
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.hedge_after = hedge_after
+        self.backoff = backoff
+        self.calls = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.fallbacks = 0
+        self.failures = 0
+
+    async def _call(self, model: str, prompt: str, timeout: float) -> List[Dict[str, Any]]:
+        self.calls += 1
+        try:
+            text = await asyncio.wait_for(self.backend.complete(model, prompt, timeout), timeout)
+        except asyncio.TimeoutError:
+            raise LLMError(f"{model} did not answer within {timeout:.1f} s", retryable=True)
+        return parse_questions(text)
+
+    async def _attempt(self, model: str, prompt: str, timeout: float) -> List[Dict[str, Any]]:
+        """One call, hedged with a second one if the first is slow."""
+        first = asyncio.create_task(self._call(model, prompt, timeout))
+        if not self.hedge_after or self.hedge_after >= timeout:
+            return await first
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_after)
+        if done:
+            return first.result()
+
+        self.hedges += 1
+        hedge = asyncio.create_task(self._call(model, prompt, timeout - self.hedge_after))
+        pending = {first, hedge}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def generate(self, prompt: str) -> Tuple[List[Dict[str, Any]], str]:
+        """Questions for ``prompt`` and the model that produced them."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        last_error: Optional[LLMError] = None
+
+        for n, model in enumerate(self.models):
+            if n:
+                self.fallbacks += 1
+            for attempt in range(1, self.max_attempts + 1):
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    self.failures += 1
+                    raise LLMDeadlineExceeded(
+                        f"Question generation exceeded {self.deadline:g} s" + (f": {last_error}" if last_error else "")
+                    )
+                try:
+                    with span("gemini", model=model, attempt=attempt):
+                        return await self._attempt(model, prompt, min(self.timeout, remaining)), model
+                except LLMError as e:
+                    last_error = e
+                    logger.warning("Generation with %s failed (attempt %d): %s", model, attempt, e,
+                                   extra={"model": model, "attempt": attempt, "retryable": e.retryable})
+                    if not e.retryable:
+                        break
+                    if attempt < self.max_attempts:
+                        self.retries += 1
+                        delay = self.backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+                        await asyncio.sleep(min(delay, max(0.0, deadline - loop.time())))
+
+        self.failures += 1
+        if loop.time() >= deadline:
+            raise LLMDeadlineExceeded(f"Question generation exceeded {self.deadline:g} s: {last_error}")
+        raise last_error or LLMError("No models configured")
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {
+            "models": self.models,
+            "calls": self.calls,
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "fallbacks": self.fallbacks,
+            "failures": self.failures,
+        }
+        if isinstance(self.backend, ReplayBackend):
+            stats.update(replay_hits=self.backend.hits, replay_misses=self.backend.misses)
+        return stats
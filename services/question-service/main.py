@@ -1,65 +1,99 @@
-from fastapi import FastAPI, Depends, HTTPException, status
-from fastapi.responses import JSONResponse
-from fastapi import status as fastapi_status, Request
-
-# Initialize FastAPI app
-app = FastAPI(
-    title="Question Generation Service",
-    description="AI-powered quiz generation using Google Gemini",
-    version="1.0.0"
-)
-
-@app.exception_handler(Exception)
-async def generic_exception_handler(request: Request, exc: Exception):
-    import traceback
-    print("Exception:", exc)
-    print(traceback.format_exc())
-    return JSONResponse(
-        status_code=fastapi_status.HTTP_400_BAD_REQUEST,
-        content={
-            "error": type(exc).__name__,
-            "detail": str(exc),
-            "trace": traceback.format_exc()
-        },
-    )
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi import Depends, HTTPException, Query, WebSocket, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 import os
 import uuid
-from datetime import datetime, timedelta, timezone
-from supabase import create_client, Client
-import google.generativeai as genai
-import json
+import random
+from datetime import datetime, timezone
 import time
+import asyncio
+import logging
+import httpx
+
+from doc_cache import DocumentCache
+from export import MEDIA_TYPES, stream_export
+from live_quiz import LiveQuizSession
+from question_bank import allocate
+from llm import (
+    GeminiBackend, LLMDeadlineExceeded, LLMError, QuestionGenerator, RecordingBackend, ReplayBackend
+)
+from repository import QuestionRepository
+from common.bootstrap import create_app, create_supabase_client, on_shutdown, on_startup
+from common.db import Database
+from common.tracing import outbound_headers, span
 
 # Initialize FastAPI app
-app = FastAPI(
+app = create_app(
+    "question-service",
     title="Question Generation Service",
-    description="AI-powered quiz generation using Google Gemini",
-    version="1.0.0"
+    description="AI-powered quiz generation using Google Gemini"
 )
 
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+logger = logging.getLogger(__name__)
+
+# Gemini
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+# Models to try, in order
+GEMINI_MODELS = [m.strip() for m in os.getenv("GEMINI_MODELS", "gemini-2.0-flash").split(",") if m.strip()]
+# Alternative API endpoint (e.g. the load-test stand-in); reached over REST
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT")
+
+# Generation limits (seconds); hedging is off when LLM_HEDGE_AFTER is 0
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE", "60"))
+LLM_MAX_ATTEMPTS = int(os.getenv("LLM_MAX_ATTEMPTS", "3"))
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0"))
+# Threads for Gemini calls, separate from the default executor
+LLM_MAX_THREADS = int(os.getenv("LLM_MAX_THREADS", "8"))
+# Record replies to / replay them from a JSON-lines file
+LLM_RECORD_PATH = os.getenv("LLM_RECORD_PATH", "")
+LLM_REPLAY_PATH = os.getenv("LLM_REPLAY_PATH", "")
+LLM_REPLAY_STRICT = os.getenv("LLM_REPLAY_STRICT", "").lower() in ("1", "true", "yes")
+LLM_REPLAY_LATENCY = os.getenv("LLM_REPLAY_LATENCY", "").lower() in ("1", "true", "yes")
 
-# Initialize Gemini
-genai.configure(api_key=os.getenv("GEMINI_API_KEY", ""))
-model = genai.GenerativeModel("gemini-2.0-flash")
+def create_llm_backend():
+    if LLM_REPLAY_PATH:
+        return ReplayBackend(LLM_REPLAY_PATH, strict=LLM_REPLAY_STRICT, replay_latency=LLM_REPLAY_LATENCY)
+    backend = GeminiBackend(GEMINI_API_KEY, GEMINI_API_ENDPOINT, LLM_MAX_THREADS)
+    if LLM_RECORD_PATH:
+        backend = RecordingBackend(backend, LLM_RECORD_PATH)
+    return backend
 
-# Supabase client
-supabase: Client = create_client(
-    os.getenv("SUPABASE_URL", ""),
-    os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
+question_generator = QuestionGenerator(
+    create_llm_backend(),
+    GEMINI_MODELS,
+    timeout=LLM_TIMEOUT,
+    deadline=LLM_DEADLINE,
+    max_attempts=LLM_MAX_ATTEMPTS,
+    hedge_after=LLM_HEDGE_AFTER,
 )
 
+# Supabase client (created at startup)
+supabase = None
+
+# Database (connection pool opened at startup)
+db = Database()
+questions_repo = QuestionRepository(db)
+
+# File service (passage retrieval)
+FILE_SERVICE_URL = os.getenv("FILE_SERVICE_URL", "http://file-service:8002")
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "8"))
+file_service_client: Optional[httpx.AsyncClient] = None
+
+# Recently used document text, validated against files.updated_at
+DOCUMENT_CACHE_BYTES = int(os.getenv("DOCUMENT_CACHE_BYTES", str(64 * 1024 * 1024)))
+document_cache = DocumentCache(DOCUMENT_CACHE_BYTES)
+
+# Quizzes per page when exporting results
+EXPORT_PAGE_SIZE = int(os.getenv("EXPORT_PAGE_SIZE", "500"))
+
+# Live quiz sessions: seconds to wait for the auth frame, and between
+# remaining-time pushes on timed quizzes
+LIVE_AUTH_TIMEOUT = float(os.getenv("LIVE_AUTH_TIMEOUT", "10"))
+LIVE_TIME_INTERVAL = float(os.getenv("LIVE_TIME_INTERVAL", "10"))
+
 # Security
 security = HTTPBearer()
 
@@ -79,6 +113,9 @@ class GenerateQuestionsRequest(BaseModel):
     file_id: str
     ruleset_id: str
     topic: Optional[str] = None
+    topic_id: Optional[str] = None  # restrict the source text to this topic's pages
+    page_start: int = 1
+    page_end: Optional[int] = None
 
 class QuestionOption(BaseModel):
     text: str
@@ -112,6 +149,30 @@ class AnswerSubmission(BaseModel):
     question_id: str
     selected_answer: str
 
+class BankQuestion(BaseModel):
+    id: str
+    ruleset_id: str
+    question_text: str
+    options: List[Any]
+    answer: str
+    difficulty: Optional[str] = None
+    bloom_level: Optional[str] = None
+    topic: Optional[str] = None
+    created_at: datetime
+
+class QuizAssembleRequest(BaseModel):
+    ruleset_id: str
+    count: int = Field(..., ge=1, le=100)
+    difficulty: Optional[Dict[str, float]] = None  # weights, e.g. {"easy": 0.3, "medium": 0.5, "hard": 0.2}
+    bloom_level: Optional[Dict[str, float]] = None
+    topics: Optional[List[str]] = None
+    fill: bool = True  # top up quotas the bank cannot meet with other questions
+    time_limit: Optional[int] = None  # in minutes
+
+class AssembledQuiz(QuizResponse):
+    composition: List[Dict[str, Any]]
+    filled: int
+
 class QuizResult(BaseModel):
     quiz_id: str
     score: float
@@ -120,20 +181,23 @@ class QuizResult(BaseModel):
     time_taken: Optional[int] = None
     answers: List[Dict[str, Any]]
 
-# Dependency to get current user
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def authenticate(token: str):
     try:
-        token = credentials.credentials
-        user = supabase.auth.get_user(token)
+        with span("auth"):
+            user = await asyncio.to_thread(supabase.auth.get_user, token)
         if not user:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
         return user.user
     except Exception as e:
         raise HTTPException(status_code=401, detail=str(e))
 
+# Dependency to get current user
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await authenticate(credentials.credentials)
+
 # Helper functions
-def generate_questions_with_gemini(text: str, config: Dict[str, Any], previous_questions: List[str] = []) -> List[Dict]:
-    """Generate questions using Gemini API based on ruleset configuration."""
+def build_prompt(text: str, config: Dict[str, Any], previous_questions: List[str] = []) -> str:
+    """Question-generation prompt for the ruleset configuration."""
     
     num_questions = config.get("num_questions", 5)
     difficulty = config.get("hardness", "medium")
@@ -169,25 +233,41 @@ def generate_questions_with_gemini(text: str, config: Dict[str, Any], previous_q
     ]
     """
     
+    return system_message + "\n" + prompt
+
+async def fetch_relevant_passages(file_id: str, query: str, token: str) -> Optional[List[Dict[str, Any]]]:
+    """Ask the file service for the pages most relevant to a query; None if it is unavailable."""
     try:
-        response = model.generate_content(system_message + "\n" + prompt)
-        response_text = response.text.strip()
-        
-        # Clean up response
-        if response_text.startswith("```json"):
-            response_text = response_text[7:]
-        if response_text.startswith("```"):
-            response_text = response_text[3:]
-        if response_text.endswith("```"):
-            response_text = response_text[:-3]
-
-        print("Gemini Response:", response_text)
-        
-        questions = json.loads(response_text.strip())
-        return questions
-    except Exception as e:
-        print(f"Error generating questions: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to generate questions: {str(e)}")
+        response = await file_service_client.get(
+            f"/files/{file_id}/search",
+            params={"q": query, "k": RETRIEVAL_TOP_K},
+            headers={"Authorization": f"Bearer {token}", **outbound_headers()}
+        )
+        response.raise_for_status()
+        return response.json()
+    except httpx.HTTPError as e:
+        logger.warning("Passage retrieval failed, using the whole document: %s", e, extra={"file_id": file_id})
+        return None
+
+async def load_document_pages(file_row: Dict[str, Any], start: int = 1, end: Optional[int] = None) -> List[str]:
+    """Text of pages start..end of a file, served from the document cache when possible."""
+    file_id = file_row["id"]
+    version = str(file_row.get("updated_at"))
+    # Files still being extracted keep changing, so only completed ones are cached
+    cacheable = file_row.get("status") == "completed"
+    
+    if cacheable:
+        pages = document_cache.get_pages(file_id, version, start, end)
+        if pages is not None:
+            return pages
+    
+    with span("db.documents"):
+        rows = await questions_repo.get_pages(file_id, start, end)
+    
+    pages = {row["page_number"]: row["text"] or "" for row in rows}
+    if cacheable and pages:
+        document_cache.store(file_id, version, pages, complete=(start == 1 and end is None))
+    return [pages[n] for n in sorted(pages)]
 
 # Routes
 @app.post("/rulesets", response_model=RulesetResponse, status_code=status.HTTP_201_CREATED)
@@ -198,16 +278,9 @@ async def create_ruleset(ruleset: RulesetCreate, current_user = Depends(get_curr
     """
     try:
         ruleset_id = str(uuid.uuid4())
-        data = {
-            "id": ruleset_id,
-            "owner_id": current_user.id,
-            "name": ruleset.name,
-            "config": ruleset.config
-        }
-        
-        result = supabase.table("rulesets").insert(data).execute()
+        result = await questions_repo.create_ruleset(ruleset_id, current_user.id, ruleset.name, ruleset.config)
         
-        return RulesetResponse(**result.data[0])
+        return RulesetResponse(**result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -217,12 +290,12 @@ async def get_ruleset(ruleset_id: str, current_user = Depends(get_current_user))
     Get a specific ruleset by ID.
     """
     try:
-        result = supabase.table("rulesets").select("*").eq("id", ruleset_id).eq("owner_id", current_user.id).execute()
+        result = await questions_repo.get_ruleset(ruleset_id, current_user.id)
         
-        if not result.data:
+        if not result:
             raise HTTPException(status_code=404, detail="Ruleset not found")
             
-        return RulesetResponse(**result.data[0])
+        return RulesetResponse(**result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -232,42 +305,77 @@ async def list_rulesets(current_user = Depends(get_current_user)):
     List all rulesets for the current user.
     """
     try:
-        result = supabase.table("rulesets").select("*").eq("owner_id", current_user.id).execute()
-        return [RulesetResponse(**item) for item in result.data]
+        result = await questions_repo.list_rulesets(current_user.id)
+        return [RulesetResponse(**item) for item in result]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/generate", status_code=status.HTTP_201_CREATED)
-async def generate_questions(request: GenerateQuestionsRequest, current_user = Depends(get_current_user)):
+async def generate_questions(
+    request: GenerateQuestionsRequest,
+    current_user = Depends(get_current_user),
+    credentials: HTTPAuthorizationCredentials = Depends(security)
+):
     """
     Generate questions using AI based on file content and ruleset.
     """
     try:
         # Get file content
-        file_result = supabase.table("files").select("*").eq("id", request.file_id).eq("owner_id", current_user.id).execute()
-        if not file_result.data:
+        with span("db.files"):
+            file_row = await questions_repo.get_file(request.file_id, current_user.id)
+        if not file_row:
+            document_cache.invalidate(request.file_id)
             raise HTTPException(status_code=404, detail="File not found")
         
-        # Get document text
-        doc_result = supabase.table("documents").select("text").eq("file_id", request.file_id).execute()
-        if not doc_result.data:
-            raise HTTPException(status_code=404, detail="Document content not found")
+        # Resolve the topic to the page range it covers
+        topic_name = request.topic
+        page_start, page_end = request.page_start, request.page_end
+        if request.topic_id:
+            with span("db.topics"):
+                topic = await questions_repo.get_topic(request.topic_id, request.file_id)
+            if not topic:
+                raise HTTPException(status_code=404, detail="Topic not found")
+            topic_name = topic_name or topic["name"]
+            page_range = topic.get("page_range")
+            if page_range:
+                first_page, _, last_page = page_range.partition("-")
+                page_start, page_end = int(first_page), int(last_page or first_page)
         
-        text = doc_result.data[0]["text"]
+        # For a free-text topic, use only the passages relevant to it
+        passages = None
+        if request.topic and not request.topic_id:
+            with span("retrieval"):
+                passages = await fetch_relevant_passages(request.file_id, request.topic, credentials.credentials)
+        
+        if passages:
+            text = "\n".join(p["text"] for p in sorted(passages, key=lambda p: p["page_number"]))
+        else:
+            pages = await load_document_pages(file_row, page_start, page_end)
+            if not pages:
+                raise HTTPException(status_code=404, detail="Document content not found")
+            text = "\n".join(pages)
         
         # Get ruleset
-        ruleset_result = supabase.table("rulesets").select("*").eq("id", request.ruleset_id).execute()
-        if not ruleset_result.data:
+        with span("db.rulesets"):
+            ruleset = await questions_repo.get_ruleset(request.ruleset_id)
+        if not ruleset:
             raise HTTPException(status_code=404, detail="Ruleset not found")
         
-        config = ruleset_result.data[0]["config"]
+        config = ruleset["config"]
+        if topic_name:
+            config = {**config, "topic": topic_name}
         
         # Get previous questions to avoid duplicates
-        prev_questions_result = supabase.table("generated_questions").select("question_text").eq("ruleset_id", request.ruleset_id).limit(10).execute()
-        previous_questions = [q["question_text"] for q in prev_questions_result.data]
+        with span("db.previous_questions"):
+            previous_questions = await questions_repo.get_previous_questions(request.ruleset_id)
         
         # Generate questions
-        questions_data = generate_questions_with_gemini(text, config, previous_questions)
+        try:
+            questions_data, _ = await question_generator.generate(build_prompt(text, config, previous_questions))
+        except LLMDeadlineExceeded as e:
+            raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail=f"Failed to generate questions: {str(e)}")
+        except LLMError as e:
+            raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Failed to generate questions: {str(e)}")
         
         # Store generated questions
         generated_questions = []
@@ -282,14 +390,46 @@ async def generate_questions(request: GenerateQuestionsRequest, current_user = D
                 "answer": q_data["answer"],
                 "difficulty": q_data.get("difficulty", config.get("hardness", "medium")),
                 "bloom_level": q_data.get("bloom_level", "understand"),
-                "topic": request.topic
+                "topic": topic_name
             }
             
-            supabase.table("generated_questions").insert(question_record).execute()
-            
             generated_questions.append(question_record)
         
+        with span("db.insert_questions"):
+            await questions_repo.insert_questions(generated_questions)
+        
         return generated_questions
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/questions", response_model=List[BankQuestion])
+async def search_questions(
+    ruleset_id: Optional[uuid.UUID] = None,
+    topic: Optional[List[str]] = Query(None),
+    difficulty: Optional[List[str]] = Query(None),
+    bloom_level: Optional[List[str]] = Query(None),
+    q: Optional[str] = Query(None, description="Full-text search on the question text"),
+    limit: int = Query(50, ge=1, le=200),
+    offset: int = Query(0, ge=0),
+    current_user = Depends(get_current_user)
+):
+    """
+    Search the question bank of the current user's rulesets. Repeat a filter
+    to match any of its values. Text matches are ranked by relevance, other
+    results are newest first.
+    """
+    try:
+        filters = {
+            "ruleset_id": str(ruleset_id) if ruleset_id else None,
+            "topic": topic,
+            "difficulty": difficulty,
+            "bloom_level": bloom_level,
+        }
+        with span("db.search_questions"):
+            rows = await questions_repo.search_questions(current_user.id, filters, (q or "").strip() or None, limit, offset)
+        return [BankQuestion(**row) for row in rows]
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -302,8 +442,8 @@ async def create_quiz(quiz: QuizCreate, current_user = Depends(get_current_user)
         quiz_id = str(uuid.uuid4())
         
         # Get ruleset for grading style
-        ruleset_result = supabase.table("rulesets").select("config").eq("id", quiz.ruleset_id).execute()
-        grading_style = ruleset_result.data[0]["config"].get("grading_style", "end_only")
+        ruleset = await questions_repo.get_ruleset(quiz.ruleset_id)
+        grading_style = ruleset["config"].get("grading_style", "end_only")
         
         data = {
             "quiz_id": quiz_id,
@@ -312,12 +452,74 @@ async def create_quiz(quiz: QuizCreate, current_user = Depends(get_current_user)
             "timed": quiz.time_limit is not None,
             "time_limit": quiz.time_limit,
             "grading_style": grading_style,
-            "status": "created"
+            "status": "created",
+            "ruleset_id": quiz.ruleset_id
         }
         
-        result = supabase.table("quizzes").insert(data).execute()
+        result = await questions_repo.create_quiz(data)
+        
+        return QuizResponse(**result)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/quizzes/assemble", response_model=AssembledQuiz, status_code=status.HTTP_201_CREATED)
+async def assemble_quiz(request: QuizAssembleRequest, current_user = Depends(get_current_user)):
+    """
+    Create a quiz of randomly chosen questions from a ruleset's bank that
+    follows the requested difficulty and Bloom level distributions.
+    """
+    try:
+        try:
+            quotas = allocate(request.count, request.difficulty, request.bloom_level)
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        
+        with span("db.rulesets"):
+            ruleset = await questions_repo.get_ruleset(request.ruleset_id)
+        if not ruleset:
+            raise HTTPException(status_code=404, detail="Ruleset not found")
+        
+        with span("db.sample_questions"):
+            sampled = await questions_repo.sample_questions(
+                request.ruleset_id, quotas, request.topics, request.fill, request.count
+            )
+        if len(sampled) < request.count:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Only {len(sampled)} of {request.count} questions could be chosen"
+                       + ("" if request.fill else " within the requested distribution")
+            )
+        
+        composition = []
+        for quota_difficulty, quota_bloom, n in quotas:
+            selected = sum(
+                1 for q in sampled if q["in_quota"]
+                and quota_difficulty in (None, q["difficulty"]) and quota_bloom in (None, q["bloom_level"])
+            )
+            composition.append({"difficulty": quota_difficulty, "bloom_level": quota_bloom, "requested": n, "selected": selected})
+        
+        question_ids = [q["id"] for q in sampled]
+        random.shuffle(question_ids)
+        data = {
+            "quiz_id": str(uuid.uuid4()),
+            "owner_id": current_user.id,
+            "question_ids": question_ids,
+            "timed": request.time_limit is not None,
+            "time_limit": request.time_limit,
+            "grading_style": ruleset["config"].get("grading_style", "end_only"),
+            "status": "created",
+            "ruleset_id": request.ruleset_id
+        }
+        with span("db.create_quiz"):
+            result = await questions_repo.create_quiz(data)
         
-        return QuizResponse(**result.data[0])
+        return AssembledQuiz(
+            **result,
+            composition=composition,
+            filled=sum(1 for q in sampled if not q["in_quota"])
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -327,17 +529,14 @@ async def start_quiz(quiz_id: str, current_user = Depends(get_current_user)):
     Start a quiz session.
     """
     try:
-        start_time = datetime.now()
+        start_time = datetime.now(timezone.utc)
         
-        result = supabase.table("quizzes").update({
-            "start_time": start_time.isoformat(),
-            "status": "in_progress"
-        }).eq("quiz_id", quiz_id).eq("owner_id", current_user.id).execute()
+        result = await questions_repo.start_quiz(quiz_id, current_user.id, start_time)
         
-        if not result.data:
+        if not result:
             raise HTTPException(status_code=404, detail="Quiz not found")
             
-        return QuizResponse(**result.data[0])
+        return QuizResponse(**result)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -348,17 +547,68 @@ async def submit_answer(quiz_id: str, answer: AnswerSubmission, current_user = D
     """
     try:
         # Store answer
-        supabase.table("quiz_answers").insert({
-            "quiz_id": quiz_id,
-            "question_id": answer.question_id,
-            "selected_answer": answer.selected_answer,
-            "answered_at": datetime.now().isoformat()
-        }).execute()
+        await questions_repo.insert_answer(
+            quiz_id, answer.question_id, answer.selected_answer, datetime.now(timezone.utc)
+        )
         
         return {"message": "Answer submitted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def grade_quiz(quiz_data: Dict[str, Any], correct_answers_map: Optional[Dict[str, str]] = None) -> QuizResult:
+    """Score a quiz from its stored answers and mark it completed."""
+    quiz_id = str(quiz_data["quiz_id"])
+    
+    # Get all answers
+    with span("db.quiz_answers"):
+        answers = await questions_repo.get_answers(quiz_id)
+    
+    # Get correct answers
+    if correct_answers_map is None:
+        with span("db.questions"):
+            questions = await questions_repo.get_questions(quiz_data["question_ids"])
+        correct_answers_map = {q["id"]: q["answer"] for q in questions}
+    
+    # Calculate score
+    correct_count = 0
+    answer_details = []
+    
+    for answer in answers:
+        is_correct = answer["selected_answer"] == correct_answers_map.get(answer["question_id"])
+        if is_correct:
+            correct_count += 1
+        
+        answer_details.append({
+            "question_id": answer["question_id"],
+            "selected_answer": answer["selected_answer"],
+            "correct_answer": correct_answers_map.get(answer["question_id"]),
+            "is_correct": is_correct
+        })
+    
+    total_questions = len(quiz_data["question_ids"])
+    score = (correct_count / total_questions * 100) if total_questions > 0 else 0
+    
+    # Calculate time taken
+    time_taken = None
+    if quiz_data.get("start_time"):
+        start_time = quiz_data["start_time"]
+        if start_time.tzinfo is None:
+            start_time = start_time.replace(tzinfo=timezone.utc)
+        now = datetime.now(timezone.utc)
+        time_taken = int((now - start_time).total_seconds() / 60)
+    # Update quiz status
+    with span("db.update_quiz"):
+        await questions_repo.finish_quiz(quiz_id, datetime.now(timezone.utc), score)
+    
+    return QuizResult(
+        quiz_id=quiz_id,
+        score=score,
+        total_questions=total_questions,
+        correct_answers=correct_count,
+        time_taken=time_taken,
+        answers=answer_details
+    )
+
 @app.post("/quizzes/{quiz_id}/finish", response_model=QuizResult)
 async def finish_quiz(quiz_id: str, current_user = Depends(get_current_user)):
     """
@@ -366,64 +616,85 @@ async def finish_quiz(quiz_id: str, current_user = Depends(get_current_user)):
     """
     try:
         # Get quiz details
-        quiz_result = supabase.table("quizzes").select("*").eq("quiz_id", quiz_id).eq("owner_id", current_user.id).execute()
-        if not quiz_result.data:
+        with span("db.quizzes"):
+            quiz_data = await questions_repo.get_quiz(quiz_id, current_user.id)
+        if not quiz_data:
             raise HTTPException(status_code=404, detail="Quiz not found")
         
-        quiz_data = quiz_result.data[0]
-        
-        # Get all answers
-        answers_result = supabase.table("quiz_answers").select("*").eq("quiz_id", quiz_id).execute()
-        
-        # Get correct answers
-        questions_result = supabase.table("generated_questions").select("*").in_("id", quiz_data["question_ids"]).execute()
-        correct_answers_map = {q["id"]: q["answer"] for q in questions_result.data}
-        
-        # Calculate score
-        correct_count = 0
-        answer_details = []
-        
-        for answer in answers_result.data:
-            is_correct = answer["selected_answer"] == correct_answers_map.get(answer["question_id"])
-            if is_correct:
-                correct_count += 1
-            
-            answer_details.append({
-                "question_id": answer["question_id"],
-                "selected_answer": answer["selected_answer"],
-                "correct_answer": correct_answers_map.get(answer["question_id"]),
-                "is_correct": is_correct
-            })
-        
-        total_questions = len(quiz_data["question_ids"])
-        score = (correct_count / total_questions * 100) if total_questions > 0 else 0
-        
-        # Calculate time taken
-        time_taken = None
-        if quiz_data.get("start_time"):
-            start_time = datetime.fromisoformat(quiz_data["start_time"])
-            if start_time.tzinfo is None:
-                start_time = start_time.replace(tzinfo=timezone.utc)
-            now = datetime.now(timezone.utc)
-            time_taken = int((now - start_time).total_seconds() / 60)
-        # Update quiz status
-        supabase.table("quizzes").update({
-            "end_time": datetime.now(timezone.utc).isoformat(),
-            "status": "completed",
-            "score": score
-        }).eq("quiz_id", quiz_id).execute()
-        
-        return QuizResult(
-            quiz_id=quiz_id,
-            score=score,
-            total_questions=total_questions,
-            correct_answers=correct_count,
-            time_taken=time_taken,
-            answers=answer_details
-        )
+        return await grade_quiz(quiz_data)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.websocket("/quizzes/{quiz_id}/live")
+async def live_quiz(websocket: WebSocket, quiz_id: str):
+    """
+    Take a quiz over one connection: authenticate once, then start, answer
+    and finish with JSON frames (see live_quiz.py for the protocol).
+    """
+    await websocket.accept()
+    session = LiveQuizSession(
+        websocket, questions_repo, quiz_id, authenticate, grade_quiz, LIVE_AUTH_TIMEOUT, LIVE_TIME_INTERVAL
+    )
+    await session.run(websocket.headers.get("authorization"))
+
+@app.get("/quizzes/export")
+async def export_results(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    level: str = Query("answers", pattern="^(answers|quizzes)$"),
+    ruleset_id: Optional[uuid.UUID] = None,
+    owner_id: Optional[uuid.UUID] = None,
+    since: Optional[datetime] = Query(None, description="Quizzes created at or after this time"),
+    until: Optional[datetime] = Query(None, description="Quizzes created before this time"),
+    quiz_status: Optional[str] = Query(None, alias="status"),
+    current_user = Depends(get_current_user)
+):
+    """
+    Stream the results of the quizzes on the caller's rulesets (and the
+    caller's own quizzes), one row per answer or per quiz, as CSV or NDJSON.
+    """
+    def utc(value: Optional[datetime]) -> Optional[datetime]:
+        return value.replace(tzinfo=timezone.utc) if value is not None and value.tzinfo is None else value
+
+    filters = {
+        "ruleset_id": str(ruleset_id) if ruleset_id else None,
+        "owner_id": str(owner_id) if owner_id else None,
+        "since": utc(since),
+        "until": utc(until),
+        "status": quiz_status,
+    }
+    return StreamingResponse(
+        stream_export(questions_repo, current_user.id, filters, level, format, EXPORT_PAGE_SIZE),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="quiz-{level}.{format}"'}
+    )
+
+@app.get("/cache/metrics")
+async def cache_metrics():
+    """
+    Document cache size and hit rate since startup.
+    """
+    return document_cache.stats()
+
+@app.get("/llm/metrics")
+async def llm_metrics():
+    """
+    Question-generation call, retry, hedge and fallback counts since startup.
+    """
+    return question_generator.stats()
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "question-service"}
+
+@on_startup(app)
+async def startup_event():
+    global supabase, file_service_client
+    file_service_client = httpx.AsyncClient(base_url=FILE_SERVICE_URL, timeout=10.0)
+    # Import the Supabase client in a thread while the pool connects
+    supabase, _ = await asyncio.gather(asyncio.to_thread(create_supabase_client), db.connect())
+
+@on_shutdown(app)
+async def shutdown_event():
+    await file_service_client.aclose()
+    question_generator.backend.close()
+    await db.close()
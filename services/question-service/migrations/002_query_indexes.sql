@@ -0,0 +1,17 @@
+-- Generation reads the most recent questions of a ruleset
+CREATE INDEX IF NOT EXISTS idx_generated_questions_ruleset_created ON generated_questions(ruleset_id, created_at DESC);
+DROP INDEX IF EXISTS idx_generated_questions_ruleset_id;
+
+-- One answer per question and quiz (a resubmission replaces the answer).
+-- Keep the latest of any existing duplicates so grading counts each question once.
+DELETE FROM quiz_answers WHERE id IN (
+    SELECT id FROM (
+        SELECT id, row_number() OVER (
+            PARTITION BY quiz_id, question_id ORDER BY answered_at DESC NULLS LAST, id
+        ) AS rn
+        FROM quiz_answers
+    ) ranked
+    WHERE rn > 1
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_quiz_answers_quiz_question ON quiz_answers(quiz_id, question_id);
+DROP INDEX IF EXISTS idx_quiz_answers_quiz_id;
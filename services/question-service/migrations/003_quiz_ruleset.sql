@@ -0,0 +1,11 @@
+-- Quizzes record the ruleset they were created from, so results can be
+-- exported per ruleset. Existing quizzes take the ruleset of their first question.
+ALTER TABLE quizzes ADD COLUMN IF NOT EXISTS ruleset_id UUID REFERENCES rulesets(id) ON DELETE SET NULL;
+UPDATE quizzes q SET ruleset_id = g.ruleset_id
+FROM generated_questions g
+WHERE q.ruleset_id IS NULL AND g.id = q.question_ids[1];
+
+-- Exports page through a ruleset's (or an owner's) quizzes in creation order
+CREATE INDEX IF NOT EXISTS idx_quizzes_ruleset_created ON quizzes(ruleset_id, created_at, quiz_id);
+CREATE INDEX IF NOT EXISTS idx_quizzes_owner_created ON quizzes(owner_id, created_at, quiz_id);
+DROP INDEX IF EXISTS idx_quizzes_owner_id;
@@ -0,0 +1,8 @@
+-- Question bank search: structured filters within a ruleset, and full-text
+-- search on the question text (the expression must match the repository's)
+CREATE INDEX IF NOT EXISTS idx_generated_questions_ruleset_levels
+    ON generated_questions(ruleset_id, difficulty, bloom_level);
+CREATE INDEX IF NOT EXISTS idx_generated_questions_ruleset_topic
+    ON generated_questions(ruleset_id, topic);
+CREATE INDEX IF NOT EXISTS idx_generated_questions_text_search
+    ON generated_questions USING GIN (to_tsvector('english', question_text));
@@ -0,0 +1,43 @@
+"""
+Quotas for assembling a quiz from the question bank.
+
+A quiz of ``count`` questions is requested with an optional distribution
+over difficulty and one over Bloom level (weights, e.g. ``{"easy": 2,
+"hard": 1}``). The two are treated as independent: each (difficulty, Bloom
+level) cell gets ``count * p(difficulty) * p(bloom)`` questions, rounded by
+largest remainder so the quotas add up to ``count``. A missing distribution
+leaves that dimension unconstrained (``None`` in the quota).
+"""
+from itertools import product
+from typing import Dict, List, Optional, Tuple
+
+Quota = Tuple[Optional[str], Optional[str], int]
+
+
+def _shares(distribution: Optional[Dict[str, float]]) -> Dict[Optional[str], float]:
+    if not distribution:
+        return {None: 1.0}
+    if any(weight < 0 for weight in distribution.values()):
+        raise ValueError("Distribution weights must not be negative")
+    total = sum(distribution.values())
+    if total <= 0:
+        raise ValueError("Distribution weights must add up to more than 0")
+    return {key: weight / total for key, weight in distribution.items() if weight > 0}
+
+
+def allocate(
+    count: int,
+    difficulty: Optional[Dict[str, float]] = None,
+    bloom_level: Optional[Dict[str, float]] = None,
+) -> List[Quota]:
+    """(difficulty, bloom_level, n) quotas adding up to ``count``; raises ValueError."""
+    cells = [
+        (d, b, count * pd * pb)
+        for (d, pd), (b, pb) in product(_shares(difficulty).items(), _shares(bloom_level).items())
+    ]
+    floors = [int(exact) for _, _, exact in cells]
+    # Hand the remaining questions to the cells that lost the most to rounding down
+    by_remainder = sorted(range(len(cells)), key=lambda i: cells[i][2] - floors[i], reverse=True)
+    for i in by_remainder[:count - sum(floors)]:
+        floors[i] += 1
+    return [(d, b, n) for (d, b, _), n in zip(cells, floors) if n > 0]
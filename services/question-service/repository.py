@@ -0,0 +1,245 @@
+"""
+Data access for the question-service tables (rulesets, generated_questions,
+quizzes, quiz_answers) and the file-service tables it reads.
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from common.db import Database
+
+INSERT_RULESET = "INSERT INTO rulesets (id, owner_id, name, config) VALUES ($1, $2, $3, $4) RETURNING *"
+GET_RULESET = "SELECT * FROM rulesets WHERE id = $1"
+GET_OWNED_RULESET = "SELECT * FROM rulesets WHERE id = $1 AND owner_id = $2"
+LIST_RULESETS = "SELECT * FROM rulesets WHERE owner_id = $1"
+
+GET_FILE = "SELECT * FROM files WHERE id = $1 AND owner_id = $2"
+GET_PAGES = """
+    SELECT page_number, text FROM documents
+    WHERE file_id = $1 AND page_number >= $2 AND ($3::int IS NULL OR page_number <= $3)
+    ORDER BY page_number
+"""
+GET_TOPIC = """
+    SELECT t.name, t.page_range
+    FROM topics t JOIN documents d ON d.doc_id = t.doc_id
+    WHERE t.topic_id = $1 AND d.file_id = $2
+"""
+
+GET_PREVIOUS_QUESTIONS = """
+    SELECT question_text FROM generated_questions
+    WHERE ruleset_id = $1
+    ORDER BY created_at DESC
+    LIMIT $2
+"""
+GET_QUESTIONS = "SELECT * FROM generated_questions WHERE id = ANY($1::uuid[])"
+INSERT_QUESTION = """
+    INSERT INTO generated_questions (id, ruleset_id, question_text, options, answer, difficulty, bloom_level, topic)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+"""
+
+# Question bank: questions of the caller's rulesets. Text search has its own
+# statement so its plan can use the GIN index on the tsvector expression.
+_BANK_COLUMNS = """
+    SELECT g.id, g.ruleset_id, g.question_text, g.options, g.answer, g.difficulty, g.bloom_level, g.topic, g.created_at
+    FROM generated_questions g
+    WHERE g.ruleset_id = ANY(ARRAY(SELECT id FROM rulesets WHERE owner_id = $1 AND ($2::uuid IS NULL OR id = $2)))
+      AND ($3::text[] IS NULL OR g.topic = ANY($3))
+      AND ($4::text[] IS NULL OR g.difficulty = ANY($4))
+      AND ($5::text[] IS NULL OR g.bloom_level = ANY($5))
+"""
+SEARCH_QUESTIONS = _BANK_COLUMNS + """
+    ORDER BY g.created_at DESC, g.id
+    LIMIT $6 OFFSET $7
+"""
+SEARCH_QUESTIONS_TEXT = _BANK_COLUMNS + """
+      AND to_tsvector('english', g.question_text) @@ websearch_to_tsquery('english', $8)
+    ORDER BY ts_rank(to_tsvector('english', g.question_text), websearch_to_tsquery('english', $8)) DESC,
+             g.created_at DESC, g.id
+    LIMIT $6 OFFSET $7
+"""
+# Random questions of a ruleset meeting per-(difficulty, bloom_level) quotas;
+# a quota's NULL difficulty/bloom_level matches any ($6/$7: no quota splits by
+# it). With $8, shortfalls are filled with other questions, up to $9 in total.
+SAMPLE_QUESTIONS = """
+    WITH quota AS (
+        SELECT * FROM unnest($2::text[], $3::text[], $4::int[]) AS t(difficulty, bloom_level, n)
+    ), pool AS (
+        SELECT id, difficulty, bloom_level FROM generated_questions
+        WHERE ruleset_id = $1 AND ($5::text[] IS NULL OR topic = ANY($5))
+    ), ranked AS (
+        SELECT p.*, row_number() OVER (
+            PARTITION BY CASE WHEN $6::bool THEN NULL ELSE p.difficulty END,
+                         CASE WHEN $7::bool THEN NULL ELSE p.bloom_level END
+            ORDER BY random()
+        ) AS rn
+        FROM pool p
+    ), chosen AS (
+        SELECT r.id, r.difficulty, r.bloom_level FROM ranked r JOIN quota q
+          ON (q.difficulty IS NULL OR q.difficulty = r.difficulty)
+         AND (q.bloom_level IS NULL OR q.bloom_level = r.bloom_level)
+        WHERE r.rn <= q.n
+    )
+    SELECT id, difficulty, bloom_level, TRUE AS in_quota FROM chosen
+    UNION ALL
+    (SELECT id, difficulty, bloom_level, FALSE FROM pool
+     WHERE $8::bool AND id NOT IN (SELECT id FROM chosen)
+     ORDER BY random()
+     LIMIT greatest($9::int - (SELECT count(*) FROM chosen), 0))
+"""
+
+INSERT_QUIZ = """
+    INSERT INTO quizzes (quiz_id, owner_id, question_ids, timed, time_limit, grading_style, status, ruleset_id)
+    VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
+    RETURNING *
+"""
+GET_QUIZ = "SELECT * FROM quizzes WHERE quiz_id = $1 AND owner_id = $2"
+START_QUIZ = """
+    UPDATE quizzes SET start_time = $3, status = 'in_progress'
+    WHERE quiz_id = $1 AND owner_id = $2
+    RETURNING *
+"""
+FINISH_QUIZ = "UPDATE quizzes SET end_time = $2, status = 'completed', score = $3 WHERE quiz_id = $1"
+# A resubmitted answer replaces the previous one
+INSERT_ANSWER = """
+    INSERT INTO quiz_answers (quiz_id, question_id, selected_answer, answered_at) VALUES ($1, $2, $3, $4)
+    ON CONFLICT (quiz_id, question_id) DO UPDATE
+    SET selected_answer = EXCLUDED.selected_answer, answered_at = EXCLUDED.answered_at
+"""
+GET_ANSWERS = "SELECT * FROM quiz_answers WHERE quiz_id = $1"
+
+# Result export: quizzes of the caller's rulesets or of the caller, in
+# (created_at, quiz_id) order, one page after the given key at a time
+EXPORT_QUIZZES = """
+    SELECT q.quiz_id, q.owner_id, q.ruleset_id, r.name AS ruleset_name, q.status, q.score,
+           cardinality(q.question_ids) AS total_questions, q.start_time, q.end_time, q.created_at
+    FROM quizzes q LEFT JOIN rulesets r ON r.id = q.ruleset_id
+    WHERE (q.ruleset_id = ANY(ARRAY(SELECT id FROM rulesets WHERE owner_id = $1)) OR q.owner_id = $1)
+      AND ($2::uuid IS NULL OR q.ruleset_id = $2)
+      AND ($3::uuid IS NULL OR q.owner_id = $3)
+      AND ($4::timestamptz IS NULL OR q.created_at >= $4)
+      AND ($5::timestamptz IS NULL OR q.created_at < $5)
+      AND ($6::text IS NULL OR q.status = $6)
+      AND ($7::timestamptz IS NULL OR (q.created_at, q.quiz_id) > ($7, $8::uuid))
+    ORDER BY q.created_at, q.quiz_id
+    LIMIT $9
+"""
+EXPORT_ANSWERS = """
+    SELECT a.quiz_id, a.question_id, g.question_text, g.topic, g.difficulty, g.bloom_level,
+           a.selected_answer, g.answer AS correct_answer, a.selected_answer = g.answer AS is_correct, a.answered_at
+    FROM quiz_answers a LEFT JOIN generated_questions g ON g.id = a.question_id
+    WHERE a.quiz_id = ANY($1::uuid[])
+    ORDER BY a.quiz_id, a.answered_at
+"""
+EXPORT_ANSWER_COUNTS = """
+    SELECT a.quiz_id, count(*) AS answered, count(*) FILTER (WHERE a.selected_answer = g.answer) AS correct
+    FROM quiz_answers a LEFT JOIN generated_questions g ON g.id = a.question_id
+    WHERE a.quiz_id = ANY($1::uuid[])
+    GROUP BY a.quiz_id
+"""
+
+
+class QuestionRepository:
+    def __init__(self, db: Database):
+        self.db = db
+
+    # rulesets
+    async def create_ruleset(self, ruleset_id: str, owner_id: str, name: str, config: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.db.fetchrow(INSERT_RULESET, ruleset_id, owner_id, name, config)
+
+    async def get_ruleset(self, ruleset_id: str, owner_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        if owner_id is None:
+            return await self.db.fetchrow(GET_RULESET, ruleset_id)
+        return await self.db.fetchrow(GET_OWNED_RULESET, ruleset_id, owner_id)
+
+    async def list_rulesets(self, owner_id: str) -> List[Dict[str, Any]]:
+        return await self.db.fetch(LIST_RULESETS, owner_id)
+
+    # source documents
+    async def get_file(self, file_id: str, owner_id: str) -> Optional[Dict[str, Any]]:
+        return await self.db.fetchrow(GET_FILE, file_id, owner_id)
+
+    async def get_pages(self, file_id: str, start: int = 1, end: Optional[int] = None) -> List[Dict[str, Any]]:
+        return await self.db.fetch(GET_PAGES, file_id, start, end)
+
+    async def get_topic(self, topic_id: str, file_id: str) -> Optional[Dict[str, Any]]:
+        return await self.db.fetchrow(GET_TOPIC, topic_id, file_id)
+
+    # questions
+    async def get_previous_questions(self, ruleset_id: str, limit: int = 10) -> List[str]:
+        return [row["question_text"] for row in await self.db.fetch(GET_PREVIOUS_QUESTIONS, ruleset_id, limit)]
+
+    async def get_questions(self, question_ids: List[str]) -> List[Dict[str, Any]]:
+        return await self.db.fetch(GET_QUESTIONS, question_ids)
+
+    async def insert_questions(self, records: List[Dict[str, Any]]):
+        await self.db.executemany(INSERT_QUESTION, [
+            (r["id"], r["ruleset_id"], r["question_text"], r["options"], r["answer"],
+             r["difficulty"], r["bloom_level"], r["topic"])
+            for r in records
+        ])
+
+    async def search_questions(
+        self, owner_id: str, filters: Dict[str, Any], text: Optional[str], limit: int, offset: int
+    ) -> List[Dict[str, Any]]:
+        args = [owner_id, filters.get("ruleset_id"), filters.get("topic"), filters.get("difficulty"),
+                filters.get("bloom_level"), limit, offset]
+        if text:
+            return await self.db.fetch(SEARCH_QUESTIONS_TEXT, *args, text)
+        return await self.db.fetch(SEARCH_QUESTIONS, *args)
+
+    async def sample_questions(
+        self,
+        ruleset_id: str,
+        quotas: List[Tuple[Optional[str], Optional[str], int]],
+        topics: Optional[List[str]],
+        fill: bool,
+        total: int,
+    ) -> List[Dict[str, Any]]:
+        """Sampled questions (id, difficulty, bloom_level, in_quota); see SAMPLE_QUESTIONS."""
+        difficulties, blooms, counts = (list(column) for column in zip(*quotas))
+        any_difficulty = all(d is None for d in difficulties)
+        any_bloom = all(b is None for b in blooms)
+        return await self.db.fetch(
+            SAMPLE_QUESTIONS, ruleset_id, difficulties, blooms, counts, topics, any_difficulty, any_bloom, fill, total
+        )
+
+    # quizzes
+    async def create_quiz(self, quiz: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.db.fetchrow(
+            INSERT_QUIZ, quiz["quiz_id"], quiz["owner_id"], quiz["question_ids"], quiz["timed"],
+            quiz["time_limit"], quiz["grading_style"], quiz["status"], quiz.get("ruleset_id")
+        )
+
+    async def get_quiz(self, quiz_id: str, owner_id: str) -> Optional[Dict[str, Any]]:
+        return await self.db.fetchrow(GET_QUIZ, quiz_id, owner_id)
+
+    async def start_quiz(self, quiz_id: str, owner_id: str, start_time: datetime) -> Optional[Dict[str, Any]]:
+        return await self.db.fetchrow(START_QUIZ, quiz_id, owner_id, start_time)
+
+    async def finish_quiz(self, quiz_id: str, end_time: datetime, score: float):
+        await self.db.execute(FINISH_QUIZ, quiz_id, end_time, score)
+
+    async def insert_answer(self, quiz_id: str, question_id: str, selected_answer: str, answered_at: datetime):
+        await self.db.execute(INSERT_ANSWER, quiz_id, question_id, selected_answer, answered_at)
+
+    async def get_answers(self, quiz_id: str) -> List[Dict[str, Any]]:
+        return await self.db.fetch(GET_ANSWERS, quiz_id)
+
+    # result export
+    async def export_quizzes(
+        self,
+        caller_id: str,
+        filters: Dict[str, Any],
+        after: Optional[Tuple[datetime, str]],
+        limit: int,
+    ) -> List[Dict[str, Any]]:
+        created_after, quiz_after = after or (None, None)
+        return await self.db.fetch(
+            EXPORT_QUIZZES, caller_id, filters.get("ruleset_id"), filters.get("owner_id"),
+            filters.get("since"), filters.get("until"), filters.get("status"), created_after, quiz_after, limit
+        )
+
+    async def export_answers(self, quiz_ids: List[str]) -> List[Dict[str, Any]]:
+        return await self.db.fetch(EXPORT_ANSWERS, quiz_ids)
+
+    async def export_answer_counts(self, quiz_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        return {row["quiz_id"]: row for row in await self.db.fetch(EXPORT_ANSWER_COUNTS, quiz_ids)}
@@ -0,0 +1,100 @@
+from doc_cache import DocumentCache
+
+
+def pages(*numbers: int, size: int = 10):
+    return {n: str(n) * size for n in numbers}
+
+
+def test_a_stored_range_is_a_hit():
+    cache = DocumentCache(max_bytes=1000)
+    cache.store("a", "v1", pages(1, 2, 3))
+    assert cache.get_pages("a", "v1", 1, 3) == ["1" * 10, "2" * 10, "3" * 10]
+    assert cache.stats()["hits"] == 1
+
+
+def test_a_new_version_drops_the_stale_entry():
+    cache = DocumentCache(max_bytes=1000)
+    cache.store("a", "v1", pages(1, 2), complete=True)
+    assert cache.get_pages("a", "v2") is None
+    assert cache.size == 0
+    assert cache.stats()["entries"] == 0
+    # and the old version is gone for good
+    assert cache.get_pages("a", "v1") is None
+
+
+def test_storing_a_new_version_replaces_the_old_pages():
+    cache = DocumentCache(max_bytes=1000)
+    cache.store("a", "v1", {1: "old"})
+    cache.store("a", "v2", {1: "new text"})
+    assert cache.get_pages("a", "v2", 1, 1) == ["new text"]
+    assert cache.size == len("new text")
+
+
+def test_eviction_keeps_the_total_within_the_byte_budget():
+    cache = DocumentCache(max_bytes=50)
+    cache.store("a", "v1", pages(1, 2))  # 20
+    cache.store("b", "v1", pages(1, 2))  # 40
+    cache.store("c", "v1", pages(1, 2))  # 60: evicts a
+    assert cache.size == 40
+    assert cache.evictions == 1
+    assert cache.get_pages("a", "v1", 1, 2) is None
+    assert cache.get_pages("b", "v1", 1, 2) is not None
+    assert cache.get_pages("c", "v1", 1, 2) is not None
+
+
+def test_eviction_takes_the_least_recently_used_entry():
+    cache = DocumentCache(max_bytes=50)
+    cache.store("a", "v1", pages(1, 2))
+    cache.store("b", "v1", pages(1, 2))
+    assert cache.get_pages("a", "v1", 1, 2) is not None  # a is now the most recent
+    cache.store("c", "v1", pages(1, 2))
+    assert cache.get_pages("b", "v1", 1, 2) is None
+    assert cache.get_pages("a", "v1", 1, 2) is not None
+
+
+def test_an_entry_over_the_budget_is_not_kept():
+    cache = DocumentCache(max_bytes=15)
+    cache.store("a", "v1", pages(1, 2))
+    assert cache.size == 0
+    assert cache.get_pages("a", "v1", 1, 2) is None
+
+
+def test_a_range_inside_the_cached_pages_is_a_hit():
+    cache = DocumentCache(max_bytes=1000)
+    cache.store("a", "v1", pages(3, 4, 5, 6))
+    assert cache.get_pages("a", "v1", 4, 5) == ["4" * 10, "5" * 10]
+
+
+def test_a_range_with_a_missing_page_is_a_miss():
+    cache = DocumentCache(max_bytes=1000)
+    cache.store("a", "v1", pages(3, 4, 6))
+    assert cache.get_pages("a", "v1", 3, 6) is None
+    assert cache.get_pages("a", "v1", 2, 3) is None
+    assert cache.stats()["misses"] == 2
+
+
+def test_ranges_stored_separately_combine():
+    cache = DocumentCache(max_bytes=1000)
+    cache.store("a", "v1", pages(1, 2))
+    cache.store("a", "v1", pages(3, 4))
+    assert cache.get_pages("a", "v1", 2, 3) == ["2" * 10, "3" * 10]
+    assert cache.size == 40
+
+
+def test_an_open_range_needs_the_whole_document():
+    cache = DocumentCache(max_bytes=1000)
+    cache.store("a", "v1", pages(1, 2, 3))
+    assert cache.get_pages("a", "v1", 2) is None
+    cache.store("a", "v1", {}, complete=True)
+    assert cache.get_pages("a", "v1", 2) == ["2" * 10, "3" * 10]
+    # a complete document answers ranges past its last page with what it has
+    assert cache.get_pages("a", "v1", 3, 10) == ["3" * 10]
+
+
+def test_invalidate_frees_the_entry():
+    cache = DocumentCache(max_bytes=1000)
+    cache.store("a", "v1", pages(1, 2))
+    cache.invalidate("a")
+    cache.invalidate("missing")
+    assert cache.size == 0
+    assert cache.get_pages("a", "v1", 1, 2) is None
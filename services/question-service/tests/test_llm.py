@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+import pytest
+
+from llm import GeminiBackend, LLMError, QuestionGenerator, parse_questions
+
+QUESTIONS = '[{"question": "2 + 2?", "options": ["3", "4"], "answer": "4"}]'
+
+
+def test_parse_questions_accepts_a_question_list():
+    assert parse_questions(QUESTIONS)[0]["answer"] == "4"
+
+
+def test_parse_questions_strips_a_code_block():
+    assert len(parse_questions(f"```json\n{QUESTIONS}\n```")) == 1
+
+
+@pytest.mark.parametrize("text", [
+    "not json",
+    "[]",
+    '{"question": "2 + 2?"}',
+    '[{"question": "2 + 2?", "options": ["4"]}]',
+    '[{"question": "2 + 2?", "options": "4", "answer": "4"}]',
+])
+def test_parse_questions_rejects_malformed_replies_as_retryable(text):
+    with pytest.raises(LLMError) as raised:
+        parse_questions(text)
+    assert raised.value.retryable
+
+
+class SlowBackend(GeminiBackend):
+    """Blocks like the synchronous SDK does, without calling it."""
+
+    def __init__(self, delay: float, max_threads: int):
+        super().__init__("key", max_threads=max_threads)
+        self.delay = delay
+        self.started = 0
+
+    def _generate(self, model: str, prompt: str, timeout: float) -> str:
+        self.started += 1
+        time.sleep(self.delay)
+        return QUESTIONS
+
+
+def test_abandoned_calls_stay_on_the_backends_own_threads():
+    backend = SlowBackend(0.5, max_threads=2)
+    generator = QuestionGenerator(backend, ["model"], timeout=0.1, deadline=0.35, backoff=0.01)
+
+    async def run():
+        with pytest.raises(LLMError):
+            await generator.generate("prompt")
+        # The default executor is not held up by the abandoned SDK calls
+        started = time.perf_counter()
+        await asyncio.to_thread(lambda: None)
+        return time.perf_counter() - started
+
+    try:
+        assert asyncio.run(run()) < 0.1
+        # Timed-out calls queued behind the two busy threads never ran
+        assert backend.started == 2
+    finally:
+        backend.close()
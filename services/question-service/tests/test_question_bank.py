@@ -0,0 +1,30 @@
+import pytest
+
+from question_bank import allocate
+
+
+def test_no_distribution_is_one_unconstrained_quota():
+    assert allocate(10) == [(None, None, 10)]
+
+
+def test_quotas_follow_the_weights_and_add_up_to_count():
+    quotas = allocate(20, {"easy": 0.3, "medium": 0.5, "hard": 0.2})
+    assert quotas == [("easy", None, 6), ("medium", None, 10), ("hard", None, 4)]
+
+
+def test_rounding_goes_to_the_largest_remainders():
+    quotas = allocate(10, {"easy": 1, "hard": 1}, {"remember": 1, "apply": 2})
+    assert sum(n for _, _, n in quotas) == 10
+    assert dict(((d, b), n) for d, b, n in quotas) == {
+        ("easy", "remember"): 2, ("easy", "apply"): 3, ("hard", "remember"): 2, ("hard", "apply"): 3,
+    }
+
+
+def test_zero_weights_get_no_quota():
+    assert allocate(4, {"easy": 1, "hard": 0}) == [("easy", None, 4)]
+
+
+@pytest.mark.parametrize("weights", [{"easy": -1, "hard": 2}, {"easy": 0}])
+def test_invalid_weights_are_refused(weights):
+    with pytest.raises(ValueError):
+        allocate(5, weights)
@@ -1,33 +1,46 @@
-from fastapi import FastAPI, Depends, HTTPException, status
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi import Depends, HTTPException, Query, Request, status
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel, EmailStr
 from typing import Optional
 import os
-from supabase import create_client, Client
+import json
+import asyncio
 from datetime import datetime
 
+from common.bootstrap import create_app, create_supabase_client, on_shutdown, on_startup
+from common.db import Database
+from common.tracing import span
+from profile_cache import ProfileCache
+from repository import UserRepository
+from roster import RosterError, parse_roster, provision_roster
+
 # Initialize FastAPI app
-app = FastAPI(
+app = create_app(
+    "user-service",
     title="User Management Service",
-    description="Handles user authentication, profiles, and settings",
-    version="1.0.0"
+    description="Handles user authentication, profiles, and settings"
 )
 
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# Supabase client (created at startup)
+supabase = None
 
-# Supabase client
-supabase: Client = create_client(
-    os.getenv("SUPABASE_URL", ""),
-    os.getenv("SUPABASE_SERVICE_ROLE_KEY", "")
-)
+# Database (connection pool opened at startup)
+db = Database()
+users_repo = UserRepository(db)
+
+# Profile and settings rows; writes made here update the cache, the TTL bounds
+# how stale a change made through another replica can be
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "60"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+profile_cache = ProfileCache(USER_CACHE_TTL, USER_CACHE_MAX_ENTRIES)
+
+# Bulk roster provisioning: who may use it, roster size, concurrent auth calls
+# and profile rows per insert
+ROSTER_ROLES = {r.strip() for r in os.getenv("ROSTER_ROLES", "admin,teacher").split(",") if r.strip()}
+ROSTER_MAX_ROWS = int(os.getenv("ROSTER_MAX_ROWS", "2000"))
+ROSTER_CONCURRENCY = int(os.getenv("ROSTER_CONCURRENCY", "8"))
+ROSTER_BATCH_SIZE = int(os.getenv("ROSTER_BATCH_SIZE", "50"))
 
 # Security
 security = HTTPBearer()
@@ -56,12 +69,26 @@ class UserSettings(BaseModel):
     user_id: str
     preferences: dict
 
+class UserProfileResponse(UserResponse):
+    settings: Optional[UserSettings] = None
+
+async def get_user_row(user_id: str):
+    return await profile_cache.get("user", user_id, lambda: users_repo.get_user(user_id))
+
+async def get_settings_row(user_id: str):
+    return await profile_cache.get("settings", user_id, lambda: users_repo.get_settings(user_id))
+
+def settings_response(user_id: str, row) -> UserSettings:
+    # Users without a settings row get the defaults
+    return UserSettings(user_id=user_id, preferences=(row or {}).get("preferences") or {})
+
 # Dependency to get current user
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         token = credentials.credentials
         # Verify token with Supabase
-        user = supabase.auth.get_user(token)
+        with span("auth"):
+            user = await asyncio.to_thread(supabase.auth.get_user, token)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -86,7 +113,7 @@ async def signup(request: SignupRequest):
     """
     try:
         # Create user in Supabase Auth
-        response = supabase.auth.sign_up({
+        response = await asyncio.to_thread(supabase.auth.sign_up, {
             "email": request.email,
             "password": request.password,
             "options": {
@@ -98,12 +125,8 @@ async def signup(request: SignupRequest):
         
         if response.user:
             # Create user profile in database
-            supabase.table("users").insert({
-                "id": response.user.id,
-                "email": request.email,
-                "full_name": request.full_name,
-                "role": "user"
-            }).execute()
+            await users_repo.create_user(response.user.id, request.email, request.full_name)
+            profile_cache.invalidate(response.user.id)
             
             return {
                 "message": "User created successfully",
@@ -127,7 +150,7 @@ async def login(request: LoginRequest):
     Authenticate user and return access token.
     """
     try:
-        response = supabase.auth.sign_in_with_password({
+        response = await asyncio.to_thread(supabase.auth.sign_in_with_password, {
             "email": request.email,
             "password": request.password
         })
@@ -150,27 +173,38 @@ async def login(request: LoginRequest):
             detail="Invalid email or password"
         )
 
-@app.get("/users/me", response_model=UserResponse)
-async def get_current_user_profile(current_user = Depends(get_current_user)):
+@app.get("/users/me", response_model=UserProfileResponse, response_model_exclude_unset=True)
+async def get_current_user_profile(
+    include: Optional[str] = Query(None, description="Comma-separated related data to include: settings"),
+    current_user = Depends(get_current_user)
+):
     """
-    Get current user profile.
+    Get current user profile, and with ?include=settings their settings too.
     """
     try:
-        result = supabase.table("users").select("*").eq("id", current_user.id).execute()
-        if result.data and len(result.data) > 0:
-            user_data = result.data[0]
-            return UserResponse(
+        with_settings = "settings" in (include or "").split(",")
+        if with_settings:
+            user_data, settings = await asyncio.gather(get_user_row(current_user.id), get_settings_row(current_user.id))
+        else:
+            user_data = await get_user_row(current_user.id)
+        if user_data:
+            profile = UserProfileResponse(
                 id=user_data["id"],
                 email=user_data["email"],
                 full_name=user_data.get("full_name"),
                 role=user_data.get("role", "user"),
                 created_at=user_data["created_at"]
             )
+            if with_settings:
+                profile.settings = settings_response(current_user.id, settings)
+            return profile
         else:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User profile not found"
             )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -187,12 +221,10 @@ async def update_user_settings(
     """
     try:
         # Upsert user settings
-        result = supabase.table("user_settings").upsert({
-            "user_id": current_user.id,
-            "preferences": settings.preferences
-        }).execute()
+        result = await users_repo.upsert_settings(current_user.id, settings.preferences)
         
-        if result.data:
+        if result:
+            profile_cache.put("settings", current_user.id, result)
             return UserSettings(
                 user_id=current_user.id,
                 preferences=settings.preferences
@@ -214,26 +246,56 @@ async def get_user_settings(current_user = Depends(get_current_user)):
     Get user settings and preferences.
     """
     try:
-        result = supabase.table("user_settings").select("*").eq("user_id", current_user.id).execute()
-        
-        if result.data and len(result.data) > 0:
-            settings = result.data[0]
-            return UserSettings(
-                user_id=settings["user_id"],
-                preferences=settings.get("preferences", {})
-            )
-        else:
-            # Return default settings
-            return UserSettings(
-                user_id=current_user.id,
-                preferences={}
-            )
+        settings = await get_settings_row(current_user.id)
+        return settings_response(current_user.id, settings)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
 
+@app.post("/users/roster")
+async def provision_users(request: Request, current_user = Depends(get_current_user)):
+    """
+    Create accounts for a roster (CSV with an email header, or JSON).
+
+    Streams one JSON line per row as it completes, then a summary line with
+    counts and throughput.
+    """
+    caller = await get_user_row(current_user.id)
+    if not caller or caller.get("role") not in ROSTER_ROLES:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Provisioning a roster requires one of the roles: " + ", ".join(sorted(ROSTER_ROLES))
+        )
+    try:
+        rows = parse_roster(await request.body(), request.headers.get("content-type", ""), ROSTER_MAX_ROWS)
+    except RosterError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    async def lines():
+        async for item in provision_roster(supabase, users_repo, rows, ROSTER_CONCURRENCY, ROSTER_BATCH_SIZE):
+            yield json.dumps(item) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.get("/cache/metrics")
+async def cache_metrics():
+    """
+    Profile cache size and hit rate since startup.
+    """
+    return profile_cache.stats()
+
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "service": "user-service"}
+
+@on_startup(app)
+async def startup_event():
+    global supabase
+    # Import the Supabase client in a thread while the pool connects
+    supabase, _ = await asyncio.gather(asyncio.to_thread(create_supabase_client), db.connect())
+
+@on_shutdown(app)
+async def shutdown_event():
+    await db.close()
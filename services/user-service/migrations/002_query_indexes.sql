@@ -0,0 +1,4 @@
+-- Indexes duplicated by constraints: users.email is UNIQUE and
+-- user_settings.user_id is the primary key, so these only slow down writes
+DROP INDEX IF EXISTS idx_users_email;
+DROP INDEX IF EXISTS idx_user_settings_user_id;
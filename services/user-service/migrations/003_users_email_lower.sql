@@ -0,0 +1,2 @@
+-- Roster provisioning looks profiles up by case-insensitive email
+CREATE INDEX IF NOT EXISTS idx_users_email_lower ON users (lower(email));
@@ -0,0 +1,96 @@
+"""
+Per-user cache of ``users`` and ``user_settings`` rows.
+
+Profiles and preferences rarely change but are read on every page, so rows
+are kept for ``ttl`` seconds, in an LRU bounded to ``max_entries`` users.
+Missing rows are cached too (most users have no settings row). Writes go
+through ``put``/``invalidate``, so this instance never serves its own stale
+data; the TTL bounds how long a change made through another replica can go
+unseen. Concurrent misses for the same row share one database read.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+Row = Optional[Dict[str, Any]]
+Key = Tuple[str, str]  # (kind, user_id)
+
+
+class ProfileCache:
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Key, Tuple[float, Row]]" = OrderedDict()
+        self._loading: Dict[Key, "asyncio.Future[Row]"] = {}
+
+    async def get(self, kind: str, user_id: str, load: Callable[[], Awaitable[Row]]) -> Row:
+        """The cached ``kind`` row of ``user_id``, calling ``load`` on a miss."""
+        key = (kind, user_id)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return entry[1]
+
+        self.misses += 1
+        pending = self._loading.get(key)
+        if pending is not None:
+            try:
+                return await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The request doing the read went away; read it ourselves
+                return await load()
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        try:
+            row = await load()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Waiters re-raise it; don't warn if there were none
+            future.exception()
+            raise
+        finally:
+            current = self._loading.get(key) is future
+            if current:
+                del self._loading[key]
+        # A put or invalidate during the read makes what we read stale
+        if current:
+            self.put(kind, user_id, row)
+        future.set_result(row)
+        return row
+
+    def put(self, kind: str, user_id: str, row: Row):
+        key = (kind, user_id)
+        self._loading.pop(key, None)
+        self._entries[key] = (time.monotonic() + self.ttl, row)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self, user_id: str):
+        for kind in ("user", "settings"):
+            self._entries.pop((kind, user_id), None)
+            self._loading.pop((kind, user_id), None)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
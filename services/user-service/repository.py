@@ -0,0 +1,44 @@
+"""
+Data access for the user-service tables (users, user_settings).
+"""
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from common.db import Database
+
+GET_USER = "SELECT * FROM users WHERE id = $1"
+INSERT_USER = "INSERT INTO users (id, email, full_name, role) VALUES ($1, $2, $3, $4)"
+# Bulk provisioning: a re-run must not fail on rows that are already there
+INSERT_USER_IF_ABSENT = INSERT_USER + " ON CONFLICT (id) DO NOTHING"
+GET_USER_IDS_BY_EMAIL = "SELECT id, lower(email) AS email FROM users WHERE lower(email) = ANY($1::text[])"
+GET_SETTINGS = "SELECT * FROM user_settings WHERE user_id = $1"
+UPSERT_SETTINGS = """
+    INSERT INTO user_settings (user_id, preferences) VALUES ($1, $2)
+    ON CONFLICT (user_id) DO UPDATE SET preferences = EXCLUDED.preferences
+    RETURNING *
+"""
+
+
+class UserRepository:
+    def __init__(self, db: Database):
+        self.db = db
+
+    async def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return await self.db.fetchrow(GET_USER, user_id)
+
+    async def create_user(self, user_id: str, email: str, full_name: Optional[str], role: str = "user"):
+        await self.db.execute(INSERT_USER, user_id, email, full_name, role)
+
+    async def create_users(self, rows: Sequence[Tuple[str, str, Optional[str], str]]):
+        """Insert (id, email, full_name, role) rows in one transaction."""
+        await self.db.executemany(INSERT_USER_IF_ABSENT, rows)
+
+    async def get_user_ids_by_email(self, emails: List[str]) -> Dict[str, str]:
+        """User IDs keyed by lowercased email; ``emails`` must be lowercase."""
+        rows = await self.db.fetch(GET_USER_IDS_BY_EMAIL, emails)
+        return {row["email"]: row["id"] for row in rows}
+
+    async def get_settings(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return await self.db.fetchrow(GET_SETTINGS, user_id)
+
+    async def upsert_settings(self, user_id: str, preferences: Dict[str, Any]) -> Dict[str, Any]:
+        return await self.db.fetchrow(UPSERT_SETTINGS, user_id, preferences)
@@ -0,0 +1,232 @@
+"""
+Bulk provisioning of a class roster.
+
+``parse_roster`` reads a CSV (header row with ``email`` and optionally
+``full_name`` and ``password``) or JSON (a list of such objects, or
+``{"students": [...]}``) roster. ``provision_roster`` then creates the auth
+users through the Supabase admin API, at most ``concurrency`` at a time and
+with retries on rate limits and transient errors, and inserts their profile
+rows ``batch_size`` at a time. It yields one result per row as soon as the
+row is final (a created user once its profile row is committed), then a
+summary with counts and throughput.
+
+If the client goes away mid-stream, rows not yet sent to the auth API are
+dropped, but calls already made are finished and their profile rows
+inserted, so no auth user is left without a profile.
+
+Rows whose email already has a profile (compared case-insensitively) are reported as ``exists`` without
+calling the auth API, so a roster can be re-submitted after a partial
+failure. Rows without a password get a generated one, returned in their
+result so it can be handed to the student.
+"""
+import asyncio
+import csv
+import io
+import json
+import random
+import secrets
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, EmailStr, ValidationError
+
+from common.tracing import span
+from repository import UserRepository
+
+# Auth API statuses worth retrying (0: the request did not get an answer)
+RETRYABLE_STATUSES = {0, 429, 500, 502, 503, 504}
+
+# Drains of abandoned rosters, referenced until they finish
+_draining = set()
+
+
+class RosterError(ValueError):
+    pass
+
+
+class RosterEntry(BaseModel):
+    email: EmailStr
+    full_name: Optional[str] = None
+    password: Optional[str] = None
+
+
+def parse_roster(body: bytes, content_type: str, max_rows: int) -> List[Dict[str, Any]]:
+    """Rows of the roster as dicts; raises RosterError if it cannot be read."""
+    try:
+        text = body.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise RosterError("Roster must be UTF-8")
+    if "json" in content_type:
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise RosterError(f"Invalid JSON: {e}")
+        rows = data.get("students") if isinstance(data, dict) else data
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise RosterError('JSON roster must be a list of objects or {"students": [...]}')
+    elif "csv" in content_type or "text/plain" in content_type:
+        reader = csv.DictReader(io.StringIO(text))
+        fields = [name.strip().lower() for name in reader.fieldnames or []]
+        if "email" not in fields:
+            raise RosterError("CSV roster needs a header row with an email column")
+        reader.fieldnames = fields
+        rows = [{k: (v or "").strip() or None for k, v in row.items() if k} for row in reader]
+    else:
+        raise RosterError("Send the roster as text/csv or application/json")
+    if not rows:
+        raise RosterError("Roster is empty")
+    if len(rows) > max_rows:
+        raise RosterError(f"Roster has {len(rows)} rows; the limit is {max_rows}")
+    return rows
+
+
+def _auth_status(error: Exception) -> Optional[int]:
+    return getattr(error, "status", None)
+
+
+async def provision_roster(
+    supabase,
+    users_repo: UserRepository,
+    rows: List[Dict[str, Any]],
+    concurrency: int,
+    batch_size: int,
+    max_attempts: int = 3,
+) -> AsyncIterator[Dict[str, Any]]:
+    started = time.perf_counter()
+    counts = {"created": 0, "exists": 0, "invalid": 0, "failed": 0}
+    auth_ms: List[float] = []
+    insert_batches = 0
+    results: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+
+    def result(row: int, email: Optional[str], outcome: str, **fields) -> Dict[str, Any]:
+        counts[outcome] += 1
+        return {"row": row, "email": email, "status": outcome, **fields}
+
+    # Validate and drop duplicates within the roster
+    entries: List[Tuple[int, RosterEntry]] = []
+    seen = set()
+    for n, raw in enumerate(rows, start=1):
+        try:
+            entry = RosterEntry(**raw)
+        except ValidationError as e:
+            yield result(n, raw.get("email"), "invalid", error=e.errors()[0]["msg"])
+            continue
+        email = entry.email.lower()
+        if email in seen:
+            yield result(n, email, "invalid", error="Duplicate email in roster")
+            continue
+        seen.add(email)
+        entries.append((n, entry.model_copy(update={"email": email})))
+
+    with span("db.users.existing"):
+        existing = await users_repo.get_user_ids_by_email([entry.email for _, entry in entries])
+    pending = []
+    for n, entry in entries:
+        if entry.email in existing:
+            yield result(n, entry.email, "exists", user_id=existing[entry.email])
+        else:
+            pending.append((n, entry))
+
+    semaphore = asyncio.Semaphore(concurrency)
+    stopping = False
+
+    async def create(n: int, entry: RosterEntry):
+        password = entry.password or secrets.token_urlsafe(12)
+        attributes = {
+            "email": entry.email,
+            "password": password,
+            "email_confirm": True,
+            "user_metadata": {"full_name": entry.full_name},
+        }
+        async with semaphore:
+            for attempt in range(1, max_attempts + 1):
+                if stopping:
+                    return
+                call_started = time.perf_counter()
+                try:
+                    response = await asyncio.to_thread(supabase.auth.admin.create_user, attributes)
+                    user_id = response.user.id
+                    break
+                except Exception as e:
+                    if _auth_status(e) in RETRYABLE_STATUSES and attempt < max_attempts:
+                        await asyncio.sleep(0.5 * 2 ** (attempt - 1) * random.uniform(0.5, 1.5))
+                        continue
+                    await results.put(result(n, entry.email, "failed", error=str(e)))
+                    return
+                finally:
+                    auth_ms.append((time.perf_counter() - call_started) * 1000)
+        created = {"row": n, "email": entry.email, "user_id": user_id}
+        if not entry.password:
+            created["password"] = password
+        await results.put({"created": created, "full_name": entry.full_name})
+
+    tasks = [asyncio.create_task(create(n, entry)) for n, entry in pending]
+    batch: List[Dict[str, Any]] = []
+
+    async def flush():
+        nonlocal insert_batches
+        rows_to_insert = [(c["created"]["user_id"], c["created"]["email"], c["full_name"], "user") for c in batch]
+        try:
+            with span("db.users.insert_batch", rows=len(batch)):
+                await users_repo.create_users(rows_to_insert)
+            insert_batches += 1
+            outcomes = [result(outcome="created", **c["created"]) for c in batch]
+        except Exception as e:
+            # The auth users exist; a re-run cannot recover their IDs from the
+            # roster, so say which ones need a profile row
+            outcomes = [result(c["created"]["row"], c["created"]["email"], "failed",
+                               user_id=c["created"]["user_id"], error=f"Profile insert failed: {e}") for c in batch]
+        batch.clear()
+        return outcomes
+
+    async def finish_in_flight():
+        await asyncio.gather(*tasks, return_exceptions=True)
+        while not results.empty():
+            item = results.get_nowait()
+            if "created" in item:
+                batch.append(item)
+        if batch:
+            await flush()
+
+    finished = False
+    try:
+        for _ in range(len(tasks)):
+            item = await results.get()
+            if "created" not in item:
+                yield item
+                continue
+            batch.append(item)
+            if len(batch) >= batch_size:
+                for outcome in await flush():
+                    yield outcome
+        if batch:
+            for outcome in await flush():
+                yield outcome
+        finished = True
+    finally:
+        if not finished:
+            # The client went away mid-stream. Start no more auth calls, but
+            # give the users already created their profile rows; the drain is
+            # shielded from the cancellation of the response
+            stopping = True
+            drain = asyncio.create_task(finish_in_flight())
+            _draining.add(drain)
+            drain.add_done_callback(_draining.discard)
+            await asyncio.shield(drain)
+
+    elapsed = time.perf_counter() - started
+    auth_ms.sort()
+    yield {
+        "summary": {
+            "rows": len(rows),
+            **counts,
+            "elapsed_s": round(elapsed, 3),
+            "rows_per_s": round(len(rows) / elapsed, 1) if elapsed else None,
+            "created_per_s": round(counts["created"] / elapsed, 1) if elapsed else None,
+            "auth_calls": len(auth_ms),
+            "auth_p50_ms": round(auth_ms[len(auth_ms) // 2], 1) if auth_ms else None,
+            "auth_p95_ms": round(auth_ms[min(len(auth_ms) - 1, int(len(auth_ms) * 0.95))], 1) if auth_ms else None,
+            "insert_batches": insert_batches,
+            "concurrency": concurrency,
+        }
+    }
@@ -0,0 +1,101 @@
+import asyncio
+
+from profile_cache import ProfileCache
+
+
+def test_rows_are_served_until_they_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("profile_cache.time.monotonic", lambda: now[0])
+    cache = ProfileCache(ttl=30, max_entries=10)
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return {"id": "u1"}
+
+    async def run():
+        await cache.get("user", "u1", load)
+        await cache.get("user", "u1", load)
+        now[0] += 31
+        await cache.get("user", "u1", load)
+
+    asyncio.run(run())
+    assert len(loads) == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_missing_rows_are_cached():
+    cache = ProfileCache(ttl=30, max_entries=10)
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return None
+
+    async def run():
+        return [await cache.get("settings", "u1", load) for _ in range(3)]
+
+    assert asyncio.run(run()) == [None, None, None]
+    assert len(loads) == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ProfileCache(ttl=30, max_entries=2)
+    cache.put("user", "a", {"id": "a"})
+    cache.put("user", "b", {"id": "b"})
+
+    async def run():
+        await cache.get("user", "a", None)  # a is now the most recently used
+        cache.put("user", "c", {"id": "c"})
+
+    asyncio.run(run())
+    assert cache.evictions == 1
+    assert list(cache._entries) == [("user", "a"), ("user", "c")]
+
+
+def test_concurrent_misses_share_one_read():
+    cache = ProfileCache(ttl=30, max_entries=10)
+    loads = []
+
+    async def load():
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return {"id": "u1"}
+
+    async def run():
+        return await asyncio.gather(*(cache.get("user", "u1", load) for _ in range(5)))
+
+    assert asyncio.run(run()) == [{"id": "u1"}] * 5
+    assert len(loads) == 1
+
+
+def test_invalidate_during_a_read_keeps_the_stale_row_out():
+    cache = ProfileCache(ttl=30, max_entries=10)
+
+    async def load():
+        await asyncio.sleep(0.01)
+        return {"role": "user"}
+
+    async def run():
+        read = asyncio.create_task(cache.get("user", "u1", load))
+        await asyncio.sleep(0)
+        cache.invalidate("u1")
+        await read
+
+    asyncio.run(run())
+    assert ("user", "u1") not in cache._entries
+
+
+def test_a_failed_read_reaches_every_waiter():
+    cache = ProfileCache(ttl=30, max_entries=10)
+
+    async def load():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("database down")
+
+    async def run():
+        return await asyncio.gather(*(cache.get("user", "u1", load) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert ("user", "u1") not in cache._loading
@@ -0,0 +1,73 @@
+import asyncio
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+
+from roster import provision_roster
+
+
+class FakeAdmin:
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.created = []
+        self.lock = threading.Lock()
+
+    def create_user(self, attributes):
+        time.sleep(self.delay)
+        user_id = str(uuid.uuid4())
+        with self.lock:
+            self.created.append(attributes["email"])
+        return SimpleNamespace(user=SimpleNamespace(id=user_id))
+
+
+class FakeUsers:
+    def __init__(self, emails=()):
+        self.rows = {email: str(uuid.uuid4()) for email in emails}
+
+    async def get_user_ids_by_email(self, emails):
+        return {email: self.rows[email.lower()] for email in emails if email.lower() in self.rows}
+
+    async def create_users(self, rows):
+        await asyncio.sleep(0.01)
+        for user_id, email, _, _ in rows:
+            self.rows[email] = user_id
+
+
+def roster(n):
+    return [{"email": f"Student{i}@Example.com"} for i in range(n)]
+
+
+def test_disconnect_finishes_in_flight_users():
+    admin = FakeAdmin(0.1)
+    users = FakeUsers()
+    supabase = SimpleNamespace(auth=SimpleNamespace(admin=admin))
+
+    async def run():
+        async def consume():
+            async for _ in provision_roster(supabase, users, roster(40), concurrency=4, batch_size=10):
+                pass
+
+        task = asyncio.create_task(consume())
+        await asyncio.sleep(0.15)
+        task.cancel()
+        await asyncio.sleep(0.5)
+
+    asyncio.run(run())
+    assert 0 < len(admin.created) < 40
+    # Every auth user created has its profile row
+    assert sorted(admin.created) == sorted(users.rows)
+
+
+def test_existing_profiles_match_case_insensitively():
+    admin = FakeAdmin(0)
+    users = FakeUsers(["student0@example.com"])
+    supabase = SimpleNamespace(auth=SimpleNamespace(admin=admin))
+
+    async def run():
+        return [item async for item in provision_roster(supabase, users, roster(2), concurrency=2, batch_size=10)]
+
+    items = asyncio.run(run())
+    assert [item["status"] for item in items[:-1]] == ["exists", "created"]
+    assert admin.created == ["student1@example.com"]
+    assert items[-1]["summary"]["created"] == 1